@@ -1,6 +1,7 @@
 import streamlit as st
 from streamlit_extras.stylable_container import stylable_container
 import demographics_dict as dd
+from persona_library import PersonaLibrary
 import json
 from typing import List, Dict
 import os 
@@ -27,13 +28,21 @@ with stylable_container(
     st.markdown("<h1 style='text-align: center; color: black;'>Build Your Personas</h1>", unsafe_allow_html=True)
     st.markdown("<h4 style='text-align: center; color: grey;'>Select the number of Personas to create, add details, then click Submit Personas.<br><br></h4>", unsafe_allow_html=True)
 
+@st.cache_resource
+def get_persona_library() -> PersonaLibrary:
+    """One persona library connection per server process, shared by all sessions."""
+    return PersonaLibrary()
+
+
 # Function to save personas data to a JSON file
 def save_personas(personas: List[Dict[str, str]]) -> None:
-    """Save a list of persona dictionaries to a JSON file."""
+    """Save a list of persona dictionaries to the persona library and, as the current panel, to a JSON file."""
     persona_data = {}
     for i, persona in enumerate(personas):
         persona_name = f"Persona {i + 1}"
         persona_data[persona_name] = persona
+    # The library keeps every panel built here, docs/personas.json only the latest
+    get_persona_library().add(persona_data, source='home')
     with open('docs/personas.json', 'w') as file:
         json.dump(persona_data, file, indent=4)
 
@@ -104,5 +113,40 @@ def main() -> None:
             if launch_focus_group:
                 st.switch_page("pages/1 Run_Virtual_Focus_Group.py")
 
+def generate_panel() -> None:
+    """Render the synthetic panel generator, for panels too large to build by hand."""
+    with st.expander("Generate a synthetic panel"):
+        st.markdown("Draw personas at random from the demographic options. Pick a field to stratify on to fix its shares exactly; use `panel_generator.py` with a spec file for custom or joint distributions.")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            num_personas = st.number_input("Number of Personas: ", min_value=6, max_value=1000, step=1, value=200)
+        with col2:
+            seed = st.number_input("Seed: ", min_value=0, step=1, value=0)
+        with col3:
+            stratify_field = st.selectbox("Stratify by: ", ["None"] + list(dd.persona_fields))
+        stratify = None
+        if stratify_field != "None":
+            options = dd.persona_fields[stratify_field]
+            columns = st.columns(len(options))
+            quotas = {}
+            for column, option in zip(columns, options):
+                with column:
+                    quotas[option] = st.number_input(f"{option} share", min_value=0.0, max_value=1.0,
+                                                     value=round(1 / len(options), 2), key=f"quota_{stratify_field}_{option}")
+            stratify = {"field": stratify_field, "quotas": quotas}
+        if st.button("Generate Panel", key="generate_panel"):
+            # numpy, pyarrow and faker load on the first panel generated, not with the page
+            import panel_generator as pg
+            try:
+                panel = pg.sample_panel(int(num_personas), stratify=stratify, seed=int(seed))
+            except ValueError as e:
+                st.error(str(e))
+                return
+            path = os.path.join(pg.PANELS_DIR, f"panel-{int(num_personas)}-{int(seed)}.parquet")
+            pg.save_panel(panel, path)
+            get_persona_library().add(pg.panel_records(panel), source=path)
+            st.success(f"{panel.num_rows} personas saved to {path} and the persona library. Pick it as the panel on the Run page.")
+
 if __name__ == "__main__":
     main()
+    generate_panel()
@@ -0,0 +1,236 @@
+"""
+Headless batch runner for focus groups.
+
+Runs many studies without Streamlit, spread over a pool of worker processes,
+and writes one JSONL record per message and one per study:
+
+    python batch_runner.py studies.jsonl -o results.jsonl --workers 4
+
+Each line (or list item, for a .json file) of the studies file describes one study:
+
+    {"study_id": "pants-01", "product": "A pant made of recycled plastic ...",
+     "personas": "docs/personas.json", "max_round": 20, "parallel_opening": true}
+
+`personas` is either a path to a personas file or the persona records inline;
+alternatively "persona_query" draws the panel from the persona library, e.g.
+{"limit": 40, "age": [55, null], "location": "West US", "income": [60000, null],
+"seed": 7} (see persona_library.py).
+Optional speaker scheduling keys: "speaker_policy" ("round_robin", "least_spoken"
+or "quota"), "max_interactions", "moderator_every", and for "quota" the
+demographic "quota_field" with its "quotas", e.g. {"female": 0.5, "male": 0.5}.
+"stall_detection" (default true) skips participants who keep repeating
+themselves and ends a study early once its discussion goes in circles.
+"moderator_prompt" replaces the moderator's system message ("{}" takes the
+participants' names), and "analysis": true adds the study's research notes
+(themes, pain points, stances, see running_analysis.py) to its record as
+"findings". "typed_findings": true stores the study's typed findings in the
+findings dataset for cross-study queries (see findings.py).
+"routing": true sends each role to its own model with its own token cap and
+fallbacks (see model_router.py); a {"role" or "role:phase": {"model": ...}}
+mapping overrides the default routes, e.g. {"moderator": {"model": "gpt-4o-mini"}}.
+"breakout": {"room_size": 8} splits a large panel into rooms of that many
+personas, each with its own moderator, run concurrently and merged into one
+plenary transcript (see breakout.py): message records then carry their "room",
+the study record lists the rooms and sums their metrics. Its "room_field" picks
+the demographic field the rooms are mixed on (default "Age"), "max_rooms" caps
+the rooms running at once (all of them by default, the pool throttles their
+requests).
+"""
+import os
+import sys
+import json
+import functools
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional
+
+os.environ.setdefault('AUTOGEN_USE_DOCKER', '0')
+
+import focus_group as fg
+import llm_pool
+from llm_cache import build_cache
+from metrics import MetricsRecorder
+from model_router import ModelRouter
+from persona_library import PersonaLibrary
+from breakout import run_breakouts
+from findings import FindingsStore, extract_findings
+from running_analysis import analyze_transcript
+from scheduler import quota_weights
+from summarize import autogen_completer
+
+
+def load_studies(path: str) -> List[Dict]:
+    """Load study definitions from a JSON list or a JSONL file."""
+    with open(path, 'r') as f:
+        if path.endswith('.jsonl'):
+            studies = [json.loads(line) for line in f if line.strip()]
+        else:
+            studies = json.load(f)
+    for i, study in enumerate(studies):
+        study.setdefault('study_id', f"study-{i + 1}")
+    return studies
+
+
+def run_study(study: Dict) -> Dict:
+    """
+    Runs one focus group to completion without any UI.
+
+    Parameters:
+        study (Dict): The study definition, see the module docstring.
+
+    Returns:
+        Dict: {"study": <study record>, "messages": [<message records>]}.
+    """
+    started = time.time()
+    record = {
+        "type": "study",
+        "study_id": study['study_id'],
+        "product": study['product'],
+        "personas": [],
+        "status": "completed",
+        "error": None,
+    }
+    groupchat = manager = breakout = None
+    llm_config = None
+    try:
+        if 'persona_query' in study:
+            library = PersonaLibrary()
+            personas = library.query(**study['persona_query'])
+            library.close()
+        else:
+            personas = study['personas']
+        if isinstance(personas, str):
+            personas = fg.load_personas(personas)
+        record["personas"] = [persona['Name'] for persona in personas.values()]
+        llm_config = fg.make_llm_config(model=study.get('model', 'gpt-4o'),
+                                        temperature=study.get('temperature', 0))
+        routing = study.get('routing')
+        router = ModelRouter(routing if isinstance(routing, dict) else None) if routing else None
+        weights = quota_weights(personas, study['quota_field'], study['quotas']) if 'quotas' in study else None
+        panel_kwargs = dict(max_round=study.get('max_round', 20),
+                            parallel_opening=study.get('parallel_opening', False),
+                            speaker_policy=study.get('speaker_policy', 'least_spoken'),
+                            max_interactions=study.get('max_interactions', 6),
+                            moderator_every=study.get('moderator_every', 1),
+                            speaker_weights=weights,
+                            stall_detection=study.get('stall_detection', True),
+                            moderator_prompt=study.get('moderator_prompt'),
+                            router=router)
+        if 'breakout' in study:
+            breakout = run_breakouts(personas, study['product'], llm_config, study_id=study['study_id'],
+                                     **study['breakout'], **panel_kwargs)
+            record["status"], record["error"] = breakout.status, breakout.error
+            record["rooms"] = [room.record() for room in breakout.rooms]
+        else:
+            groupchat, manager, admin = fg.build_panel(personas, llm_config, **panel_kwargs)
+            manager.metrics = MetricsRecorder(study['study_id'])
+            manager.metrics.attach(groupchat.agents, moderator_name="Moderator")
+            admin.initiate_chat(manager, message=study['product'], cache=build_cache(), silent=True)
+    except Exception:
+        record["status"] = "failed"
+        record["error"] = traceback.format_exc()
+    if breakout is not None:
+        # The plenary transcript, in the order the rooms produced it
+        messages = [{"type": "message", "study_id": study['study_id'], **message}
+                    for message in breakout.plenary.messages]
+        turns = breakout.turns
+        analysis_llm_config = breakout.analysis_llm_config or llm_config
+    else:
+        messages = [
+            {
+                "type": "message",
+                "study_id": study['study_id'],
+                "turn": turn,
+                "speaker": message.get('name'),
+                "content": message.get('content'),
+            }
+            for turn, message in enumerate(groupchat.messages if groupchat is not None else [])
+        ]
+        turns = manager.metrics.turns if manager is not None and manager.metrics is not None else []
+        analysis_llm_config = (manager.analysis_llm_config if manager is not None else None) or llm_config
+    record["n_messages"] = len(messages)
+    record["prompt_tokens"] = sum(turn.prompt_tokens for turn in turns)
+    record["completion_tokens"] = sum(turn.completion_tokens for turn in turns)
+    record["cost"] = round(sum(turn.cost for turn in turns), 6)
+    record["mean_latency_s"] = round(sum(turn.latency_s for turn in turns) / len(turns), 3) if turns else None
+    record["retries"] = sum(turn.retries for turn in turns)
+    if breakout is not None:
+        record["stalled"] = any(room.stalled for room in breakout.rooms)
+    else:
+        record["stalled"] = manager is not None and manager.stall_detector is not None and manager.stall_detector.stalled
+    if study.get('analysis') and record["status"] == "completed":
+        try:
+            lines = [f"**{message['speaker']}**: {message['content']}" for message in messages if message['content']]
+            record["findings"] = analyze_transcript(lines, autogen_completer(analysis_llm_config))
+        except Exception:
+            record["analysis_error"] = traceback.format_exc()
+    if study.get('typed_findings') and record["status"] == "completed":
+        try:
+            lines = [f"**{message['speaker']}**: {message['content']}" for message in messages if message['content']]
+            # Each study writes its own partition, so workers do not step on each other
+            findings_store = FindingsStore()
+            typed = extract_findings(study['study_id'], study['product'], lines, personas,
+                                     autogen_completer(analysis_llm_config), created_at=started, themes=findings_store.themes())
+            findings_store.write(typed)
+            record["typed_findings"] = len(typed)
+        except Exception:
+            record["findings_error"] = traceback.format_exc()
+    record["elapsed_s"] = round(time.time() - started, 3)
+    return {"study": record, "messages": messages}
+
+
+def run_batch(studies: Iterable[Dict], output_path: str, max_workers: Optional[int] = None,
+              max_concurrency: Optional[int] = None) -> List[Dict]:
+    """
+    Runs studies in parallel worker processes and appends their records to a JSONL file.
+
+    Parameters:
+        studies (Iterable[Dict]): The study definitions.
+        output_path (str): The JSONL file receiving message and study records.
+        max_workers (Optional[int]): Maximum number of studies running at once, defaults to the CPU count.
+        max_concurrency (Optional[int]): Requests in flight across all workers, defaults to
+            FOCUS_GROUP_MAX_CONCURRENCY per worker.
+
+    Returns:
+        List[Dict]: The study records, in completion order.
+    """
+    study_records = []
+    workers = max_workers or os.cpu_count() or 1
+    if max_concurrency:
+        # Every running study needs at least one request in flight
+        workers = min(workers, max_concurrency)
+    # The workers split the account's rate limits, and the requests in flight if capped, between them
+    limits = {"share": 1 / workers}
+    if max_concurrency:
+        limits["max_concurrency"] = max_concurrency // workers
+    with ProcessPoolExecutor(max_workers=workers, initializer=functools.partial(llm_pool.configure, **limits)) as pool, \
+            open(output_path, 'a') as out:
+        futures = {pool.submit(run_study, study): study['study_id'] for study in studies}
+        for future in as_completed(futures):
+            result = future.result()
+            for record in result["messages"] + [result["study"]]:
+                out.write(json.dumps(record) + "\n")
+            out.flush()
+            study_records.append(result["study"])
+            print(f"{result['study']['study_id']}: {result['study']['status']} "
+                  f"({result['study']['n_messages']} messages, {result['study']['elapsed_s']}s)", file=sys.stderr)
+    return study_records
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run focus group studies headlessly.")
+    parser.add_argument("studies", help="JSON or JSONL file with the study definitions")
+    parser.add_argument("-o", "--output", default="docs/batch_results.jsonl", help="JSONL file to append results to")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="maximum number of studies running at once")
+    parser.add_argument("-c", "--max-concurrency", type=int, default=None,
+                        help="maximum number of requests in flight across all studies")
+    args = parser.parse_args(argv)
+    records = run_batch(load_studies(args.studies), args.output, max_workers=args.workers,
+                        max_concurrency=args.max_concurrency)
+    return 0 if all(record["status"] == "completed" for record in records) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
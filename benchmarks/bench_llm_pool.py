@@ -0,0 +1,79 @@
+"""
+Naive OpenAI clients against the shared llm_pool, on the rate-limited mock server.
+
+Fires the same burst of chat completions from many threads, once through
+plain OpenAI clients with the SDK's default retries (how the app called the
+API before the pool) and once through the pool, and reports throughput,
+throttled requests and failures:
+
+    python benchmarks/bench_llm_pool.py --requests 200 --threads 32 --rpm 300
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCH_DIR, os.path.dirname(BENCH_DIR)]
+
+import openai
+from openai import OpenAI
+
+from llm_pool import LLMPool
+from mock_openai_server import start_server
+
+# The SDK logs every retry at INFO
+logging.getLogger("openai").setLevel(logging.WARNING)
+
+
+def fire(make_client: Callable[[str], OpenAI], requests: int, threads: int, rpm: int, tpm: int, latency_s: float,
+         window_s: float) -> Dict:
+    """Sends `requests` completions from `threads` threads to a fresh mock server."""
+    server, limits = start_server(rpm=rpm, tpm=tpm, latency_s=latency_s, reply_words=40, window_s=window_s)
+    client = make_client(f"http://127.0.0.1:{server.server_address[1]}/v1")
+
+    def call(i: int) -> bool:
+        try:
+            client.chat.completions.create(model="gpt-4o", max_tokens=100,
+                                           messages=[{"role": "user", "content": f"Question {i} about the product."}])
+            return True
+        except openai.APIError:
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        completed = sum(pool.map(call, range(requests)))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    return {"completed": completed, "failed": requests - completed, "throttled": limits.throttled,
+            "elapsed_s": elapsed, "requests_per_s": completed / elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--rpm', type=int, default=300, help="The mock server's requests per minute.")
+    parser.add_argument('--tpm', type=int, default=1000000, help="The mock server's tokens per minute.")
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--window', type=float, default=2.0, help="Seconds over which the server enforces its limits.")
+    args = parser.parse_args()
+
+    clients = {
+        "naive": lambda base_url: OpenAI(api_key="mock", base_url=base_url),
+        # Configured above the server's limit on purpose, the pool has to find the real one
+        "llm_pool": lambda base_url: LLMPool(rpm=args.rpm * 2, tpm=args.tpm, max_concurrency=args.threads)
+        .openai_client("mock").with_options(base_url=base_url),
+    }
+    print(f"{args.requests} requests from {args.threads} threads, server limit {args.rpm / 60:.1f} requests/s")
+    for name, make_client in clients.items():
+        r = fire(make_client, args.requests, args.threads, args.rpm, args.tpm, args.latency, args.window)
+        print(f"{name:<10} {r['completed']:>5} ok {r['failed']:>5} failed {r['throttled']:>6} throttled "
+              f"{r['elapsed_s']:>7.2f}s {r['requests_per_s']:>6.2f} requests/s", flush=True)
+
+
+if __name__ == '__main__':
+    main()
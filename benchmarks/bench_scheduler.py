@@ -0,0 +1,75 @@
+"""
+Micro-benchmark of speaker selection.
+
+Compares the original selection function (linear scans of the panel and of the
+interaction counters on every turn) with SpeakerScheduler and its policies, for
+panels of growing size:
+
+    python benchmarks/bench_scheduler.py --sizes 5 50 500 --turns 20000
+"""
+import os
+import sys
+import argparse
+import timeit
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import SpeakerScheduler, quota_weights
+
+
+def legacy_selection(last_speaker, groupchat, max_interactions=6):
+    """The selection function the panels used before SpeakerScheduler."""
+    if not hasattr(groupchat, 'interaction_counters'):
+        groupchat.interaction_counters = {agent.name: 0 for agent in groupchat.agents if agent.name != "Moderator"}
+    if last_speaker and last_speaker.name == 'Moderator':
+        next_participant = min(groupchat.interaction_counters, key=groupchat.interaction_counters.get)
+        if groupchat.interaction_counters[next_participant] < max_interactions:
+            groupchat.interaction_counters[next_participant] += 1
+            return next((agent for agent in groupchat.agents if agent.name == next_participant), None)
+        return None
+    return next((agent for agent in groupchat.agents if agent.name == "Moderator"), None)
+
+
+def make_panel(size):
+    agents = [SimpleNamespace(name="Moderator")] + [SimpleNamespace(name=f"Persona {i}") for i in range(size)]
+    personas = {agent.name: {"Name": agent.name, "Gender": "female" if i % 2 else "male"}
+                for i, agent in enumerate(agents[1:])}
+    # Messages only matter to the scheduler's new-chat check
+    return agents, personas, SimpleNamespace(agents=agents, messages=[{}, {}])
+
+
+def run(select, groupchat, turns):
+    """Drives `turns` selections; the counters are set high enough that the chat never ends."""
+    speaker = groupchat.agents[1]
+    for _ in range(turns):
+        speaker = select(speaker, groupchat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5, 50, 500])
+    parser.add_argument('--turns', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'panel':>6} {'selector':<22} {'us/turn':>9}")
+    for size in args.sizes:
+        agents, personas, _ = make_panel(size)
+        selectors = {
+            "legacy": lambda: lambda last, gc: legacy_selection(last, gc, max_interactions=args.turns),
+            "round_robin": lambda: SpeakerScheduler(agents, policy="round_robin", max_interactions=args.turns),
+            "least_spoken": lambda: SpeakerScheduler(agents, policy="least_spoken", max_interactions=args.turns),
+            "quota": lambda: SpeakerScheduler(agents, policy="quota", max_interactions=args.turns,
+                                              weights=quota_weights(personas, "Gender", {"female": 0.7})),
+            "least_spoken/every 3": lambda: SpeakerScheduler(agents, policy="least_spoken", max_interactions=args.turns,
+                                                            moderator_every=3),
+        }
+        for label, make_selector in selectors.items():
+            best = min(timeit.repeat(lambda: run(make_selector(), make_panel(size)[2], args.turns),
+                                     number=1, repeat=args.repeat))
+            print(f"{size:>6} {label:<22} {best / args.turns * 1e6:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
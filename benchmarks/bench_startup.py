@@ -0,0 +1,146 @@
+"""
+Cold start benchmark: what importing each Streamlit page costs a fresh process.
+
+Runs the module-level imports of every page (and of the batch runner) in a new
+interpreter, like a freshly started container serving its first page, times
+them and reports the heaviest modules from `python -X importtime`:
+
+    python benchmarks/bench_startup.py --runs 5 --top 8
+    python benchmarks/bench_startup.py --baseline benchmarks/startup.jsonl -o benchmarks/startup.jsonl
+
+Modules imported lazily inside functions (autogen on the Analyze page, the
+OpenAI client, pyarrow for the persona library's Parquet import/export) do
+not count, which is the point: only what a page needs to render is paid for
+at startup. With `--baseline`, import times are compared against the last
+run in that file and the exit status is non-zero on regressions.
+"""
+import os
+import ast
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry points a server process or worker starts from
+ENTRY_POINTS = {
+    "home": "Home.py",
+    "run": "pages/1 Run_Virtual_Focus_Group.py",
+    "analyze": "pages/Analyze_Final_Results.py",
+    "metrics": "pages/Metrics_Dashboard.py",
+    "batch_runner": "batch_runner.py",
+}
+
+
+def module_imports(path: str) -> List[str]:
+    """The import statements at the top level of a module, as source lines."""
+    with open(path, 'r') as f:
+        tree = ast.parse(f.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def _run(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "AUTOGEN_USE_DOCKER": "0"}
+    return subprocess.run([sys.executable, *flags, "-c", code], capture_output=True, text=True, cwd=ROOT, env=env,
+                          check=True)
+
+
+def import_seconds(imports: List[str], runs: int = 3) -> float:
+    """Median wall time of the imports in fresh interpreters, after one run warming the bytecode cache."""
+    code = "\n".join([f"import sys, time\nsys.path.insert(0, {ROOT!r})\nstarted = time.perf_counter()", *imports,
+                      "print(time.perf_counter() - started)"])
+    _run(code)
+    return statistics.median(float(_run(code).stdout.strip().splitlines()[-1]) for _ in range(runs))
+
+
+def import_profile(imports: List[str]) -> List[Tuple[str, float, float]]:
+    """
+    Per-module import cost from `python -X importtime`.
+
+    Returns:
+        List[Tuple[str, float, float]]: (top-level package, self seconds, cumulative seconds of its outermost
+            imports), heaviest cumulative first.
+    """
+    code = "\n".join([f"import sys\nsys.path.insert(0, {ROOT!r})", *imports])
+    packages: Dict[str, List[float]] = {}
+    for line in _run(code, "-X", "importtime").stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        depth = (len(name) - len(name.lstrip())) // 2
+        totals = packages.setdefault(package, [0.0, 0.0, depth])
+        totals[0] += int(self_us) / 1e6
+        # The outermost import of a package includes everything it pulls in
+        if depth < totals[2]:
+            totals[1], totals[2] = int(cumulative_us) / 1e6, depth
+        elif depth == totals[2]:
+            totals[1] += int(cumulative_us) / 1e6
+    profile = [(package, self_s, cumulative_s) for package, (self_s, cumulative_s, _) in packages.items()]
+    return sorted(profile, key=lambda entry: entry[2], reverse=True)
+
+
+def result(bench: str, size: Optional[int], metric: str, value: float, unit: str) -> Dict:
+    return {"bench": bench, "size": size, "metric": metric, "value": round(value, 6), "unit": unit}
+
+
+def bench_startup(runs: int = 3, top: int = 0) -> List[Dict]:
+    """Import time of every entry point, printing its `top` heaviest packages."""
+    results = []
+    for name, path in ENTRY_POINTS.items():
+        imports = module_imports(os.path.join(ROOT, path))
+        results.append(result("startup", None, f"{name}_import_s", import_seconds(imports, runs), "s"))
+        if top:
+            for package, self_s, cumulative_s in import_profile(imports)[:top]:
+                print(f"  {name:<14} {package:<28} self {self_s:8.3f} s  cumulative {cumulative_s:8.3f} s")
+    return results
+
+
+def compare(results: List[Dict], baseline_path: str, tolerance: float) -> int:
+    """Prints the change against the last run in `baseline_path`, returns the number of regressions."""
+    with open(baseline_path, "r") as f:
+        runs = [json.loads(line) for line in f if line.strip()]
+    if not runs:
+        return 0
+    baseline = {(r["bench"], r["metric"]): r["value"] for r in runs[-1]["results"]}
+    regressions = 0
+    for r in results:
+        before = baseline.get((r["bench"], r["metric"]))
+        if not before:
+            continue
+        ratio = r["value"] / before
+        worse = ratio > 1 + tolerance and r["value"] - before > 0.05
+        regressions += worse
+        print(f"{r['metric']:<24} x{ratio:6.2f}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help="Fresh interpreters timed per entry point.")
+    parser.add_argument('--top', type=int, default=8, help="Heaviest packages listed per entry point.")
+    parser.add_argument('-o', '--output', default=None, help="JSONL file to append this run to.")
+    parser.add_argument('--baseline', default=None, help="JSONL file whose last run the results are compared with.")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Relative change counted as a regression.")
+    args = parser.parse_args()
+
+    results = []
+    for r in bench_startup(args.runs, args.top):
+        results.append(r)
+        print(f"{r['metric']:<24} {r['value']:>10.3f} {r['unit']}", flush=True)
+    regressions = compare(results, args.baseline, args.tolerance) if args.baseline and os.path.exists(args.baseline) else 0
+    if args.output:
+        run = {"run_at": time.time(), "python": platform.python_version(), "platform": platform.platform(),
+               "results": results}
+        with open(args.output, "a") as f:
+            f.write(json.dumps(run) + "\n")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
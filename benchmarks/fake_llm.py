@@ -0,0 +1,86 @@
+"""
+Deterministic stand-in for the OpenAI API, for benchmarks.
+
+`FakeModelClient` is an autogen custom model client: put `fake_llm_config()`
+where the code expects an llm_config, build the agents, then call
+`use_fake_llm(agents)`. Replies are scripted from a hash of the request, so
+the same conversation always gets the same answers, and each call sleeps
+`latency_s` to stand in for the network.
+"""
+import time
+import random
+import hashlib
+from types import SimpleNamespace
+from typing import Dict, Iterable, List
+
+from autogen import Agent
+
+WORDS = ("price", "quality", "comfort", "recycled", "plastic", "fit", "style", "durable", "colour", "brand",
+         "would", "buy", "not", "sure", "like", "the", "idea", "worried", "about", "washing", "looks", "great",
+         "too", "expensive", "for", "me", "kids", "work", "weekend", "friends")
+
+
+def fake_llm_config(latency_s: float = 0.0, reply_words: int = 40) -> Dict:
+    """An llm_config routed to FakeModelClient."""
+    return {
+        "config_list": [{"model": "fake-gpt", "model_client_cls": "FakeModelClient",
+                         "latency_s": latency_s, "reply_words": reply_words}],
+        "cache_seed": None,
+    }
+
+
+def scripted_reply(messages: List[Dict], reply_words: int) -> str:
+    """The reply to a request, a pure function of its messages."""
+    digest = hashlib.sha256(repr([(m.get("name"), m.get("content")) for m in messages]).encode("utf-8")).digest()
+    rng = random.Random(digest)
+    return " ".join(rng.choice(WORDS) for _ in range(reply_words)).capitalize() + "."
+
+
+class FakeModelClient:
+    """autogen ModelClient returning scripted replies after a fixed latency."""
+
+    def __init__(self, config: Dict, **kwargs):
+        self.model = config.get("model", "fake-gpt")
+        self.latency_s = config.get("latency_s", 0.0)
+        self.reply_words = config.get("reply_words", 40)
+
+    def create(self, params: Dict) -> SimpleNamespace:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        messages = params["messages"]
+        content = scripted_reply(messages, self.reply_words)
+        prompt_tokens = sum(len(str(m.get("content") or "").split()) for m in messages)
+        message = SimpleNamespace(content=content, function_call=None, tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], model=self.model, cost=0.0,
+                               usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=self.reply_words,
+                                                     total_tokens=prompt_tokens + self.reply_words))
+
+    def message_retrieval(self, response: SimpleNamespace) -> List[str]:
+        return [choice.message.content for choice in response.choices]
+
+    def cost(self, response: SimpleNamespace) -> float:
+        return 0.0
+
+    @staticmethod
+    def get_usage(response: SimpleNamespace) -> Dict:
+        return {"prompt_tokens": response.usage.prompt_tokens, "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens, "cost": 0.0, "model": response.model}
+
+
+def use_fake_llm(agents: Iterable[Agent]) -> None:
+    """Activates FakeModelClient on every agent configured with `fake_llm_config()`."""
+    for agent in agents:
+        client = getattr(agent, "client", None)
+        # Skip agents without a model and those already activated (e.g. cached across runs)
+        if client is None or any(isinstance(c, FakeModelClient) for c in client._clients):
+            continue
+        agent.register_model_client(FakeModelClient)
+
+
+def fake_completer(latency_s: float = 0.0, reply_words: int = 40):
+    """A summarize.Completer returning scripted replies."""
+    def complete(messages: List[Dict]) -> str:
+        if latency_s:
+            time.sleep(latency_s)
+        return scripted_reply(messages, reply_words)
+    return complete
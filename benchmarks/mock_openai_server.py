@@ -0,0 +1,161 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint, with rate limits.
+
+Enforces requests- and tokens-per-minute limits like the real API: requests
+over the limit get a 429 with retry-after, every response carries the
+x-ratelimit-* headers, and completions (streamed or not) come back after a
+fixed latency. Point the app at it with OPENAI_BASE_URL:
+
+    python benchmarks/mock_openai_server.py --port 8765 --rpm 120 --tpm 60000 --latency 0.3
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OpenAI_APIKEY=mock streamlit run Home.py
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+from fake_llm import scripted_reply
+
+
+class Limits:
+    """
+    Server-side sliding windows for requests and tokens.
+
+    The per-minute limits are enforced pro rata over `window_s` seconds, like
+    the real API does over short periods; remaining counts refer to the window.
+    """
+
+    def __init__(self, rpm: int, tpm: int, window_s: float = 60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window_s = window_s
+        self.window_requests = max(1, int(rpm * window_s / 60))
+        self.window_tokens = max(1, int(tpm * window_s / 60))
+        self._events = []  # (timestamp, tokens)
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.throttled = 0
+
+    def admit(self, tokens: int) -> Tuple[bool, Dict[str, str]]:
+        with self._lock:
+            now = time.time()
+            self._events = [event for event in self._events if event[0] > now - self.window_s]
+            used_requests = len(self._events)
+            used_tokens = sum(event[1] for event in self._events)
+            # A request larger than the whole window is let through on an empty window
+            ok = used_requests + 1 <= self.window_requests and (used_tokens + tokens <= self.window_tokens or not used_tokens)
+            if ok:
+                self._events.append((now, tokens))
+                used_requests += 1
+                used_tokens += tokens
+                self.accepted += 1
+            else:
+                self.throttled += 1
+            oldest = self._events[0][0] if self._events else now
+            reset = max(0.0, oldest + self.window_s - now)
+            headers = {
+                "x-ratelimit-limit-requests": str(self.rpm),
+                "x-ratelimit-limit-tokens": str(self.tpm),
+                "x-ratelimit-remaining-requests": str(max(0, self.window_requests - used_requests)),
+                "x-ratelimit-remaining-tokens": str(max(0, self.window_tokens - used_tokens)),
+                "x-ratelimit-reset-requests": f"{reset:.3f}s",
+                "x-ratelimit-reset-tokens": f"{reset:.3f}s",
+            }
+            if not ok:
+                headers["retry-after-ms"] = str(int(reset * 1000))
+            return ok, headers
+
+
+def make_handler(limits: Limits, latency_s: float, reply_words: int):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: Optional[bytes], headers: Dict[str, str], content_type="application/json"):
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", content_type)
+            if body is not None:
+                self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body is not None:
+                self.wfile.write(body)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self._send(404, b'{"error": {"message": "not found"}}', {})
+                return
+            messages = request.get("messages", [])
+            prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages) // 4
+            ok, headers = limits.admit(prompt_tokens + int(request.get("max_tokens") or 0))
+            if not ok:
+                error = {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+                self._send(429, json.dumps(error).encode(), headers)
+                return
+            time.sleep(latency_s)
+            content = scripted_reply(messages, reply_words)
+            model = request.get("model", "mock-gpt")
+            if request.get("stream"):
+                headers["Transfer-Encoding"] = "chunked"
+                self._send(200, None, headers, content_type="text/event-stream")
+                for i, word in enumerate(content.split(" ")):
+                    chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                             "choices": [{"index": 0, "delta": {"role": "assistant", "content": word if i == 0 else " " + word},
+                                          "finish_reason": None}]}
+                    self._chunk(f"data: {json.dumps(chunk)}\n\n")
+                done = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                self._chunk(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n")
+                self._chunk("")
+                return
+            body = {"id": "mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": reply_words,
+                              "total_tokens": prompt_tokens + reply_words}}
+            self._send(200, json.dumps(body).encode(), headers)
+
+        def _chunk(self, text: str) -> None:
+            data = text.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_server(port: int = 0, rpm: int = 120, tpm: int = 60000, latency_s: float = 0.3,
+                 reply_words: int = 40, window_s: float = 60.0) -> Tuple[ThreadingHTTPServer, Limits]:
+    """Starts the mock server on a background thread; port 0 picks a free port."""
+    limits = Limits(rpm, tpm, window_s)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(limits, latency_s, reply_words))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, limits
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rpm', type=int, default=120)
+    parser.add_argument('--tpm', type=int, default=60000)
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--reply-words', type=int, default=40)
+    parser.add_argument('--window', type=float, default=60.0, help="Seconds over which the limits are enforced.")
+    args = parser.parse_args()
+    server, limits = start_server(args.port, args.rpm, args.tpm, args.latency, args.reply_words, args.window)
+    print(f"Mock OpenAI API on http://127.0.0.1:{server.server_address[1]}/v1 ({args.rpm} RPM, {args.tpm} TPM)")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"accepted {limits.accepted}, throttled {limits.throttled}", flush=True)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
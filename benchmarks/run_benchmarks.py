@@ -0,0 +1,222 @@
+"""
+End-to-end benchmark suite, driven by the deterministic fake LLM in fake_llm.py.
+
+Measures, for panels of growing size, the Run page's agent setup, full panel
+rounds, speaker selection, transcript I/O and summarization chunking, plus one
+run of pannel.py's create_research_panel / create_group_chat flow. No API
+key or network is needed:
+
+    python benchmarks/run_benchmarks.py --sizes 5 50 500 -o benchmarks/results.jsonl
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results.jsonl
+
+Every run appends one JSON line with its environment and results; with
+`--baseline`, results are compared against the last run in that file.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import Any, Callable, Dict, List, Optional
+
+os.environ.setdefault('AUTOGEN_USE_DOCKER', '0')
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCH_DIR, os.path.dirname(BENCH_DIR)]
+
+from autogen.io import IOConsole, IOStream
+
+import focus_group as fg
+import panel_generator as pg
+from history_policy import HistoryPolicy
+from metrics import MetricsRecorder
+from scheduler import SpeakerScheduler
+from summarize import split_transcript, map_reduce_summary
+from transcript_store import TranscriptStore
+from fake_llm import fake_llm_config, use_fake_llm, fake_completer, scripted_reply
+import bench_scheduler
+
+# autogen logs every agent built with a custom model client at INFO
+logging.getLogger("autogen.oai.client").setLevel(logging.WARNING)
+
+
+class QuietConsole(IOConsole):
+    """Drops the transcript autogen prints for every turn, so the runs measure the chat and not the terminal."""
+
+    def print(self, *objects: Any, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+        pass
+
+
+def timed(fn: Callable) -> float:
+    started = time.perf_counter()
+    with IOStream.set_default(QuietConsole()):
+        fn()
+    return time.perf_counter() - started
+
+
+def result(bench: str, size: Optional[int], metric: str, value: float, unit: str) -> Dict:
+    return {"bench": bench, "size": size, "metric": metric, "value": round(value, 6), "unit": unit}
+
+
+def bench_panel_setup(size: int, personas: Dict[str, Dict], llm_config: Dict) -> List[Dict]:
+    """The Run page's agent setup: cold build, cached rerun, and assembling the chat at kickoff."""
+    factory = fg.PanelFactory()
+    policy = HistoryPolicy(kind="own_turns")
+    cold = timed(lambda: factory.agents(personas, llm_config, policy))
+    warm = timed(lambda: factory.agents(personas, llm_config, policy))
+    kickoff = timed(lambda: factory.build_panel(personas, llm_config, history_policy=policy))
+    return [result("panel_setup", size, "cold_s", cold, "s"),
+            result("panel_setup", size, "rerun_s", warm, "s"),
+            result("panel_setup", size, "kickoff_s", kickoff, "s")]
+
+
+def bench_panel_round(size: int, personas: Dict[str, Dict], llm_config: Dict) -> List[Dict]:
+    """Full panel rounds: every persona answers the moderator, in parallel for the opening and then in turn."""
+    results = []
+    for parallel_opening, label in ((True, "parallel"), (False, "sequential")):
+        # Admin, moderator, then one full round of answers (each followed by the moderator when sequential)
+        max_round = 4 if parallel_opening else 2 * size + 2
+        groupchat, manager, admin = fg.build_panel(personas, llm_config, max_round=max_round,
+                                                   parallel_opening=parallel_opening, max_interactions=1)
+        use_fake_llm(groupchat.agents + [manager])
+        manager.metrics = MetricsRecorder(f"bench-{size}", path=None)
+        manager.metrics.attach(groupchat.agents, moderator_name="Moderator")
+        elapsed = timed(lambda: admin.initiate_chat(manager, message="Tell us about a pant made of recycled plastic.",
+                                                    silent=True))
+        answers = sum(1 for message in groupchat.messages if message.get("name") not in ("Admin", "Moderator"))
+        results += [result(f"panel_round_{label}", size, "rounds_per_s", answers / size / elapsed, "rounds/s"),
+                    result(f"panel_round_{label}", size, "turns_per_s", len(groupchat.messages) / elapsed, "turns/s")]
+    return results
+
+
+def bench_selection(size: int, turns: int = 20000) -> List[Dict]:
+    """Cost of one speaker selection, the original function against SpeakerScheduler."""
+    agents, _, _ = bench_scheduler.make_panel(size)
+    legacy = timed(lambda: bench_scheduler.run(lambda last, gc: bench_scheduler.legacy_selection(last, gc, turns),
+                                               bench_scheduler.make_panel(size)[2], turns))
+    scheduler = timed(lambda: bench_scheduler.run(SpeakerScheduler(agents, max_interactions=turns),
+                                                  bench_scheduler.make_panel(size)[2], turns))
+    return [result("speaker_selection", size, "legacy_us_per_turn", legacy / turns * 1e6, "us"),
+            result("speaker_selection", size, "scheduler_us_per_turn", scheduler / turns * 1e6, "us")]
+
+
+def synthetic_transcript(size: int, turns_per_persona: int = 10) -> List[str]:
+    """Transcript lines of `turns_per_persona` 60-word answers per persona."""
+    return [f"**Persona {i % size}**: {scripted_reply([{'content': str(i)}], 60)}" for i in range(size * turns_per_persona)]
+
+
+def bench_transcripts(size: int, lines: List[str]) -> List[Dict]:
+    """Writing a study's messages to the transcript store and loading them back."""
+    with tempfile.TemporaryDirectory() as directory:
+        with TranscriptStore(os.path.join(directory, "transcripts.db")) as store:
+            study_id = store.new_study("bench", [f"Persona {i}" for i in range(size)])
+
+            def write():
+                for line in lines:
+                    speaker, content = line[2:].split("**: ", 1)
+                    store.append(study_id, speaker, content)
+                store.flush()
+            write_s = timed(write)
+            load_s = timed(lambda: store.lines(study_id))
+    return [result("transcript_io", size, "write_messages_per_s", len(lines) / write_s, "messages/s"),
+            result("transcript_io", size, "load_s", load_s, "s")]
+
+
+def bench_summarization(size: int, lines: List[str]) -> List[Dict]:
+    """Splitting the transcript into token-budgeted chunks and the map-reduce pipeline around them."""
+    chunks = []
+    split_s = timed(lambda: chunks.extend(split_transcript(lines, 6000)))
+    summary_s = timed(lambda: map_reduce_summary(lines, fake_completer(reply_words=200)))
+    return [result("summarization", size, "split_s", split_s, "s"),
+            result("summarization", size, "chunks", len(chunks), "chunks"),
+            result("summarization", size, "map_reduce_s", summary_s, "s")]
+
+
+def bench_pannel_flow(llm_config: Dict) -> List[Dict]:
+    """pannel.py's create_research_panel / create_group_chat flow on its fixed panel."""
+    import pannel
+    pannel.llm_config = llm_config
+    started = time.perf_counter()
+    agents = pannel.create_research_panel(HistoryPolicy(kind="own_turns", k=12))
+    scheduler = SpeakerScheduler(agents, moderator_name="Researcher", max_interactions=2)
+    groupchat, user_proxy, manager = pannel.create_group_chat(agents, scheduler, parallel_opening=True)
+    use_fake_llm(agents + [manager])
+    setup_s = time.perf_counter() - started
+    chat_s = timed(lambda: user_proxy.initiate_chat(manager, message="Gather customer insights on a clothes brand.",
+                                                    silent=True))
+    size = len(agents) - 1
+    return [result("pannel_flow", size, "setup_s", setup_s, "s"),
+            result("pannel_flow", size, "turns_per_s", len(groupchat.messages) / chat_s, "turns/s")]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(BENCH_DIR), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results: List[Dict], baseline_path: str, tolerance: float) -> int:
+    """Prints the change against the last run in `baseline_path`, returns the number of regressions."""
+    with open(baseline_path, "r") as f:
+        runs = [json.loads(line) for line in f if line.strip()]
+    if not runs:
+        return 0
+    baseline = {(r["bench"], r["size"], r["metric"]): r["value"] for r in runs[-1]["results"]}
+    regressions = 0
+    for r in results:
+        before = baseline.get((r["bench"], r["size"], r["metric"]))
+        if not before or r["unit"] == "chunks":
+            continue
+        if r["unit"] == "s" and max(r["value"], before) < 0.01:
+            continue  # Too short to compare reliably
+        ratio = r["value"] / before
+        # Throughputs should not drop, durations should not grow
+        worse = ratio < 1 - tolerance if r["unit"].endswith("/s") else ratio > 1 + tolerance
+        regressions += worse
+        print(f"{r['bench']:<28} {str(r['size']):>5} {r['metric']:<24} x{ratio:6.2f}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5, 50, 500])
+    parser.add_argument('--latency', type=float, default=0.0, help="Fake completion latency in seconds.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default=None, help="JSONL file to append this run to.")
+    parser.add_argument('--baseline', default=None, help="JSONL file whose last run the results are compared with.")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Relative change counted as a regression.")
+    args = parser.parse_args()
+
+    llm_config = fake_llm_config(latency_s=args.latency)
+    results = []
+    for size in args.sizes:
+        personas = pg.panel_records(pg.sample_panel(size, seed=args.seed))
+        lines = synthetic_transcript(size)
+        for bench in (lambda: bench_panel_setup(size, personas, llm_config),
+                      lambda: bench_panel_round(size, personas, llm_config),
+                      lambda: bench_selection(size),
+                      lambda: bench_transcripts(size, lines),
+                      lambda: bench_summarization(size, lines)):
+            for r in bench():
+                results.append(r)
+                print(f"{r['bench']:<28} {str(r['size']):>5} {r['metric']:<24} {r['value']:>14.4f} {r['unit']}", flush=True)
+    for r in bench_pannel_flow(llm_config):
+        results.append(r)
+        print(f"{r['bench']:<28} {str(r['size']):>5} {r['metric']:<24} {r['value']:>14.4f} {r['unit']}", flush=True)
+
+    regressions = compare(results, args.baseline, args.tolerance) if args.baseline and os.path.exists(args.baseline) else 0
+    if args.output:
+        run = {"run_at": time.time(), "git_commit": git_commit(), "python": platform.python_version(),
+               "platform": platform.platform(), "latency_s": args.latency, "sizes": args.sizes, "results": results}
+        with open(args.output, "a") as f:
+            f.write(json.dumps(run) + "\n")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
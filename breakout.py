@@ -0,0 +1,255 @@
+"""
+Breakout rooms for large panels.
+
+One group chat with one moderator takes its turns one after the other: with
+`max_round=20` and a handful of turns per participant, most personas of a
+large panel never get the floor. `run_breakouts` splits the panel into small
+rooms, each a complete focus group with its own moderator built from the same
+definition (prompt, routes, history policy, stall detection), runs the rooms
+concurrently and merges what they say into one plenary transcript:
+
+    breakout = run_breakouts(personas, product, llm_config, room_size=8, max_round=20)
+    breakout.plenary.lines()
+
+The rooms share the process's LLM pool (see llm_pool.py), so however many run
+at once, the requests in flight and the rate limits stay those of one app. The
+plenary keeps the messages in the order they arrive, with the brief once and
+each moderator named after its room; it is what the running analysis and the
+findings read, so a study gets one transcript and one set of notes.
+"""
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from autogen.io import IOConsole, IOStream
+
+import focus_group as fg
+from llm_cache import build_cache
+from metrics import MetricsRecorder, TurnMetrics
+
+# Personas per room, small enough for everyone to speak within max_round
+ROOM_SIZE = 8
+# Demographic field the rooms are stratified on
+ROOM_FIELD = "Age"
+MODERATOR = "Moderator"
+ADMIN = "Admin"
+
+
+def partition_panel(personas: Dict[str, Dict], room_size: int = ROOM_SIZE,
+                    field: Optional[str] = ROOM_FIELD) -> List[Dict[str, Dict]]:
+    """
+    Splits a panel into rooms of at most `room_size` personas, each with a mix of the panel.
+
+    The personas are sorted by `field` and dealt out to the rooms in turn, so
+    every room spans the whole range of that field instead of, say, one room
+    of retirees. The split only depends on the panel, the same panel always
+    gives the same rooms.
+
+    Parameters:
+        personas (Dict[str, Dict]): Persona records keyed as in docs/personas.json.
+        room_size (int): Maximum number of personas per room.
+        field (Optional[str]): Demographic field to stratify on, None keeps the panel's order.
+
+    Returns:
+        List[Dict[str, Dict]]: The rooms, with the personas' original keys; their sizes differ by one at most.
+    """
+    if room_size < 1:
+        raise ValueError("room_size must be at least 1.")
+    items = list(personas.items())
+    if field is not None:
+        items.sort(key=lambda item: str(item[1].get(field, "")))
+    n_rooms = max(1, -(-len(items) // room_size))
+    return [dict(items[room::n_rooms]) for room in range(n_rooms) if items[room::n_rooms]]
+
+
+def room_moderator(room: int) -> str:
+    """The moderator's name in the plenary transcript."""
+    return f"{MODERATOR} (room {room + 1})"
+
+
+class Plenary:
+    """
+    The merged transcript of the breakout rooms, in the order the messages arrive.
+
+    Every room opens with the same brief, it is kept once; the moderators are
+    renamed after their room, the personas keep their names. `on_message` is
+    called with each record as it is added, under the plenary's lock, so
+    whatever it writes to sees the messages in the plenary's order.
+    """
+
+    def __init__(self, on_message: Optional[Callable[[Dict], None]] = None):
+        self.messages: List[Dict] = []
+        self.on_message = on_message
+        self._brief = False
+        self._lock = threading.Lock()
+
+    def add(self, room: int, speaker: str, content: str) -> Optional[Dict]:
+        """Records one room message, returns its plenary record or None for a repeated brief."""
+        with self._lock:
+            if speaker == ADMIN:
+                if self._brief:
+                    return None
+                self._brief, room = True, None
+            elif speaker == MODERATOR:
+                speaker = room_moderator(room)
+            record = {"turn": len(self.messages), "room": room, "speaker": speaker, "content": content}
+            self.messages.append(record)
+            if self.on_message is not None:
+                self.on_message(record)
+            return record
+
+    def lines(self) -> List[str]:
+        """The transcript as "**speaker**: content" lines, the format of the analysis prompts."""
+        with self._lock:
+            return [f"**{message['speaker']}**: {message['content']}" for message in self.messages]
+
+
+class BreakoutGroupChatManager(fg.InstrumentedGroupChatManager):
+    """Manager of one breakout room: passes each message on to the plenary."""
+
+    # Set by run_room before the chat starts
+    room: int = 0
+    plenary: Optional[Plenary] = None
+
+    def _process_received_message(self, message, sender, silent):
+        if isinstance(message, dict):
+            content = message.get('content') or ""
+        elif isinstance(message, str):
+            content = message
+        else:
+            content = ""
+        if content.strip() and self.plenary is not None:
+            self.plenary.add(self.room, sender.name, content)
+        return super()._process_received_message(message, sender, silent)
+
+
+class QuietConsole(IOConsole):
+    """autogen IOStream dropping the console output, rooms streaming at once would interleave it."""
+
+    def print(self, *objects, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+        pass
+
+
+@dataclass
+class Room:
+    """One breakout room and how its discussion went."""
+
+    index: int
+    personas: Dict[str, Dict]
+    status: str = "queued"
+    error: Optional[str] = None
+    n_messages: int = 0
+    turns: List[TurnMetrics] = field(default_factory=list)
+    stalled: bool = False
+    elapsed_s: float = 0.0
+    # The room's llm_config for the analysis, the "analysis" route when routed
+    analysis_llm_config: Optional[Dict] = None
+
+    @property
+    def names(self) -> List[str]:
+        return [persona['Name'] for persona in self.personas.values()]
+
+    def record(self) -> Dict:
+        """JSON-serialisable summary of the room."""
+        return {"room": self.index, "personas": self.names, "status": self.status, "error": self.error,
+                "n_messages": self.n_messages, "stalled": self.stalled, "elapsed_s": round(self.elapsed_s, 3)}
+
+
+@dataclass
+class Breakout:
+    """A panel run as breakout rooms: the rooms and their plenary transcript."""
+
+    rooms: List[Room]
+    plenary: Plenary
+
+    @property
+    def status(self) -> str:
+        """The run's status, "completed" once every room completed; the plenary keeps what failed rooms said."""
+        return "completed" if all(room.status == "completed" for room in self.rooms) else "failed"
+
+    @property
+    def error(self) -> Optional[str]:
+        errors = [f"Room {room.index + 1}:\n{room.error}" for room in self.rooms if room.error]
+        return "\n".join(errors) or None
+
+    @property
+    def turns(self) -> List[TurnMetrics]:
+        return [turn for room in self.rooms for turn in room.turns]
+
+    @property
+    def analysis_llm_config(self) -> Optional[Dict]:
+        return next((room.analysis_llm_config for room in self.rooms if room.analysis_llm_config), None)
+
+
+def run_room(room: Room, product: str, llm_config: Dict, plenary: Plenary, study_id: str, **panel_kwargs) -> Room:
+    """
+    Runs one breakout room to completion, its messages going to `plenary`.
+
+    Parameters:
+        room (Room): The room, updated in place.
+        product (str): The opening message, the product brief.
+        llm_config (Dict): The autogen llm_config of the room's agents.
+        plenary (Plenary): The merged transcript.
+        study_id (str): The study the room's metrics are recorded under.
+        **panel_kwargs: Passed on to `focus_group.build_panel`, e.g. max_round, moderator_prompt or router.
+
+    Returns:
+        Room: The room.
+    """
+    started = time.time()
+    room.status = "running"
+    manager = None
+    try:
+        # A factory per room: its own moderator, manager and agents, nothing shared between threads
+        groupchat, manager, admin = fg.build_panel(room.personas, llm_config, manager_cls=BreakoutGroupChatManager,
+                                                   **panel_kwargs)
+        manager.room, manager.plenary = room.index, plenary
+        room.analysis_llm_config = manager.analysis_llm_config
+        manager.metrics = MetricsRecorder(study_id)
+        manager.metrics.attach(groupchat.agents, moderator_name=MODERATOR)
+        with IOStream.set_default(QuietConsole()):
+            admin.initiate_chat(manager, message=product, cache=build_cache(), silent=True)
+        room.n_messages = len(groupchat.messages)
+        room.status = "completed"
+    except Exception:
+        room.status = "failed"
+        room.error = traceback.format_exc()
+    if manager is not None:
+        room.turns = manager.metrics.turns if manager.metrics is not None else []
+        room.stalled = manager.stall_detector is not None and manager.stall_detector.stalled
+    room.elapsed_s = time.time() - started
+    return room
+
+
+def run_breakouts(personas: Dict[str, Dict], product: str, llm_config: Dict, room_size: int = ROOM_SIZE,
+                  max_rooms: Optional[int] = None, room_field: Optional[str] = ROOM_FIELD, study_id: str = "breakout",
+                  on_message: Optional[Callable[[Dict], None]] = None, **panel_kwargs) -> Breakout:
+    """
+    Runs a panel as concurrent breakout rooms and merges them into one plenary transcript.
+
+    Parameters:
+        personas (Dict[str, Dict]): Persona records keyed as in docs/personas.json.
+        product (str): The opening message, the product brief, sent to every room.
+        llm_config (Dict): The autogen llm_config of the agents.
+        room_size (int): Maximum number of personas per room, see `partition_panel`.
+        max_rooms (Optional[int]): Rooms running at once, all of them by default: past its opening round a
+            room has one request in flight, and the LLM pool's concurrency limit throttles them either way.
+            A room's agents are only built once it starts, so a cap also bounds the agents alive at a time.
+        room_field (Optional[str]): Demographic field the rooms are stratified on.
+        study_id (str): The study the metrics are recorded under.
+        on_message (Optional[Callable[[Dict], None]]): Called with each plenary record as it arrives.
+        **panel_kwargs: Passed on to `focus_group.build_panel` for every room, e.g. max_round,
+            moderator_prompt, history_policy, stall_detection or router.
+
+    Returns:
+        Breakout: The rooms and the plenary.
+    """
+    plenary = Plenary(on_message)
+    rooms = [Room(index, members) for index, members in enumerate(partition_panel(personas, room_size, room_field))]
+    workers = min(max_rooms or len(rooms), len(rooms))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="breakout") as pool:
+        list(pool.map(lambda room: run_room(room, product, llm_config, plenary, study_id, **panel_kwargs), rooms))
+    return Breakout(rooms, plenary)
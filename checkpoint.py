@@ -0,0 +1,128 @@
+"""
+Turn-level checkpoints of focus groups, and resuming interrupted ones.
+
+A `Checkpointer` set as a FanOutGroupChat's `on_turn` saves, after every
+turn, the group chat messages, the speaker scheduler's counters, the last and
+next speaker and a hash of the panel configuration to the transcript store.
+`resume_chat` rebuilds the conversation on a freshly built panel from the
+last checkpoint and continues it from there, so the completions of earlier
+turns are not requested again.
+"""
+import copy
+from typing import Dict, List, Optional
+
+from autogen import Agent, ConversableAgent, GroupChat, GroupChatManager
+
+from focus_group import config_hash
+from transcript_store import TranscriptStore
+
+
+def chat_config_hash(groupchat: GroupChat) -> str:
+    """
+    Digest of what a group chat's continuation depends on: agents and their prompts, models, rounds and speaker settings.
+
+    API keys and clients are left out so the hash survives a restart.
+    """
+    agents = []
+    for agent in groupchat.agents:
+        llm_config = getattr(agent, "llm_config", None) or {}
+        models = [{key: value for key, value in entry.items() if key not in ("api_key", "http_client", "base_url")}
+                  for entry in llm_config.get("config_list", [])]
+        agents.append([agent.name, getattr(agent, "system_message", None), models])
+    settings = getattr(groupchat.speaker_selection_method, "settings", None)
+    return config_hash(agents, groupchat.max_round, getattr(groupchat, "parallel_opening", False),
+                       settings() if settings is not None else None)
+
+
+class Checkpointer:
+    """
+    Saves a study's group chat to the transcript store after every turn.
+
+    Pass it as the group chat's `on_turn` when building the panel (the
+    manager works on a copy of the group chat made at construction), then
+    `bind` it to the built group chat.
+    """
+
+    def __init__(self, store: TranscriptStore, study_id: str):
+        self.store = store
+        self.study_id = study_id
+        self.config_hash: Optional[str] = None
+        # Chat rounds played; the parallel opening adds messages without using rounds
+        self.rounds = 0
+
+    def bind(self, groupchat: GroupChat, checkpoint: Optional[Dict] = None) -> None:
+        """
+        Takes the configuration hash from the panel as built, before a resume shortens its rounds.
+
+        When resuming from `checkpoint`, its turn is played again first and counted again.
+        """
+        self.config_hash = chat_config_hash(groupchat)
+        self.rounds = checkpoint["state"]["rounds"] - 1 if checkpoint is not None else 0
+
+    def __call__(self, groupchat: GroupChat, last_speaker: Agent, next_speaker: Optional[Agent],
+                 selection_state: Optional[Dict]) -> None:
+        self.rounds += 1
+        self.store.save_checkpoint(self.study_id, groupchat.messages, last_speaker.name,
+                                   next_speaker.name if next_speaker is not None else None,
+                                   self.config_hash or chat_config_hash(groupchat),
+                                   {"selection": selection_state, "rounds": self.rounds})
+
+
+def _restore_histories(agents: List[Agent], manager: GroupChatManager, messages: List[Dict]) -> None:
+    """Gives the agents the conversation with the manager they had after `messages`, as run_chat would have."""
+    for message in messages:
+        for agent in agents:
+            if not isinstance(agent, ConversableAgent):
+                continue
+            if agent.name == message.get("name"):
+                own = {key: value for key, value in message.items() if key != "name"}
+                agent._append_oai_message(own, "assistant", manager)
+            else:
+                agent._append_oai_message(message, "user", manager)
+
+
+def resume_chat(checkpoint: Dict, groupchat: GroupChat, manager: GroupChatManager, admin: Agent,
+                store: Optional[TranscriptStore] = None, cache=None) -> None:
+    """
+    Continues a group chat from its last checkpoint.
+
+    Parameters:
+        checkpoint (Dict): A checkpoint from `TranscriptStore.load_checkpoint`.
+        groupchat (GroupChat): A freshly built group chat for the same panel, with no messages.
+        manager (GroupChatManager): Its manager.
+        admin (Agent): The agent who opened the chat, in case the checkpoint was taken right after its message.
+        store (Optional[TranscriptStore]): The transcript store; messages recorded after the checkpoint are dropped
+            from the study's transcript since those turns are played again.
+        cache: The completion cache for the rest of the chat, as for `initiate_chat`.
+
+    Raises:
+        ValueError: The panel differs from the one the checkpoint was taken on.
+    """
+    if checkpoint["config_hash"] != chat_config_hash(groupchat):
+        raise ValueError(f"The panel of study {checkpoint['study_id']} changed since its last checkpoint "
+                         "(personas, prompts, model or speaker settings), it cannot be resumed.")
+    messages = checkpoint["messages"]
+    speakers = {agent.name: agent for agent in groupchat.agents + [admin]}
+    last_speaker = speakers[checkpoint["last_speaker"]]
+
+    if store is not None:
+        store.truncate(checkpoint["study_id"], checkpoint["transcript_turns"])
+    groupchat.messages[:] = messages[:-1]
+    _restore_histories(groupchat.agents, manager, messages[:-1])
+    if last_speaker in groupchat.agents:
+        # The others get the last message from run_chat's broadcast, the speaker keeps its own copy
+        _restore_histories([last_speaker], manager, messages[-1:])
+    restore = getattr(groupchat.speaker_selection_method, "restore", None)
+    if restore is not None and checkpoint["state"].get("selection") is not None:
+        restore(checkpoint["state"]["selection"])
+
+    # run_chat appends and broadcasts the last message again, then plays the rounds left
+    remaining = copy.copy(groupchat)
+    remaining.max_round = groupchat.max_round - checkpoint["state"]["rounds"] + 1
+    if remaining.max_round <= 0:
+        return
+    previous_cache, manager.client_cache = manager.client_cache, cache
+    try:
+        manager.run_chat(messages=[dict(messages[-1])], sender=last_speaker, config=remaining)
+    finally:
+        manager.client_cache = previous_cache
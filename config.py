@@ -1,17 +1,22 @@
-from openai import OpenAI
 import os
-from dotenv import load_dotenv
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
 import streamlit as st
 
-#load_dotenv(find_dotenv())
-load_dotenv('.env')
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+# openai, httpx and .env are loaded with the client pool, on the first completion rather than at import
 @dataclass(frozen=True)
 
 
 class APIkeys:
-    OpenAI_APIKEY: str = os.getenv('OpenAI_APIKEY')
+    OpenAI_APIKEY: str = field(default_factory=lambda: os.getenv('OpenAI_APIKEY'))
 
-completions_model = OpenAI(api_key=st.secrets["OpenAI_APIKEY"])
+@st.cache_resource
+def get_completions_client() -> "OpenAI":
+    """One OpenAI client per server process, built on first use, on the shared rate-limited pool."""
+    from llm_pool import get_pool
+    return get_pool().openai_client()
 
 #model = ChatOpenAI(model="llama3:latest", base_url="http://localhost:11434/v1", api_key="ollama")
\ No newline at end of file
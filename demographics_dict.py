@@ -16,4 +16,17 @@ number_of_children = ['0', '1', '2', '3', '4+']
 
 occupation = ['Management', 'Sales', 'Clerical', 'Service', 'Production', 'Technical', 'Other']
 
-hobbies = ['Sports', 'Music', 'Reading', 'Cooking', 'Traveling', 'Exercise', 'Pets', 'Shopping', 'Movies', 'Gardening', 'Games', 'Other']
\ No newline at end of file
+hobbies = ['Sports', 'Music', 'Reading', 'Cooking', 'Traveling', 'Exercise', 'Pets', 'Shopping', 'Movies', 'Gardening', 'Games', 'Other']
+
+# Single-valued persona record fields and their options, in the order the Home page asks for them
+persona_fields = {
+    'Age': age_groups,
+    'Gender': gender_groups,
+    'Location': geographic_location,
+    'Education': education_levels,
+    'Employment': employment_status,
+    'Income': income_levels,
+    'Marital Status': marital_status,
+    'Children': number_of_children,
+    'Occupation': occupation,
+}
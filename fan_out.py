@@ -0,0 +1,111 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from autogen import Agent, GroupChat
+
+import llm_pool
+
+
+def run_opening_round(groupchat: GroupChat, manager: Agent, moderator: Agent,
+                      max_workers: Optional[int] = None) -> List[Tuple[Agent, Union[str, Dict]]]:
+    """
+    Sends the moderator's opening question to every participant at once.
+
+    Every participant already holds the question in its history (the manager
+    broadcasts each message before selecting the next speaker), so the replies
+    are generated concurrently and then recorded one by one, in the order of
+    `groupchat.agents`, exactly as the manager would record sequential turns.
+
+    Parameters:
+        groupchat (GroupChat): The running group chat.
+        manager (Agent): The group chat manager driving the conversation.
+        moderator (Agent): The agent who asked the opening question.
+        max_workers (Optional[int]): Cap on concurrent completions, defaults to the LLM pool's maximum
+            requests in flight; more threads would only wait on the pool.
+
+    Returns:
+        List[Tuple[Agent, Union[str, Dict]]]: The recorded (participant, reply) pairs.
+    """
+    participants = [agent for agent in groupchat.agents if agent is not moderator]
+    if not participants:
+        return []
+    # Each reply runs in a copy of the caller's context, so it prints to the caller's IOStream
+    contexts = [contextvars.copy_context() for _ in participants]
+    workers = min(max_workers or llm_pool.get_pool().concurrency.max_limit, len(participants))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        replies = list(pool.map(lambda agent, context: context.run(agent.generate_reply, sender=manager),
+                                participants, contexts))
+
+    # A SpeakerScheduler counts the turns itself, plain selection functions keep counters on the chat
+    spoke = getattr(groupchat.speaker_selection_method, "spoke", None)
+    counters = getattr(groupchat, "interaction_counters", None)
+    recorded = []
+    for agent, reply in zip(participants, replies):
+        if reply is None:
+            continue
+        # Same bookkeeping as GroupChatManager.run_chat does for a single turn
+        agent.send(reply, manager, request_reply=False)
+        message = manager.last_message(agent)
+        groupchat.append(message, agent)
+        for other in groupchat.agents:
+            if other is not agent:
+                manager.send(message, other, request_reply=False, silent=True)
+        if spoke is not None:
+            spoke(agent.name)
+        elif counters is not None and agent.name in counters:
+            counters[agent.name] += 1
+        recorded.append((agent, reply))
+    return recorded
+
+
+@dataclass
+class FanOutGroupChat(GroupChat):
+    """
+    GroupChat that can answer the moderator's first question in parallel.
+
+    With `parallel_opening` enabled, the first time `moderator_name` speaks all
+    other agents reply concurrently and the floor goes back to the moderator,
+    so the opening round costs roughly one completion latency instead of N.
+    The opening answers are not charged against `max_round`: the manager counts
+    its own rounds, and the whole opening round takes none of them (checkpoint.py
+    counts rounds the same way), so a chat with a parallel opening holds up to
+    `max_round` messages plus one answer per participant.
+
+    `on_turn`, when set, is called once the chat is complete up to a turn, with
+    the group chat, the last speaker, the next speaker and the speaker
+    selection state from before that speaker was picked, e.g. to checkpoint
+    the chat (see checkpoint.py).
+    """
+
+    moderator_name: str = "Moderator"
+    parallel_opening: bool = False
+    max_workers: Optional[int] = None
+    on_turn: Optional[Callable[[GroupChat, Agent, Agent, Optional[Dict]], None]] = None
+
+    def is_opening_question(self, last_speaker: Agent) -> bool:
+        # Derived from the shared message list rather than a flag: the manager
+        # runs the chat on a shallow copy of this object, so flags set on it
+        # would leak into the next run.
+        if last_speaker.name != self.moderator_name:
+            return False
+        return sum(1 for message in self.messages if message.get("name") == self.moderator_name) == 1
+
+    def selection_state(self) -> Optional[Dict]:
+        """State of the speaker selection method, if it has any (see SpeakerScheduler.state)."""
+        state = getattr(self.speaker_selection_method, "state", None)
+        return state() if state is not None else None
+
+    def select_speaker(self, last_speaker: Agent, selector: Agent) -> Agent:
+        if self.parallel_opening and self.is_opening_question(last_speaker):
+            recorded = run_opening_round(self, selector, last_speaker, max_workers=self.max_workers)
+            if recorded and self.on_turn is not None:
+                # Picking up after the last answer gives the floor back to the moderator, as here
+                self.on_turn(self, recorded[-1][0], last_speaker, self.selection_state())
+            return last_speaker
+        state = self.selection_state() if self.on_turn is not None else None
+        speaker = super().select_speaker(last_speaker, selector)
+        if self.on_turn is not None:
+            self.on_turn(self, last_speaker, speaker, state)
+        return speaker
@@ -0,0 +1,281 @@
+"""
+Typed findings of focus groups, stored as a Parquet dataset for cross-study queries.
+
+`extract_findings` turns a transcript into one `Finding` per opinion a
+participant gave (kind, theme, sentiment, verbatim quote, suggestion), with
+that participant's demographics attached. `FindingsStore` keeps them under
+docs/findings/, hive-partitioned by date and study, so a question such as
+"which pain points recur across the last 50 studies among 55-64 year olds"
+is a local query: partitions are pruned by date and study, and filters on
+the demographic columns are pushed down to the Parquet row groups.
+
+    store = FindingsStore()
+    store.recurring(kind="pain_point", study_ids=store.recent_studies(50), age=(55, 64))
+"""
+import os
+import re
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict, fields
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+import demographics_dict as dd
+from summarize import Completer, split_transcript
+
+FINDINGS_DIR = "./docs/findings"
+FINDING_KINDS = ("pain_point", "preference", "praise", "concern", "suggestion")
+
+# Persona record field -> column, e.g. "Marital Status" -> "marital_status"
+DEMOGRAPHIC_COLUMNS = {field: field.lower().replace(" ", "_") for field in dd.persona_fields}
+
+extraction_prompt = """
+    You extract findings from one part of a focus group transcript. For every opinion a participant gives
+    (not the moderator or the admin), return one finding with:
+    "persona" (the participant's name as written), "kind" (one of {kinds}), "theme" (a two to four word label,
+    lowercase; reuse one of the known themes below when it fits), "sentiment" (from -1, very negative, to 1, very
+    positive), "quote" (the participant's own words, verbatim and short) and "suggestion" (what they propose, or null).
+    Return only a JSON object {{"findings": [...]}}.
+    Known themes: {themes}
+    """
+
+
+@dataclass
+class Finding:
+    """One opinion of one participant in one study, with the participant's demographics."""
+
+    study_id: str
+    date: str
+    created_at: float
+    product: str
+    persona: str
+    kind: str
+    theme: str
+    sentiment: float
+    quote: str
+    suggestion: Optional[str] = None
+    age: Optional[str] = None
+    age_min: Optional[int] = None
+    age_max: Optional[int] = None
+    gender: Optional[str] = None
+    location: Optional[str] = None
+    education: Optional[str] = None
+    employment: Optional[str] = None
+    income: Optional[str] = None
+    marital_status: Optional[str] = None
+    children: Optional[str] = None
+    occupation: Optional[str] = None
+
+
+_TYPES = {"created_at": pa.float64(), "sentiment": pa.float32(), "age_min": pa.int16(), "age_max": pa.int16()}
+FINDINGS_SCHEMA = pa.schema([(field.name, _TYPES.get(field.name, pa.string())) for field in fields(Finding)])
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string()), ("study_id", pa.string())]), flavor="hive")
+
+
+def age_range(age: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """Bounds of an age bracket of the persona records, e.g. "55-64" -> (55, 64), "65+" -> (65, 120)."""
+    numbers = [int(number) for number in re.findall(r"\d+", age or "")]
+    if not numbers:
+        return None, None
+    if age.startswith("<"):
+        return 0, numbers[0] - 1
+    if age.endswith("+"):
+        return numbers[0], 120
+    return numbers[0], numbers[-1]
+
+
+def theme_label(theme: str) -> str:
+    """Normalises a theme so the same theme matches across studies: lowercase words, single spaces."""
+    return " ".join(re.findall(r"[a-z0-9']+", (theme or "").lower()))
+
+
+def _parse_findings(text: str) -> List[Dict]:
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("The findings extraction returned no JSON object.")
+    return json.loads(text[start:end + 1]).get("findings") or []
+
+
+def extract_findings(study_id: str, product: str, lines: List[str], personas: Dict[str, Dict], complete: Completer,
+                     created_at: Optional[float] = None, themes: Sequence[str] = (), chunk_tokens: int = 6000,
+                     max_workers: int = 8) -> List[Finding]:
+    """
+    Extracts the typed findings of one study, its transcript parts concurrently.
+
+    Parameters:
+        study_id (str): The study.
+        product (str): Its product brief.
+        lines (List[str]): The transcript, one entry per message.
+        personas (Dict[str, Dict]): The panel's persona records, for the demographics; findings attributed to
+            anyone else (the moderator, a misspelt name) are dropped.
+        complete (Completer): The completion function, see summarize.py.
+        created_at (Optional[float]): When the study ran, now by default; gives its date partition.
+        themes (Sequence[str]): Themes already in the store, offered for reuse so themes match across studies.
+        chunk_tokens (int): Token budget per transcript part.
+        max_workers (int): Maximum number of concurrent completions.
+
+    Returns:
+        List[Finding]: The findings, in transcript order.
+    """
+    created_at = created_at or time.time()
+    date = time.strftime("%Y-%m-%d", time.localtime(created_at))
+    prompt = extraction_prompt.format(kinds=", ".join(FINDING_KINDS), themes=", ".join(themes) or "none yet")
+    records = {persona["Name"]: persona for persona in personas.values()}
+    chunks = split_transcript(lines, chunk_tokens)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        replies = list(pool.map(lambda chunk: complete([{"role": "system", "content": prompt},
+                                                        {"role": "user", "content": chunk}]), chunks))
+    findings = []
+    for reply in replies:
+        for item in _parse_findings(reply):
+            persona = records.get(item.get("persona"))
+            if persona is None or item.get("kind") not in FINDING_KINDS:
+                continue
+            demographics = {column: str(persona[field]) if persona.get(field) is not None else None
+                            for field, column in DEMOGRAPHIC_COLUMNS.items()}
+            age_min, age_max = age_range(demographics.get("age"))
+            try:
+                sentiment = max(-1.0, min(1.0, float(item.get("sentiment") or 0)))
+            except (TypeError, ValueError):
+                sentiment = 0.0
+            findings.append(Finding(study_id=study_id, date=date, created_at=created_at, product=product,
+                                    persona=persona["Name"], kind=item["kind"], theme=theme_label(item.get("theme")),
+                                    sentiment=sentiment, quote=str(item.get("quote") or ""),
+                                    suggestion=item.get("suggestion") or None, age_min=age_min, age_max=age_max,
+                                    **demographics))
+    return findings
+
+
+class FindingsStore:
+    """
+    Parquet dataset of findings, hive-partitioned by date and study.
+
+    Writing a study replaces its partition, so extracting it again does not
+    duplicate its findings. Queries read only the columns asked for, skip
+    the partitions outside the date range and study ids, and push the other
+    filters down to the row group statistics.
+    """
+
+    def __init__(self, root: str = FINDINGS_DIR):
+        self.root = root
+        self._dataset: Optional[ds.Dataset] = None
+
+    def write(self, findings: List[Finding]) -> None:
+        """Stores the findings of one or more studies, replacing what was stored for those studies."""
+        if not findings:
+            return
+        table = pa.Table.from_pylist([asdict(finding) for finding in findings], schema=FINDINGS_SCHEMA)
+        os.makedirs(self.root, exist_ok=True)
+        ds.write_dataset(table, self.root, format="parquet", partitioning=PARTITIONING,
+                         existing_data_behavior="delete_matching", basename_template="part-{i}.parquet",
+                         file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"))
+        self._dataset = None
+
+    def dataset(self) -> Optional[ds.Dataset]:
+        """The dataset, None while nothing is stored. Discovered once, until the next write."""
+        if self._dataset is None and os.path.isdir(self.root):
+            self._dataset = ds.dataset(self.root, schema=FINDINGS_SCHEMA, format="parquet", partitioning=PARTITIONING)
+        return self._dataset
+
+    def query(self, columns: Optional[List[str]] = None, where: Optional[ds.Expression] = None,
+              study_ids: Optional[Sequence[str]] = None, since: Optional[str] = None, until: Optional[str] = None,
+              age: Optional[Tuple[int, int]] = None, **equals: Union[str, Sequence[str]]) -> pa.Table:
+        """
+        Reads the findings matching every filter given.
+
+        Parameters:
+            columns (Optional[List[str]]): Columns to read, all by default.
+            where (Optional[ds.Expression]): Any other pyarrow filter, e.g. `ds.field("sentiment") < 0`.
+            study_ids (Optional[Sequence[str]]): Only these studies.
+            since (Optional[str]): First date, "YYYY-MM-DD".
+            until (Optional[str]): Last date, "YYYY-MM-DD".
+            age (Optional[Tuple[int, int]]): Personas whose age bracket overlaps this range, e.g. (55, 64).
+            **equals: Column values, one or a list, e.g. gender="female", kind=["pain_point", "concern"].
+
+        Returns:
+            pa.Table: The matching findings.
+        """
+        dataset = self.dataset()
+        if dataset is None:
+            return FINDINGS_SCHEMA.empty_table().select(columns or FINDINGS_SCHEMA.names)
+        conditions = [] if where is None else [where]
+        if study_ids is not None:
+            conditions.append(ds.field("study_id").isin(list(study_ids)))
+        if since:
+            conditions.append(ds.field("date") >= since)
+        if until:
+            conditions.append(ds.field("date") <= until)
+        if age is not None:
+            conditions += [ds.field("age_max") >= age[0], ds.field("age_min") <= age[1]]
+        for column, value in equals.items():
+            if column not in FINDINGS_SCHEMA.names:
+                raise ValueError(f"Unknown findings column {column!r}.")
+            is_list = isinstance(value, (list, tuple, set))
+            conditions.append(ds.field(column).isin(list(value)) if is_list else ds.field(column) == value)
+        condition = None
+        for expression in conditions:
+            condition = expression if condition is None else condition & expression
+        return dataset.to_table(columns=columns, filter=condition)
+
+    def partitions(self) -> List[Dict[str, str]]:
+        """The {"date", "study_id"} of every stored study, from the directory layout alone."""
+        dataset = self.dataset()
+        if dataset is None:
+            return []
+        keys = {tuple(sorted(ds.get_partition_keys(fragment.partition_expression).items()))
+                for fragment in dataset.get_fragments()}
+        return [dict(key) for key in keys]
+
+    def recent_studies(self, n: int) -> List[str]:
+        """Ids of the `n` most recent studies with findings."""
+        partitions = sorted(self.partitions(), key=lambda partition: partition["date"], reverse=True)
+        if not partitions or n <= 0:
+            return []
+        # Only studies of the n-th most recent study's date or later are read, to order studies of the same day
+        cutoff = partitions[min(n, len(partitions)) - 1]["date"]
+        table = self.query(columns=["study_id", "created_at"], since=cutoff)
+        latest = table.group_by("study_id").aggregate([("created_at", "max")]).sort_by([("created_at_max", "descending")])
+        return latest.column("study_id").to_pylist()[:n]
+
+    def has_study(self, study_id: str) -> bool:
+        return any(partition["study_id"] == study_id for partition in self.partitions())
+
+    def themes(self, limit: int = 50) -> List[str]:
+        """The most frequent themes, offered to the extraction so new studies reuse them."""
+        table = self.query(columns=["theme"])
+        if table.num_rows == 0:
+            return []
+        counts = pc.value_counts(table.column("theme"))
+        ordered = sorted(counts.to_pylist(), key=lambda count: -count["counts"])
+        return [count["values"] for count in ordered[:limit]]
+
+    def recurring(self, kind: Optional[Union[str, Sequence[str]]] = "pain_point", min_studies: int = 2,
+                  **filters) -> pd.DataFrame:
+        """
+        Themes found in at least `min_studies` studies, most widespread first.
+
+        Parameters:
+            kind (Optional[Union[str, Sequence[str]]]): The kinds of finding counted, any kind if None.
+            min_studies (int): Minimum number of studies a theme appears in.
+            **filters: Filters of `query`, e.g. study_ids=store.recent_studies(50), age=(55, 64).
+
+        Returns:
+            pd.DataFrame: theme, studies, mentions, personas, mean sentiment and one example quote.
+        """
+        if kind is not None:
+            filters["kind"] = kind
+        table = self.query(columns=["theme", "study_id", "persona", "sentiment", "quote"], **filters)
+        columns = ["theme", "studies", "mentions", "personas", "sentiment", "example"]
+        if table.num_rows == 0:
+            return pd.DataFrame(columns=columns)
+        frame = table.to_pandas()
+        summary = frame.groupby("theme").agg(studies=("study_id", "nunique"), mentions=("quote", "size"),
+                                             personas=("persona", "nunique"), sentiment=("sentiment", "mean"),
+                                             example=("quote", "first")).reset_index()
+        summary = summary[summary["studies"] >= min_studies]
+        return summary.sort_values(["studies", "mentions"], ascending=False)[columns].reset_index(drop=True)
@@ -0,0 +1,320 @@
+import os
+import json
+import hashlib
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import autogen
+from autogen import AssistantAgent, UserProxyAgent, Agent
+
+import persona_handler as ph
+from fan_out import FanOutGroupChat
+from history_policy import HistoryPolicy, apply_history_policy, reset_history_policy
+from llm_pool import get_pool
+from metrics import MetricsRecorder
+from model_router import ModelRouter
+from novelty import StallDetector
+from persona_library import PERSONAS_FILE, load_records
+from scheduler import SpeakerPolicy, SpeakerScheduler
+
+moderator_prompt = '''
+    You keep the conversation flowing between group members. Limit your self just to moderate the debate do not express opinion as participant. Stay in character as moderator.
+    Do not reply more than once before another group member speaks again. You can answer group members questions, but you do not offer additional information and be as much concise as possible when responding.
+    Do not offer opinions about the topic or user_input, only moderate the conversation.
+    Do not say thank you or the end. If there is no mor to say terminate the conversation saying TERMINATE, avoid a greetings loop between the participants.
+    This is the list of participants {} please make sure that everyone speaks more than once.'''
+
+
+def is_termination_msg(message: Dict) -> bool:
+    """Returns True when a message asks to end the conversation."""
+    return "TERMINATE" in (message.get("content") or "")
+
+
+def make_llm_config(api_key: Optional[str] = None, model: str = 'gpt-4o', max_tokens: int = 4096,
+                    temperature: float = 0, stream: bool = False) -> Dict:
+    """
+    Builds the llm_config shared by every agent of a focus group.
+
+    Parameters:
+        api_key (Optional[str]): The OpenAI API key, resolved by `llm_pool.resolve_api_key` when omitted.
+        model (str): The model used by the moderator and the personas.
+        max_tokens (int): Completion token cap per turn.
+        temperature (float): Sampling temperature.
+        stream (bool): Stream completions token by token through autogen's IOStream.
+
+    Returns:
+        Dict: The autogen llm_config.
+    """
+    return {
+        "config_list": [
+            get_pool().config_entry(model, api_key, max_tokens=max_tokens, temperature=temperature, stream=stream)
+        ],
+        "cache_seed": None
+    }
+
+
+def load_personas(path: str = PERSONAS_FILE) -> Dict[str, Dict]:
+    """Load the persona records saved by the Home page, or a panel from panel_generator.py (.parquet)."""
+    return load_records(path)
+
+
+class InstrumentedGroupChatManager(autogen.GroupChatManager):
+    # Set before the chat starts to record latency, tokens and cost per turn
+    metrics: Optional[MetricsRecorder] = None
+    # Set by build_panel to skip participants who repeat themselves; ending the chat goes through is_termination_msg
+    stall_detector: Optional[StallDetector] = None
+    # Set by build_panel: the llm_config of the running analysis and findings, the "analysis" route when routed
+    analysis_llm_config: Optional[Dict] = None
+
+    def record_turn(self, sender: Agent, first_token_at: Optional[float] = None) -> None:
+        if self.metrics is not None:
+            self.metrics.record(sender, first_token_at=first_token_at)
+
+    def check_stall(self, message: Union[Dict, str], sender: Agent) -> None:
+        """Scores a persona's message and takes the floor away from a persona who keeps repeating themselves."""
+        content = message.get("content") if isinstance(message, dict) else message
+        if self.stall_detector is None or not isinstance(content, str):
+            return
+        # Only the personas' answers count: the moderator's follow-ups are templated and the admin only briefs
+        if sender.name == self._groupchat.moderator_name or sender.name not in self._groupchat.agent_names:
+            return
+        verdict = self.stall_detector.observe(sender.name, content)
+        mute = getattr(self._groupchat.speaker_selection_method, "mute", None)
+        if verdict.skip_speaker and mute is not None:
+            mute(sender.name)
+
+    def _process_received_message(self, message, sender, silent):
+        # No-op if a subclass already recorded this turn
+        self.record_turn(sender)
+        self.check_stall(message, sender)
+        return super()._process_received_message(message, sender, silent)
+
+
+def stall_termination(detector: StallDetector) -> Callable[[Dict], bool]:
+    """is_termination_msg that also ends the chat once `detector` finds it stalled."""
+    return lambda message: is_termination_msg(message) or detector.stalled
+
+
+class CustomAssistantAgent(AssistantAgent):
+
+    @property
+    def system_message(self):
+        return super().system_message
+
+    @system_message.setter
+    def system_message(self, value):
+        self._system_message = value
+
+
+class CustomGroupChat(FanOutGroupChat):
+    """Focus group chat; the speaker order comes from a SpeakerScheduler passed as speaker_selection_method."""
+
+    #select_speaker_message_template = """You are in a focus group. The following roles are available:
+    #            {roles}.
+    #            Read the following conversation.
+    #            Then select the next role from {agentlist} to play. Only return the role."""
+
+
+def build_persona_agent(persona_data: Dict, llm_config: Dict) -> CustomAssistantAgent:
+    """Creates the assistant agent for one persona record."""
+    persona_name = persona_data['Name']
+    return CustomAssistantAgent(
+        name=persona_name,
+        system_message=ph.compile_persona_prompt(persona_data),
+        llm_config=llm_config,
+        human_input_mode="NEVER",
+        description=f"A virtual focus group participant named {persona_name}. They do not know anything about the product beyond what they are told. They should be called on to give opinions.",
+    )
+
+
+def build_persona_agents(personas: Dict[str, Dict], llm_config: Dict) -> List[CustomAssistantAgent]:
+    """
+    Creates one assistant agent per persona record.
+
+    Parameters:
+        personas (Dict[str, Dict]): Persona records keyed as in docs/personas.json.
+        llm_config (Dict): The autogen llm_config for the agents.
+
+    Returns:
+        List[CustomAssistantAgent]: The persona agents, in file order.
+    """
+    return [build_persona_agent(persona_data, llm_config) for persona_data in personas.values()]
+
+
+def build_moderator(names: List[str], llm_config: Dict, prompt: Optional[str] = None) -> CustomAssistantAgent:
+    """Creates the moderator agent for a panel made of `names`; `prompt` replaces moderator_prompt, `{}` taking the names."""
+    return CustomAssistantAgent(
+        name="Moderator",
+        #default_auto_reply="Reply `TERMINATE` if the task is done.",
+        llm_config=llm_config,
+        system_message=(prompt or moderator_prompt).format(', '.join(names)),
+        description="A Focus Group moderator. Your role is to moderate the focus group",
+        is_termination_msg=is_termination_msg,
+        human_input_mode="NEVER",
+    )
+
+
+def build_admin() -> UserProxyAgent:
+    """Creates the human admin that starts the conversation."""
+    return UserProxyAgent(
+        name="Admin",
+        human_input_mode= "NEVER",
+        system_message="Human Admin for the Focus Group.",
+        code_execution_config=False,
+        max_consecutive_auto_reply=5,
+        #default_auto_reply="Reply `TERMINATE` if the task is done.",
+        is_termination_msg=is_termination_msg,
+    )
+
+
+def config_hash(*parts) -> str:
+    """Stable digest of JSON-like configuration parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=repr).encode("utf-8")).hexdigest()
+
+
+class PanelFactory:
+    """
+    Builds focus group panels and keeps the built agents for reuse.
+
+    Persona agents are cached by a hash of their record and of the llm_config,
+    model routes and history policy, the moderator by the panel's names and
+    the same settings, so a rebuild only constructs the agents (and their API
+    clients) whose inputs changed. The Run page keeps one factory per Streamlit session.
+    """
+
+    def __init__(self):
+        self._persona_agents: Dict[str, CustomAssistantAgent] = {}
+        self._moderators: Dict[str, CustomAssistantAgent] = {}
+        self._personas_file: Tuple[Optional[str], Optional[int], Dict] = (None, None, {})
+
+    def load_personas(self, path: str = PERSONAS_FILE) -> Dict[str, Dict]:
+        """Like `load_personas`, but only re-reads the file when it changed on disk."""
+        mtime = os.stat(path).st_mtime_ns
+        cached_path, cached_mtime, personas = self._personas_file
+        if (cached_path, cached_mtime) != (path, mtime):
+            personas = load_personas(path)
+            self._personas_file = (path, mtime, personas)
+        return personas
+
+    def agents(self, personas: Dict[str, Dict], llm_config: Dict, history_policy: Optional[HistoryPolicy] = None,
+               moderator_prompt: Optional[str] = None,
+               router: Optional[ModelRouter] = None) -> Tuple[CustomAssistantAgent, List[CustomAssistantAgent]]:
+        """
+        Returns the moderator and persona agents for a panel, building only what is not cached.
+
+        Parameters:
+            personas (Dict[str, Dict]): Persona records keyed as in docs/personas.json.
+            llm_config (Dict): The autogen llm_config shared by the agents.
+            history_policy (Optional[HistoryPolicy]): How much chat history each agent sends per turn.
+            moderator_prompt (Optional[str]): The moderator's system message, see `build_moderator`.
+            router (Optional[ModelRouter]): Model, token cap and fallbacks per role; without it every agent
+                uses `llm_config`.
+
+        Returns:
+            Tuple[CustomAssistantAgent, List[CustomAssistantAgent]]: The moderator and the persona agents.
+        """
+        settings = config_hash(llm_config, history_policy, router.to_dict() if router is not None else None)
+        persona_config = router.llm_config(llm_config, "persona") if router is not None else llm_config
+        moderator_config = router.llm_config(llm_config, "moderator") if router is not None else llm_config
+        built = []
+        persona_agents, persona_cache = [], {}
+        for persona_data in personas.values():
+            key = config_hash(persona_data, settings)
+            agent = self._persona_agents.get(key)
+            if agent is None:
+                agent = build_persona_agent(persona_data, persona_config)
+                built.append(agent)
+            persona_cache[key] = agent
+            persona_agents.append(agent)
+        # Drop agents of personas that left the panel
+        self._persona_agents = persona_cache
+
+        names = [agent.name for agent in persona_agents]
+        key = config_hash(names, settings, moderator_prompt)
+        moderator_agent = self._moderators.get(key)
+        if moderator_agent is None:
+            moderator_agent = build_moderator(names, moderator_config, moderator_prompt)
+            if router is not None:
+                # Before the history policy, so the hook sees the moderator's whole history
+                router.attach(moderator_agent, "moderator", llm_config)
+            built.append(moderator_agent)
+        self._moderators = {key: moderator_agent}
+
+        summary_config = router.llm_config(llm_config, "summary") if router is not None else llm_config
+        apply_history_policy(built, history_policy, "Moderator", summary_config)
+        return moderator_agent, persona_agents
+
+    def build_panel(self, personas: Dict[str, Dict], llm_config: Dict, manager_cls=InstrumentedGroupChatManager,
+                    max_round: int = 20, parallel_opening: bool = False, history_policy: Optional[HistoryPolicy] = None,
+                    speaker_policy: Union[str, SpeakerPolicy] = "least_spoken", max_interactions: int = 6,
+                    moderator_every: int = 1, speaker_weights: Optional[Dict[str, float]] = None,
+                    on_turn: Optional[Callable] = None, stall_detection: bool = True,
+                    moderator_prompt: Optional[str] = None,
+                    router: Optional[ModelRouter] = None) -> Tuple[CustomGroupChat, InstrumentedGroupChatManager, UserProxyAgent]:
+        """Same as `build_panel`, reusing cached agents with their conversation history cleared."""
+        moderator_agent, personas_agents = self.agents(personas, llm_config, history_policy, moderator_prompt, router)
+        for agent in [moderator_agent] + personas_agents:
+            agent.reset()
+            # agent.reset() leaves the transforms alone, the running minutes would carry over to this study
+            reset_history_policy(agent)
+        agents = [moderator_agent] + personas_agents
+        scheduler = SpeakerScheduler(agents, moderator_name="Moderator", policy=speaker_policy,
+                                     max_interactions=max_interactions, moderator_every=moderator_every,
+                                     weights=speaker_weights)
+        groupchat = CustomGroupChat(agents=agents, messages=[],
+                                    speaker_selection_method=scheduler,
+                                    max_round=max_round,
+                                    moderator_name="Moderator",
+                                    parallel_opening=parallel_opening,
+                                    on_turn=on_turn,
+                                    #select_speaker_message_template=CustomGroupChat.select_speaker_message_template
+                                    )
+        detector = StallDetector() if stall_detection else None
+        manager = manager_cls(groupchat=groupchat,
+                              llm_config=router.llm_config(llm_config, "manager") if router is not None else llm_config,
+                              is_termination_msg=stall_termination(detector) if detector is not None else is_termination_msg)
+        manager.stall_detector = detector
+        manager.analysis_llm_config = router.llm_config(llm_config, "analysis") if router is not None else llm_config
+        return groupchat, manager, build_admin()
+
+
+def build_panel(personas: Dict[str, Dict], llm_config: Dict, manager_cls=InstrumentedGroupChatManager,
+                max_round: int = 20, parallel_opening: bool = False, history_policy: Optional[HistoryPolicy] = None,
+                speaker_policy: Union[str, SpeakerPolicy] = "least_spoken", max_interactions: int = 6,
+                moderator_every: int = 1, speaker_weights: Optional[Dict[str, float]] = None,
+                on_turn: Optional[Callable] = None, stall_detection: bool = True,
+                moderator_prompt: Optional[str] = None,
+                router: Optional[ModelRouter] = None) -> Tuple[CustomGroupChat, InstrumentedGroupChatManager, UserProxyAgent]:
+    """
+    Assembles a complete focus group: personas, moderator, group chat, manager and admin.
+
+    Parameters:
+        personas (Dict[str, Dict]): Persona records keyed as in docs/personas.json.
+        llm_config (Dict): The autogen llm_config shared by the agents.
+        manager_cls: The GroupChatManager class, the Run page passes its Streamlit-rendering manager.
+        max_round (int): Maximum number of turns in the chat.
+        parallel_opening (bool): Collect the opening opinions concurrently; those answers come on top of
+            `max_round` (see fan_out.FanOutGroupChat).
+        history_policy (Optional[HistoryPolicy]): How much chat history each agent sends per turn.
+        speaker_policy (Union[str, SpeakerPolicy]): Who gets the floor next, one of scheduler.SPEAKER_POLICIES.
+        max_interactions (int): Maximum number of turns per participant.
+        moderator_every (int): Number of participant turns between two moderator turns.
+        speaker_weights (Optional[Dict[str, float]]): Speaking weight per persona, for the "quota" policy.
+        on_turn (Optional[Callable]): Called after every turn, e.g. a checkpoint.Checkpointer. It has to be
+            given here: the manager keeps its own copy of the group chat.
+        stall_detection (bool): Skip participants who keep repeating themselves and end the chat once the
+            discussion goes in circles (see novelty.py), before max_round or a TERMINATE.
+        moderator_prompt (Optional[str]): Replaces the moderator's default system message; `{}` takes the
+            participants' names.
+        router (Optional[ModelRouter]): Routes each role (personas, moderator by phase, manager, rolling
+            summaries, analysis) to its own model, token cap and fallback models (see model_router.py);
+            without it every agent uses `llm_config`.
+
+    Returns:
+        Tuple[CustomGroupChat, InstrumentedGroupChatManager, UserProxyAgent]: The group chat, its manager and the admin.
+    """
+    return PanelFactory().build_panel(personas, llm_config, manager_cls=manager_cls, max_round=max_round,
+                                      parallel_opening=parallel_opening, history_policy=history_policy,
+                                      speaker_policy=speaker_policy, max_interactions=max_interactions,
+                                      moderator_every=moderator_every, speaker_weights=speaker_weights,
+                                      on_turn=on_turn, stall_detection=stall_detection,
+                                      moderator_prompt=moderator_prompt, router=router)
@@ -0,0 +1,150 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from autogen import ConversableAgent
+from autogen.agentchat.contrib.capabilities.transform_messages import TransformMessages
+
+from summarize import Completer, autogen_completer
+
+HISTORY_POLICIES = ("full", "last_k", "own_turns", "rolling_summary")
+
+rolling_summary_prompt = """
+    You keep the running minutes of a focus group. Update the minutes with the new messages below.
+    Keep, per participant, the opinions, pain points and suggestions they gave, and the questions the moderator asked.
+    Be concise and do not invent anything that was not said.
+    """
+
+
+@dataclass(frozen=True)
+class HistoryPolicy:
+    """
+    How much of the group chat history an agent sends with each completion.
+
+    kind:
+        "full" sends everything (autogen's default),
+        "last_k" sends the opening message plus the last `k` messages,
+        "own_turns" sends the opening message, the agent's own turns and the moderator's
+            questions, capped to the last `k` of those,
+        "rolling_summary" sends the opening message, a summary of older messages refreshed
+            every `refresh_every` messages, and the last `k` messages verbatim.
+    """
+
+    kind: str = "full"
+    k: int = 10
+    refresh_every: int = 6
+
+    def __post_init__(self):
+        if self.kind not in HISTORY_POLICIES:
+            raise ValueError(f"Unknown history policy {self.kind!r}, expected one of {HISTORY_POLICIES}.")
+
+
+class LastKMessages:
+    """Keeps the first message (the product brief) and the last `k` messages."""
+
+    def __init__(self, k: int):
+        self.k = k
+
+    def apply_transform(self, messages: List[Dict]) -> List[Dict]:
+        if len(messages) <= self.k + 1:
+            return messages
+        return messages[:1] + messages[-self.k:]
+
+    def get_logs(self, pre_transform_messages: List[Dict], post_transform_messages: List[Dict]) -> Tuple[str, bool]:
+        removed = len(pre_transform_messages) - len(post_transform_messages)
+        return f"Removed {removed} messages outside the last {self.k}.", removed > 0
+
+
+class OwnTurnsAndModeratorQuestions:
+    """Keeps the first message, the agent's own turns, the moderator's turns and the message being answered."""
+
+    def __init__(self, moderator_name: str):
+        self.moderator_name = moderator_name
+
+    def apply_transform(self, messages: List[Dict]) -> List[Dict]:
+        if len(messages) <= 2:
+            return messages
+        middle = [message for message in messages[1:-1]
+                  if message.get("role") == "assistant" or message.get("name") == self.moderator_name]
+        return messages[:1] + middle + messages[-1:]
+
+    def get_logs(self, pre_transform_messages: List[Dict], post_transform_messages: List[Dict]) -> Tuple[str, bool]:
+        removed = len(pre_transform_messages) - len(post_transform_messages)
+        return f"Removed {removed} messages from other participants.", removed > 0
+
+
+class RollingSummary:
+    """
+    Replaces everything but the first and the last `k` messages with running minutes.
+
+    The minutes are updated incrementally, folding in the messages that left the
+    window since the last update once there are `refresh_every` of them; until then
+    those messages are kept verbatim, so nothing is dropped and the prompt stays bounded.
+    """
+
+    def __init__(self, complete: Completer, k: int, refresh_every: int):
+        self.complete = complete
+        self.k = k
+        self.refresh_every = refresh_every
+        self.reset()
+
+    def reset(self) -> None:
+        """Forgets the minutes, e.g. when the agent is reused for another study."""
+        self.summary = ""
+        self.summarized = 1  # messages[1:summarized] are folded into the summary
+
+    def apply_transform(self, messages: List[Dict]) -> List[Dict]:
+        window_start = len(messages) - self.k
+        if window_start <= 1:
+            return messages
+        if self.summarized > window_start:
+            # The history was reset or cleared, start over
+            self.reset()
+        if window_start - self.summarized >= self.refresh_every:
+            new_messages = "\n".join(f"{message.get('name', message['role'])}: {message.get('content')}"
+                                     for message in messages[self.summarized:window_start])
+            self.summary = self.complete([
+                {"role": "system", "content": rolling_summary_prompt},
+                {"role": "user", "content": f"Minutes so far:\n{self.summary or '(none)'}\n\nNew messages:\n{new_messages}"},
+            ])
+            self.summarized = window_start
+        summary = [{"role": "user", "name": "Minutes", "content": f"Minutes of the discussion so far:\n{self.summary}"}] if self.summary else []
+        return messages[:1] + summary + messages[self.summarized:]
+
+    def get_logs(self, pre_transform_messages: List[Dict], post_transform_messages: List[Dict]) -> Tuple[str, bool]:
+        folded = self.summarized - 1
+        return f"Folded {folded} earlier messages into the running minutes.", folded > 0
+
+
+def apply_history_policy(agents: List[ConversableAgent], policy: Optional[HistoryPolicy], moderator_name: str,
+                         llm_config: Optional[Dict] = None) -> None:
+    """
+    Registers the history policy on every agent.
+
+    Parameters:
+        agents (List[ConversableAgent]): The moderator and persona agents.
+        policy (Optional[HistoryPolicy]): The policy; None or "full" leaves the agents untouched.
+        moderator_name (str): Name of the moderator, whose questions "own_turns" keeps. The moderator
+            itself needs the participants' answers, so it falls back to "last_k" under that policy.
+        llm_config (Optional[Dict]): Used for the "rolling_summary" completions.
+    """
+    if policy is None or policy.kind == "full":
+        return
+    for agent in agents:
+        if policy.kind == "last_k" or (policy.kind == "own_turns" and agent.name == moderator_name):
+            transforms = [LastKMessages(policy.k)]
+        elif policy.kind == "own_turns":
+            transforms = [OwnTurnsAndModeratorQuestions(moderator_name), LastKMessages(policy.k)]
+        else:
+            # One instance per agent, each agent sees its own history
+            transforms = [RollingSummary(autogen_completer(llm_config), policy.k, policy.refresh_every)]
+        TransformMessages(transforms=transforms, verbose=False).add_to_agent(agent)
+        # Kept so reset_history_policy can clear their state when the agent is reused
+        agent.history_transforms = transforms
+
+
+def reset_history_policy(agent: ConversableAgent) -> None:
+    """Clears the state of the agent's history transforms, e.g. the running minutes, along with `agent.reset()`."""
+    for transform in getattr(agent, "history_transforms", []):
+        reset = getattr(transform, "reset", None)
+        if reset is not None:
+            reset()
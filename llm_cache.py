@@ -0,0 +1,124 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+import diskcache
+
+# Cache settings, overridable from the environment
+CACHE_MODE = os.getenv("FOCUS_GROUP_CACHE", "cache")  # off | cache | replay
+CACHE_DIR = os.getenv("FOCUS_GROUP_CACHE_DIR", ".cache/completions")
+CACHE_MEMORY_ITEMS = int(os.getenv("FOCUS_GROUP_CACHE_MEMORY_ITEMS", "512"))
+CACHE_DISK_BYTES = int(os.getenv("FOCUS_GROUP_CACHE_DISK_BYTES", str(512 * 2**20)))
+
+# Request fields that do not change the completion and must not split the cache
+NON_SEMANTIC_FIELDS = ("stream", "timeout", "user")
+
+
+class ReplayMissError(KeyError):
+    """Raised in replay mode when a request has no recorded completion."""
+
+
+def completion_key(key: str) -> str:
+    """
+    Normalises the request key autogen hands to the cache.
+
+    Parameters:
+        key (str): The JSON dump of the request params (model, messages, sampling params).
+
+    Returns:
+        str: A short, stable digest of the semantic part of the request.
+    """
+    try:
+        params = json.loads(key)
+    except (TypeError, ValueError):
+        params = None
+    if isinstance(params, dict):
+        for field in NON_SEMANTIC_FIELDS:
+            params.pop(field, None)
+        key = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    Two-tier completion cache that follows autogen's AbstractCache protocol.
+
+    Lookups go to an in-memory LRU first and then to an on-disk store that
+    evicts least-recently-used entries once it grows past `disk_bytes`.
+    Pass an instance as `cache=` to `initiate_chat` (or `OpenAIWrapper.create`).
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, memory_items: int = CACHE_MEMORY_ITEMS,
+                 disk_bytes: int = CACHE_DISK_BYTES, replay: bool = False):
+        self.replay = replay
+        self.memory_items = memory_items
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = diskcache.Cache(directory, size_limit=disk_bytes, eviction_policy="least-recently-used")
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+        digest = completion_key(key)
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                self.hits += 1
+                return self._memory[digest]
+        value = self._disk.get(digest, default=None)
+        if value is None:
+            self.misses += 1
+            if self.replay:
+                raise ReplayMissError(f"No recorded completion for request {digest[:12]} in replay mode.")
+            return default
+        self.hits += 1
+        self._remember(digest, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        if self.replay:
+            return
+        digest = completion_key(key)
+        self._remember(digest, value)
+        self._disk.set(digest, value)
+
+    def _remember(self, digest: str, value: Any) -> None:
+        with self._lock:
+            self._memory[digest] = value
+            self._memory.move_to_end(digest)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def close(self) -> None:
+        # autogen enters/exits the cache around every request, so only release
+        # file handles here; diskcache reopens them on the next access.
+        self._disk.close()
+
+    def __enter__(self) -> "CompletionCache":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def build_cache(mode: str = CACHE_MODE, directory: str = CACHE_DIR) -> Optional[CompletionCache]:
+    """
+    Builds the completion cache for the configured mode.
+
+    Parameters:
+        mode (str): "off" disables caching, "cache" reads through and records,
+            "replay" only serves recorded completions and never reaches the network.
+        directory (str): Where recorded completions live on disk.
+
+    Returns:
+        Optional[CompletionCache]: The cache to pass to `initiate_chat`, or None when disabled.
+    """
+    mode = mode.lower()
+    if mode == "off":
+        return None
+    if mode not in ("cache", "replay"):
+        raise ValueError(f"Unknown cache mode {mode!r}, expected 'off', 'cache' or 'replay'.")
+    return CompletionCache(directory=directory, replay=mode == "replay")
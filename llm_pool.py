@@ -0,0 +1,373 @@
+"""
+One rate-limit-aware HTTP layer for every OpenAI call of the app.
+
+Agents (through their llm_config), the summarizer and the analysis page all
+share a single pooled httpx client whose transport:
+
+- spaces requests with token buckets for requests and tokens per minute,
+  reserving a typical completion per request and settling it from the
+  usage the response reports,
+- caps the requests in flight, halving the cap on a 429 and growing it back
+  by one per window of successes (AIMD),
+- follows the x-ratelimit-* headers the API returns,
+- retries 429s, 5xx and network errors with jittered exponential backoff,
+  honouring retry-after; clients with a fallback model can opt out of
+  retrying timeouts (TIMEOUT_RETRIES_HEADER, see model_router.py) to fail
+  over sooner.
+
+Limits come from FOCUS_GROUP_RPM, FOCUS_GROUP_TPM and FOCUS_GROUP_MAX_CONCURRENCY
+and are then adjusted to the limits the API reports. The API key is read once
+here: OpenAI_APIKEY / OPENAI_API_KEY in the environment or .env, then Streamlit
+secrets. OPENAI_BASE_URL points the clients at another server, e.g.
+benchmarks/mock_openai_server.py.
+"""
+import os
+import re
+import json
+import time
+import random
+import logging
+import threading
+import functools
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+from openai import OpenAI
+
+load_dotenv('.env')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RPM = int(os.environ.get("FOCUS_GROUP_RPM", 500))
+DEFAULT_TPM = int(os.environ.get("FOCUS_GROUP_TPM", 30000))
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("FOCUS_GROUP_MAX_CONCURRENCY", 16))
+# Token buckets hold this many seconds' worth of their rate, the API enforces its limits over short windows too
+BURST_S = 6.0
+# The tokens bucket holds at least one large request, so a request never starts out in debt
+MAX_REQUEST_TOKENS = 8192
+# Completion tokens reserved per request until the response reports its usage; replies rarely get near max_tokens
+COMPLETION_ESTIMATE_TOKENS = 512
+MAX_RETRIES = 6
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 30.0
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+# Request header capping the retries after a timeout, read and removed by the transport
+TIMEOUT_RETRIES_HEADER = "x-focus-group-timeout-retries"
+
+
+def resolve_api_key(api_key: Optional[str] = None) -> Optional[str]:
+    """The given key, else OpenAI_APIKEY / OPENAI_API_KEY, else the OpenAI_APIKEY Streamlit secret."""
+    if api_key:
+        return api_key
+    for name in ("OpenAI_APIKEY", "OPENAI_API_KEY"):
+        if os.environ.get(name):
+            return os.environ[name]
+    try:
+        import streamlit as st
+        return st.secrets.get("OpenAI_APIKEY")
+    except Exception:
+        # No secrets file, or not running under Streamlit
+        return None
+
+
+class TokenBucket:
+    """
+    Refills `rate_per_minute` units per minute, holding at most `burst_s` seconds' worth
+    (and at least `min_capacity` units).
+
+    `acquire` reserves its units right away and sleeps off any debt, so callers
+    are served in arrival order without a thundering herd on refill, and a
+    request larger than the bucket just waits longer. `settle` corrects a
+    reservation once its real cost is known.
+    """
+
+    def __init__(self, rate_per_minute: float, burst_s: float = BURST_S, min_capacity: float = 0.0):
+        self.rate = float(rate_per_minute)
+        self.burst_s = burst_s
+        self.min_capacity = min_capacity
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> float:
+        return max(self.rate * self.burst_s / 60, self.min_capacity)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate / 60)
+        self.updated = now
+
+    def acquire(self, amount: float) -> float:
+        """Takes `amount` units, waiting for them if needed. Returns the seconds waited."""
+        with self._lock:
+            self._refill()
+            self.level -= amount
+            wait = max(0.0, -self.level) * 60 / self.rate
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def settle(self, amount: float) -> None:
+        """Gives back `amount` units reserved too many, or takes them when negative; the next `acquire` pays any debt."""
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+    def set_rate(self, rate_per_minute: float) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = float(rate_per_minute)
+            self.level = min(self.level, self.capacity)
+
+    def drain_to(self, remaining: float) -> None:
+        """Lowers the level to what the server says is left."""
+        with self._lock:
+            self._refill()
+            self.level = min(self.level, remaining)
+
+
+class AdaptiveConcurrency:
+    """Limit on requests in flight: grows by one per `limit` successes, halves on a 429."""
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max_limit
+        self.limit = float(max(1, max_limit // 2))
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def on_throttle(self) -> None:
+        with self._cond:
+            self.limit = max(1.0, self.limit / 2)
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """
+    Response body that frees its concurrency slot once read or closed, streamed replies included.
+
+    With `on_body`, the body is also kept and passed to it once read to the end.
+    """
+
+    def __init__(self, stream: httpx.SyncByteStream, release: Callable[[], None],
+                 on_body: Optional[Callable[[bytes], None]] = None):
+        self._stream = stream
+        self._release = release
+        self._released = False
+        self._on_body = on_body
+        self._chunks: List[bytes] = []
+
+    def __iter__(self):
+        for chunk in self._stream:
+            if self._on_body is not None:
+                self._chunks.append(chunk)
+            yield chunk
+        if self._on_body is not None:
+            on_body, self._on_body = self._on_body, None
+            on_body(b"".join(self._chunks))
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+
+def _duration_s(value: Optional[str]) -> Optional[float]:
+    """Parses the API's reset durations ("1s", "6m0s", "250ms") and plain seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def estimate_tokens(request: httpx.Request) -> int:
+    """
+    Tokens reserved for a completion request: its prompt (about 4 characters a token) plus the expected completion.
+
+    The completion is counted as `COMPLETION_ESTIMATE_TOKENS`, or max_tokens when
+    lower, rather than max_tokens itself; the transport settles the difference
+    from the usage the response reports.
+    """
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, httpx.RequestNotRead):
+        return 1
+    prompt = sum(len(str(message.get("content") or "")) for message in body.get("messages", [])) // 4
+    completion = min(int(body.get("max_tokens") or COMPLETION_ESTIMATE_TOKENS), COMPLETION_ESTIMATE_TOKENS)
+    return max(1, prompt + completion)
+
+
+def response_tokens(body: bytes) -> Optional[int]:
+    """The total tokens a completion response reports in its usage, None without one."""
+    try:
+        usage = json.loads(body).get("usage") or {}
+    except (ValueError, AttributeError):
+        return None
+    total = usage.get("total_tokens")
+    return int(total) if isinstance(total, (int, float)) else None
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """httpx transport enforcing the pool's limits and retrying throttled or failed requests."""
+
+    def __init__(self, requests: TokenBucket, tokens: TokenBucket, concurrency: AdaptiveConcurrency,
+                 share: float = 1.0, transport: Optional[httpx.BaseTransport] = None, max_retries: int = MAX_RETRIES):
+        self.requests = requests
+        self.tokens = tokens
+        self.concurrency = concurrency
+        self.share = share
+        self.transport = transport or httpx.HTTPTransport()
+        self.max_retries = max_retries
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        cost = estimate_tokens(request)
+        timeout_retries = int(request.headers.pop(TIMEOUT_RETRIES_HEADER, self.max_retries))
+        timeouts = 0
+        for attempt in range(self.max_retries + 1):
+            self.requests.acquire(1)
+            self.tokens.acquire(cost)
+            self.concurrency.acquire()
+            try:
+                response = self.transport.handle_request(request)
+            except (httpx.TimeoutException, httpx.NetworkError) as e:
+                self.concurrency.release()
+                timeouts += isinstance(e, httpx.TimeoutException)
+                if attempt == self.max_retries or timeouts > timeout_retries:
+                    raise
+                self._backoff(attempt, None, type(e).__name__)
+                continue
+            self._observe(response.headers)
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                if response.status_code == 429:
+                    self.concurrency.on_throttle()
+                response.read()
+                response.close()
+                self.concurrency.release()
+                self._backoff(attempt, response.headers, f"status {response.status_code}")
+                continue
+            on_body = None
+            if response.is_success:
+                self.concurrency.on_success()
+                # Streamed replies carry no usage, the rate-limit headers correct those
+                if response.headers.get("content-type", "").startswith("application/json"):
+                    on_body = functools.partial(self._settle, cost)
+            response.stream = _ReleasingStream(response.stream, self.concurrency.release, on_body)
+            return response
+        raise AssertionError("unreachable")
+
+    def _settle(self, reserved: int, body: bytes) -> None:
+        """Corrects the tokens reserved for a request with the usage its response reports."""
+        used = response_tokens(body)
+        if used is not None:
+            self.tokens.settle(reserved - used)
+
+    def _observe(self, headers: httpx.Headers) -> None:
+        """Follows the limits the API reports, scaled to this process's share of them."""
+        for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            try:
+                if limit:
+                    bucket.set_rate(float(limit) * self.share)
+                if remaining:
+                    bucket.drain_to(float(remaining) * self.share)
+            except ValueError:
+                continue
+
+    def _backoff(self, attempt: int, headers: Optional[httpx.Headers], reason: str) -> None:
+        delay = None
+        if headers is not None:
+            if headers.get("retry-after-ms"):
+                delay = _duration_s(headers["retry-after-ms"] + "ms")
+            delay = delay or _duration_s(headers.get("retry-after"))
+        if delay is None:
+            # Full jitter keeps throttled callers from retrying in lockstep
+            delay = random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+        logger.info("Retrying request in %.2f seconds after %s", delay, reason)
+        time.sleep(delay)
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class PooledClient(httpx.Client):
+    """The pool's httpx client; autogen deep-copies every llm_config, and copies must keep sharing the pool."""
+
+    def __deepcopy__(self, memo) -> "PooledClient":
+        return self
+
+
+class LLMPool:
+    """
+    The process-wide client layer: one pooled, rate-limited httpx client for every OpenAI client.
+
+    `share` scales the limits for processes that split one account, e.g. the
+    batch runner's workers.
+    """
+
+    def __init__(self, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, share: float = 1.0):
+        self.requests = TokenBucket(rpm * share)
+        self.tokens = TokenBucket(tpm * share, min_capacity=MAX_REQUEST_TOKENS)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        connections = httpx.HTTPTransport(limits=httpx.Limits(max_connections=max_concurrency * 2,
+                                                              max_keepalive_connections=max_concurrency))
+        self.transport = RateLimitedTransport(self.requests, self.tokens, self.concurrency, share=share,
+                                              transport=connections)
+        self.http_client = PooledClient(transport=self.transport, timeout=httpx.Timeout(600, connect=10))
+
+    def openai_client(self, api_key: Optional[str] = None) -> OpenAI:
+        """An OpenAI client on the shared connection pool; retries are left to the pool."""
+        return OpenAI(api_key=resolve_api_key(api_key), http_client=self.http_client, max_retries=0)
+
+    def config_entry(self, model: str, api_key: Optional[str] = None, **params) -> Dict:
+        """An autogen config_list entry whose client goes through the pool."""
+        return {"model": model, "api_key": resolve_api_key(api_key), "http_client": self.http_client,
+                "max_retries": 0, **params}
+
+
+_pool: Optional[LLMPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> LLMPool:
+    """The shared pool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LLMPool()
+        return _pool
+
+
+def configure(**kwargs) -> LLMPool:
+    """Replaces the shared pool, e.g. with a share of the account limits. Takes LLMPool's arguments."""
+    global _pool
+    with _pool_lock:
+        _pool = LLMPool(**kwargs)
+        return _pool
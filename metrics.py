@@ -0,0 +1,180 @@
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass, asdict
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    # Only for annotations, so the Metrics Dashboard loads without autogen
+    from autogen import Agent
+
+METRICS_FILE = "./docs/metrics.jsonl"
+
+
+@dataclass
+class TurnMetrics:
+    """Cost and timing of one agent turn."""
+
+    study_id: str
+    turn: int
+    agent: str
+    phase: str
+    started_at: float
+    latency_s: float
+    ttft_s: Optional[float]
+    prompt_tokens: int
+    completion_tokens: int
+    retries: int
+    cost: float
+    cached: bool
+
+
+class RetryCounter(logging.Handler):
+    """Counts the retries the openai client logs, per thread."""
+
+    def __init__(self):
+        super().__init__(level=logging.INFO)
+        self._counts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.getMessage().startswith("Retrying request"):
+            with self._lock:
+                self._counts[record.thread] = self._counts.get(record.thread, 0) + 1
+
+    def count(self, thread: int) -> int:
+        with self._lock:
+            return self._counts.get(thread, 0)
+
+
+_retry_counter = RetryCounter()
+
+
+def _install_retry_counter() -> RetryCounter:
+    # The openai client's own retries, and those of the llm_pool transport
+    for name in ("openai._base_client", "llm_pool"):
+        retry_logger = logging.getLogger(name)
+        if _retry_counter not in retry_logger.handlers:
+            retry_logger.addHandler(_retry_counter)
+            if retry_logger.getEffectiveLevel() > logging.INFO:
+                retry_logger.setLevel(logging.INFO)
+    return _retry_counter
+
+
+def _usage(agent: "Agent") -> Tuple[int, int, float, int]:
+    """Cumulative (prompt tokens, completion tokens, cost, uncached tokens) of an agent's clients."""
+    # Agents routed by phase (see model_router.py) switch between several clients
+    clients = getattr(agent, "routed_clients", None)
+    clients = list(clients.values()) if clients else [getattr(agent, "client", None)]
+    prompt = completion = uncached = 0
+    cost = 0.0
+    for client in clients:
+        total = (getattr(client, "total_usage_summary", None) or {}) if client is not None else {}
+        actual = (getattr(client, "actual_usage_summary", None) or {}) if client is not None else {}
+        prompt += sum(usage.get("prompt_tokens", 0) for usage in total.values() if isinstance(usage, dict))
+        completion += sum(usage.get("completion_tokens", 0) for usage in total.values() if isinstance(usage, dict))
+        uncached += sum(usage.get("total_tokens", 0) for usage in actual.values() if isinstance(usage, dict))
+        cost += total.get("total_cost", 0.0)
+    return prompt, completion, cost, uncached
+
+
+class MetricsRecorder:
+    """
+    Records latency, time-to-first-token, token usage, retries and cost per agent turn.
+
+    `attach` hooks the agents so the recorder knows when each of them starts a
+    reply (also on the parallel opening round's worker threads); the manager
+    then calls `record` when the reply reaches it. Turns are appended to a
+    JSONL file, one line per turn, for the Metrics Dashboard page.
+    """
+
+    def __init__(self, study_id: str, path: Optional[str] = METRICS_FILE):
+        self.study_id = study_id
+        self.path = path
+        self.turns: List[TurnMetrics] = []
+        self._started: Dict[str, Tuple[float, float, int, int]] = {}
+        self._usage: Dict[str, Tuple[int, int, float, int]] = {}
+        self._participants: List[str] = []
+        self._lock = threading.Lock()
+        self._retries = _install_retry_counter()
+
+    def attach(self, agents: Iterable["Agent"], moderator_name: Optional[str] = None) -> None:
+        """
+        Registers the turn-start hook on the agents that call the model.
+
+        Agents reused across runs keep a single hook that reports to the recorder attached last.
+        """
+        for agent in agents:
+            if agent.name != moderator_name:
+                self._participants.append(agent.name)
+            self._usage[agent.name] = _usage(agent)
+            agent.metrics_recorder = self
+            if getattr(agent, "metrics_hooked", False):
+                continue
+
+            def start(messages: List[Dict], agent: "Agent" = agent) -> List[Dict]:
+                agent.metrics_recorder.start(agent.name)
+                return messages
+            agent.register_hook("process_all_messages_before_reply", start)
+            agent.metrics_hooked = True
+
+    def start(self, name: str) -> None:
+        """Opens the turn of agent `name`, called from the thread generating its reply."""
+        thread = threading.get_ident()
+        with self._lock:
+            self._started[name] = (time.time(), time.perf_counter(), thread, self._retries.count(thread))
+
+    def phase(self) -> str:
+        """"opening" until every participant has spoken once, "discussion" afterwards."""
+        spoken = {turn.agent for turn in self.turns}
+        return "opening" if any(name not in spoken for name in self._participants) else "discussion"
+
+    def record(self, agent: "Agent", first_token_at: Optional[float] = None) -> Optional[TurnMetrics]:
+        """
+        Closes the turn of `agent`, whose reply just reached the manager.
+
+        Parameters:
+            agent (Agent): The agent that replied.
+            first_token_at (Optional[float]): `time.perf_counter()` of the first streamed token, if streamed.
+
+        Returns:
+            Optional[TurnMetrics]: The turn, or None for agents that were not attached (e.g. the admin).
+        """
+        with self._lock:
+            started = self._started.pop(agent.name, None)
+        if started is None:
+            return None
+        started_at, started_perf, thread, retries_before = started
+        now = time.perf_counter()
+        prompt, completion, cost, uncached = _usage(agent)
+        before = self._usage.get(agent.name, (0, 0, 0.0, 0))
+        self._usage[agent.name] = (prompt, completion, cost, uncached)
+        turn = TurnMetrics(
+            study_id=self.study_id,
+            turn=len(self.turns),
+            agent=agent.name,
+            phase=self.phase(),
+            started_at=started_at,
+            latency_s=round(now - started_perf, 4),
+            ttft_s=round(first_token_at - started_perf, 4) if first_token_at and first_token_at >= started_perf else None,
+            prompt_tokens=prompt - before[0],
+            completion_tokens=completion - before[1],
+            retries=self._retries.count(thread) - retries_before,
+            cost=round(cost - before[2], 6),
+            cached=uncached == before[3] and (prompt - before[0]) > 0,
+        )
+        self.turns.append(turn)
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(asdict(turn)) + "\n")
+        return turn
+
+
+def load_metrics(path: str = METRICS_FILE) -> List[Dict]:
+    """Reads every recorded turn."""
+    try:
+        with open(path, "r") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
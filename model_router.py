@@ -0,0 +1,146 @@
+"""
+Model routing per agent role and conversation phase.
+
+Not every turn of a focus group needs the largest model: the moderator's
+follow-up questions are short and formulaic, while the personas' answers and
+the analysis carry the study. A `ModelRouter` maps each role, optionally per
+phase ("role:phase" keys), to a `Route`: the model, a completion token cap and
+a request timeout, plus fallback models tried in order when a request times
+out or fails. Routes with fallbacks do not retry timeouts in the client pool,
+so a slow model hands over to the next one instead of retrying six times.
+
+The roles are "persona", "moderator", "manager", "summary" (the rolling
+summary history policy) and "analysis" (running notes and findings). The
+moderator's phases are "opening", its first turn, which frames the
+discussion, and "follow_up", every turn after that:
+
+    router = ModelRouter({"persona": {"model": "gpt-4o", "max_tokens": 600}})
+    groupchat, manager, admin = build_panel(personas, make_llm_config(), router=router)
+"""
+import json
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+from autogen import Agent, OpenAIWrapper
+
+from llm_pool import TIMEOUT_RETRIES_HEADER
+
+ROLES = ("persona", "moderator", "manager", "summary", "analysis")
+
+
+@dataclass(frozen=True)
+class Route:
+    """Where one role's requests go: `model` first, then each of `fallbacks` after a timeout or API error."""
+    model: str
+    max_tokens: Optional[int] = None
+    timeout_s: Optional[float] = None
+    fallbacks: Tuple[str, ...] = ()
+
+
+DEFAULT_ROUTES = {
+    "persona": Route("gpt-4o", max_tokens=800, timeout_s=60, fallbacks=("gpt-4o-mini",)),
+    "moderator": Route("gpt-4o-mini", max_tokens=150, timeout_s=20, fallbacks=("gpt-4o",)),
+    "moderator:opening": Route("gpt-4o", max_tokens=300, timeout_s=30, fallbacks=("gpt-4o-mini",)),
+    "manager": Route("gpt-4o-mini", max_tokens=50, timeout_s=20),
+    "summary": Route("gpt-4o-mini", max_tokens=800, timeout_s=60, fallbacks=("gpt-4o",)),
+    "analysis": Route("gpt-4o", max_tokens=4096, timeout_s=120, fallbacks=("gpt-4o-mini",)),
+}
+
+
+def _route(value: Union[Route, Dict]) -> Route:
+    if isinstance(value, Route):
+        return value
+    return Route(**{**value, "fallbacks": tuple(value.get("fallbacks", ()))})
+
+
+class ModelRouter:
+    """
+    Builds the llm_config of each agent role from a base llm_config and the routes.
+
+    The base config's first config_list entry provides everything but the
+    model, token cap and timeout (API key, client pool, temperature, streaming).
+    """
+
+    def __init__(self, routes: Optional[Dict[str, Union[Route, Dict]]] = None):
+        """
+        Parameters:
+            routes (Optional[Dict[str, Union[Route, Dict]]]): Routes by "role" or "role:phase", as Route or
+                keyword dicts; they override DEFAULT_ROUTES key by key.
+        """
+        self.routes = {**DEFAULT_ROUTES, **{key: _route(value) for key, value in (routes or {}).items()}}
+
+    @classmethod
+    def from_file(cls, path: str) -> "ModelRouter":
+        """Reads the routes from a JSON file of {"role" or "role:phase": {"model": ..., ...}}."""
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+    def to_dict(self) -> Dict[str, Dict]:
+        """The routes as JSON-serialisable dicts, e.g. to store with a study's settings."""
+        return {key: asdict(route) for key, route in self.routes.items()}
+
+    def route(self, role: str, phase: Optional[str] = None) -> Route:
+        """
+        The route of a role in a phase, falling back to the role's own route.
+
+        Raises:
+            KeyError: The role has no route.
+        """
+        if phase is not None and f"{role}:{phase}" in self.routes:
+            return self.routes[f"{role}:{phase}"]
+        return self.routes[role]
+
+    def phases(self, role: str) -> List[str]:
+        """The phases with a route of their own for `role`."""
+        return [key.split(":", 1)[1] for key in self.routes if key.startswith(f"{role}:")]
+
+    def llm_config(self, base: Dict, role: str, phase: Optional[str] = None) -> Dict:
+        """
+        The llm_config of a role in a phase.
+
+        Parameters:
+            base (Dict): The panel's llm_config, e.g. from focus_group.make_llm_config.
+            role (str): One of ROLES.
+            phase (Optional[str]): The conversation phase, e.g. "opening".
+
+        Returns:
+            Dict: A copy of `base` whose config_list holds one entry per model of the route, in fallback order.
+        """
+        route = self.route(role, phase)
+        template = dict(base["config_list"][0])
+        config_list = []
+        for model in (route.model,) + route.fallbacks:
+            entry = {**template, "model": model}
+            if route.max_tokens is not None:
+                entry["max_tokens"] = route.max_tokens
+            if route.timeout_s is not None:
+                entry["timeout"] = route.timeout_s
+            if route.fallbacks and model != route.fallbacks[-1]:
+                # Hand over to the next model instead of retrying timeouts in the client pool
+                entry["default_headers"] = {**entry.get("default_headers", {}), TIMEOUT_RETRIES_HEADER: "0"}
+            config_list.append(entry)
+        return {**{key: value for key, value in base.items() if key != "config_list"}, "config_list": config_list}
+
+    def attach(self, agent: Agent, role: str, base: Dict) -> None:
+        """
+        Switches an agent's model by phase: its first reply uses the role's "opening" route, the
+        following ones the "follow_up" route (or the role's own). No-op for roles without phase routes.
+
+        The agent's clients are kept in `agent.routed_clients` by phase, for the usage totals.
+        """
+        if not self.phases(role):
+            return
+        agent.routed_clients = {
+            phase: OpenAIWrapper(**self.llm_config(base, role, phase))
+            for phase in ("opening", "follow_up")
+        }
+        if getattr(agent, "route_hooked", False):
+            return
+
+        def switch(messages: List[Dict], agent: Agent = agent) -> List[Dict]:
+            # The agent's own earlier replies are stored with the assistant role
+            spoken = any(message.get("role") == "assistant" for message in messages)
+            agent.client = agent.routed_clients["follow_up" if spoken else "opening"]
+            return messages
+        agent.register_hook("process_all_messages_before_reply", switch)
+        agent.route_hooked = True
@@ -0,0 +1,165 @@
+"""
+Local detection of stalled focus group discussions.
+
+Panels tend to spend their last rounds thanking each other and restating
+what they already said. `StallDetector` scores every message as it reaches
+the group chat manager from a persona, with no model call:
+
+- novelty: one minus the highest similarity (MinHash estimate of the Jaccard
+  similarity of word 3-grams) to the speaker's own earlier turns,
+- courtesy: the share of the words taken by whole thanks, greeting and
+  sign-off phrases.
+
+A message is stale when its novelty is below `novelty_threshold`, its courtesy
+share is above `courtesy_threshold`, or it is only a few words long. A
+participant with `speaker_patience` stale turns in a row is skipped for the
+rest of the chat, and `patience` stale messages in a row end it.
+"""
+import re
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Tuple
+
+import numpy as np
+
+DEFAULT_NOVELTY_THRESHOLD = 0.3
+DEFAULT_COURTESY_THRESHOLD = 0.5
+
+# Thanks, greetings and sign-offs; single generic words ("great", "all") would count ordinary opinions
+COURTESY_PHRASES = (
+    "thank you", "thank you all", "thank you so much", "thank you very much", "thanks", "thanks everyone",
+    "thanks so much", "many thanks", "you're welcome", "you are welcome", "my pleasure", "i appreciate it",
+    "appreciate it", "well said", "great point", "good point", "great discussion", "nice to meet you",
+    "nice talking to you", "hello everyone", "hi everyone", "goodbye", "bye", "have a great day",
+    "have a nice day", "take care", "cheers",
+)
+
+# A prime just above 2**32; with multipliers below 2**31 the hashes fit in uint64
+_PRIME = np.uint64(4294967311)
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def shingles(tokens: List[str], n: int = 3) -> np.ndarray:
+    """32-bit hashes of the word n-grams of `tokens`, the whole text when it is shorter than `n`."""
+    if len(tokens) < n:
+        grams = [" ".join(tokens)]
+    else:
+        grams = [" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """MinHash signatures with `num_perm` universal hash functions; equal slots estimate Jaccard similarity."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2 ** 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        return ((np.outer(hashes, self.a) + self.b) % _PRIME).min(axis=0)
+
+
+def _phrase_index(phrases: Tuple[str, ...]) -> Dict[str, List[Tuple[str, ...]]]:
+    """Phrases by first word, longest first."""
+    index: Dict[str, List[Tuple[str, ...]]] = {}
+    for phrase in sorted(phrases, key=lambda phrase: -len(phrase.split())):
+        phrase_tokens = tuple(phrase.split())
+        index.setdefault(phrase_tokens[0], []).append(phrase_tokens)
+    return index
+
+
+_COURTESY_INDEX = _phrase_index(COURTESY_PHRASES)
+
+
+def courtesy_share(tokens: List[str]) -> float:
+    """Share of `tokens` covered by courtesy phrases, matched greedily left to right."""
+    if not tokens:
+        return 1.0
+    covered = i = 0
+    while i < len(tokens):
+        width = next((len(phrase) for phrase in _COURTESY_INDEX.get(tokens[i], ())
+                      if tuple(tokens[i:i + len(phrase)]) == phrase), 0)
+        covered += width
+        i += width or 1
+    return covered / len(tokens)
+
+
+@dataclass
+class Verdict:
+    """How one message scored, and what the detector concluded."""
+
+    speaker: str
+    novelty: float
+    courtesy: float
+    stale: bool
+    skip_speaker: bool
+    stalled: bool
+
+
+class StallDetector:
+    """
+    Tracks the novelty of each speaker's turns and decides when to skip a speaker or end the chat.
+
+    Feed it every persona message of one chat with `observe`, not the moderator's
+    (its follow-up questions are templated, so they would score as stale) nor the
+    admin's brief; build a new one per chat.
+    """
+
+    def __init__(self, novelty_threshold: float = DEFAULT_NOVELTY_THRESHOLD,
+                 courtesy_threshold: float = DEFAULT_COURTESY_THRESHOLD, min_words: int = 4, patience: int = 4,
+                 speaker_patience: int = 2, ngram: int = 3, num_perm: int = 64, history: int = 20):
+        """
+        Parameters:
+            novelty_threshold (float): Below this novelty (0 restates an earlier turn, 1 is all new) a message is stale.
+            courtesy_threshold (float): Above this share of courtesy words a message is stale.
+            min_words (int): Messages shorter than this are stale.
+            patience (int): Stale messages in a row, from any participant, that end the chat.
+            speaker_patience (int): Stale turns in a row after which a participant is skipped.
+            ngram (int): Length of the word n-grams compared.
+            num_perm (int): Size of the MinHash signatures.
+            history (int): Earlier turns per speaker kept for comparison.
+        """
+        self.novelty_threshold = novelty_threshold
+        self.courtesy_threshold = courtesy_threshold
+        self.min_words = min_words
+        self.patience = patience
+        self.speaker_patience = speaker_patience
+        self.ngram = ngram
+        self.history = history
+        self.hasher = MinHasher(num_perm)
+        self._signatures: Dict[str, Deque[np.ndarray]] = {}
+        self._speaker_streaks: Dict[str, int] = {}
+        self.streak = 0
+        self.verdicts: List[Verdict] = []
+
+    @property
+    def stalled(self) -> bool:
+        return self.streak >= self.patience
+
+    def novelty(self, speaker: str, signature: np.ndarray) -> float:
+        earlier = self._signatures.get(speaker)
+        if not earlier:
+            return 1.0
+        return 1.0 - float((np.stack(earlier) == signature).mean(axis=1).max())
+
+    def observe(self, speaker: str, content: str) -> Verdict:
+        """Scores a message and updates the streaks."""
+        tokens = words(content)
+        signature = self.hasher.signature(shingles(tokens, self.ngram))
+        novelty = self.novelty(speaker, signature)
+        courtesy = courtesy_share(tokens)
+        stale = novelty < self.novelty_threshold or courtesy > self.courtesy_threshold or len(tokens) < self.min_words
+
+        self._signatures.setdefault(speaker, deque(maxlen=self.history)).append(signature)
+        self._speaker_streaks[speaker] = self._speaker_streaks.get(speaker, 0) + 1 if stale else 0
+        self.streak = self.streak + 1 if stale else 0
+        verdict = Verdict(speaker=speaker, novelty=novelty, courtesy=courtesy, stale=stale,
+                          skip_speaker=self._speaker_streaks[speaker] >= self.speaker_patience, stalled=self.stalled)
+        self.verdicts.append(verdict)
+        return verdict
@@ -1,30 +1,28 @@
-import time
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import functools
 import streamlit as st
 from streamlit_extras.stylable_container import stylable_container
-from typing import Union, Literal
-import json
-import autogen
-from autogen import AssistantAgent, UserProxyAgent, Agent
+import focus_group as fg
+import demographics_dict as dd
 import persona_handler as ph
+from transcript_store import TranscriptStore
+from history_policy import HistoryPolicy, HISTORY_POLICIES
+from model_router import ModelRouter
+from panel_generator import list_panels
+from persona_library import PersonaLibrary, bracket_range
+from run_manager import RunManager, PanelRun
+from breakout import ROOM_SIZE
+from transcript_view import inject_styles, open_bubble, render_transcript
 # import random
 
-with open('./docs/personas.json', 'r') as f:
-    personas = json.load(f)
+# Agents and their API clients survive reruns, only what changed gets rebuilt
+panel_factory = st.session_state.setdefault("panel_factory", fg.PanelFactory())
 
-llm_config={
-            "config_list": [
-                {
-                    "model": 'gpt-4o', 
-                    "api_key": st.secrets["OpenAI_APIKEY"],
-                    "max_tokens": 4096, 
-                    "temperature":0
-                }
-            ],
-            "cache_seed": None 
-        }
+llm_config = fg.make_llm_config(stream=True)
+PERSONA_LIBRARY = "Persona library"
+router = ModelRouter()
 
 # setup page title and description
 st.set_page_config(page_title="Virtual Focus Group", page_icon="🤖", layout="wide")
@@ -44,122 +42,83 @@ with stylable_container(
     st.markdown("<h4 style='text-align: center; color: black;'>To begin, describe your product in detail and explain the type of feedback you are looking for from the group.</h4>", unsafe_allow_html=True)
     st.markdown("<h6 style='text-align: center; color: black;'>The focus group will consist of a moderator and a group of personas. The moderator will guide the discussion, while the personas will provide feedback based on their unique characteristics and perspectives.</h6>", unsafe_allow_html=True)
 
-class CustomGroupChatManager(autogen.GroupChatManager):
-    def _process_received_message(self, message, sender, silent):
-        formatted_message = ""  # Initialize formatted_message as an empty string
-        with stylable_container(
-            key="container_with_border",
-            css_styles="""
-                {
-                    border: 1px solid rgba(49, 51, 63, 0.2);
-                    background: #e6ffff;
-                    border-radius: 0.5rem;
-                    padding: calc(1em - 1px);
-                    box-shadow: 0 4px 8px 0 rgba(0, 0, 0, 0.2), 0 6px 20px 0 rgba(0, 0, 0, 0.19);
-                }
-                """,
-        ):
-            # Handle the case when message is a dictionary
-            if isinstance(message, dict):
-                if 'content' in message and message['content'].strip():
-                    formatted_message = f"**{sender.name}**: {message['content']}"
-                    st.session_state.setdefault("displayed_messages", []).append(message['content'])
-                else:
-                    return super()._process_received_message(message, sender, silent)
-            # Handle the case when message is a string
-            elif isinstance(message, str) and message.strip():
-                formatted_message = f"**{sender.name}**: {message}"
-                st.session_state.setdefault("displayed_messages", []).append(message)
-            else:
-                return super()._process_received_message(message, sender, silent)
-        
-            # Only format and display the message if the sender is not the manager
-            if sender != manager and formatted_message:
-                with st.chat_message(sender.name):
-                    st.markdown(formatted_message + "\n")
-                    time.sleep(2)
-    
-        filename = "./docs/chat_summary.txt"
-
-        with open(filename, 'a') as f:
-            f.write(formatted_message + "\n")
-        return super()._process_received_message(message, sender, silent)
-    
-    
-class CustomAssistantAgent(AssistantAgent):
-    
-    @property
-    def system_message(self):
-        return super().system_message
-    
-    @system_message.setter
-    def system_message(self, value):
-        self._system_message = value    
-    
-
-class CustomGroupChat(autogen.GroupChat):
-    @staticmethod
-    def custom_speaker_selection_func(last_speaker: Agent, groupchat: autogen.GroupChat, max_interactions:int=6) -> Union[Agent, Literal['auto', 'manual', 'random', 'round_robin'], None]:
-        # Define participants and initialize or update their interaction counters
-        if not hasattr(groupchat, 'interaction_counters'):
-            groupchat.interaction_counters = {agent.name: 0 for agent in groupchat.agents if agent.name != "Moderator"}
-        # Define a maximum number of interactions per participant
-        max_interactions = 6
-        if  last_speaker and last_speaker.name == 'Moderator':
-            next_participant = min(groupchat.interaction_counters, key=groupchat.interaction_counters.get)
-            if groupchat.interaction_counters[next_participant] < max_interactions:
-                groupchat.interaction_counters[next_participant] += 1
-                return next((agent for agent in groupchat.agents if agent.name == next_participant), None)
-            else:
-                return None  # End the conversation if all participants have reached the maximum interactions
-        else:
-            return next((agent for agent in groupchat.agents if agent.name == "Moderator"), None)
-    #select_speaker_message_template = """You are in a focus group. The following roles are available:
-    #            {roles}.
-    #            Read the following conversation.
-    #            Then select the next role from {agentlist} to play. Only return the role."""
-       
-personas_agents = []
-names = []
-for persona_name, persona_data in personas.items():
-    persona_name = persona_data['Name']
-    names.append(persona_name)
-    persona_prompt = ph.persona_prompt
-    #persona_description = json.dumps(personas)
-    persona_agent = CustomAssistantAgent(
-        name=persona_name,
-        system_message=persona_prompt,
-        llm_config=llm_config,
-        human_input_mode="NEVER",
-        description=f"A virtual focus group participant named {persona_name}. They do not know anything about the product beyond what they are told. They should be called on to give opinions.",
-    )
-    personas_agents.append(persona_agent)
-names = ', '.join(names)
-
-moderator_agent = CustomAssistantAgent(
-    name="Moderator",
-    #default_auto_reply="Reply `TERMINATE` if the task is done.",
-    llm_config=llm_config,
-    system_message='''
-    You keep the conversation flowing between group members. Limit your self just to moderate the debate do not express opinion as participant. Stay in character as moderator.
-    Do not reply more than once before another group member speaks again. You can answer group members questions, but you do not offer additional information and be as much concise as possible when responding. 
-    Do not offer opinions about the topic or user_input, only moderate the conversation. 
-    Do not say thank you or the end. If there is no mor to say terminate the conversation saying TERMINATE, avoid a greetings loop between the participants. 
-    This is the list of participants {} please make sure that everyone speaks more than once.'''.format(names),
-    description="A Focus Group moderator. Your role is to moderate the focus group",
-    is_termination_msg=lambda x: True if "TERMINATE" in x.get("content") else False,
-    human_input_mode="NEVER",
-)
-
-user_proxy = UserProxyAgent(
-    name="Admin",
-    human_input_mode= "NEVER",
-    system_message="Human Admin for the Focus Group.",
-    code_execution_config=False,
-    max_consecutive_auto_reply=5,
-    #default_auto_reply="Reply `TERMINATE` if the task is done.",
-    is_termination_msg=lambda x: True if "TERMINATE" in x.get("content") else False,
-)
+# One stylesheet for every chat bubble of the page
+inject_styles()
+
+
+@st.cache_resource
+def get_transcript_store() -> TranscriptStore:
+    """One transcript store per server process, shared by all sessions."""
+    return TranscriptStore()
+
+
+@st.cache_resource
+def get_persona_library() -> PersonaLibrary:
+    """One persona library connection per server process, shared by all sessions."""
+    return PersonaLibrary()
+
+
+def library_panel() -> dict:
+    """Assemble a panel from the persona library with the demographic filters picked here."""
+    library = get_persona_library()
+    columns = st.columns(6)
+    size = columns[0].number_input("Personas:", min_value=1, max_value=1000, value=10)
+    ages = columns[1].slider("Age:", 0, 100, (0, 100))
+    genders = columns[2].multiselect("Gender:", dd.gender_groups)
+    locations = columns[3].multiselect("Location:", dd.geographic_location)
+    incomes = ["Any"] + [income for income in dd.income_levels if not income.startswith("<")]
+    income = columns[4].selectbox("Income from:", incomes)
+    seed = columns[5].number_input("Seed:", min_value=0, step=1, value=0)
+    filters = {"age": (ages[0] or None, ages[1] if ages[1] < 100 else None)}
+    if income != "Any":
+        filters["income"] = (bracket_range(income, unit=1000)[0], None)
+    if genders:
+        filters["gender"] = genders
+    if locations:
+        filters["location"] = locations
+    personas = library.query(limit=int(size), seed=int(seed), **filters)
+    if not personas:
+        st.warning("No persona in the library matches. Build or generate personas on the Home page, or import them with persona_library.py.")
+        st.stop()
+    st.caption(f"{library.count(**filters)} personas in the library match, {len(personas)} drawn.")
+    return personas
+
+
+@st.cache_resource
+def get_run_manager() -> RunManager:
+    """Runs the focus groups in the background, shared by all sessions."""
+    return RunManager(get_transcript_store())
+
+
+def show_messages(study_id: str) -> None:
+    """Render the latest messages recorded for a study, older ones a page at a time."""
+    store = get_transcript_store()
+    render_transcript(store.count(study_id), functools.partial(store.load, study_id), key=f"transcript_{study_id}")
+
+
+def panel_kwargs(settings: dict) -> dict:
+    """The build_panel arguments of the panel described by `settings` (as stored with the study)."""
+    return dict(max_round=settings["max_round"], parallel_opening=settings["parallel_opening"],
+                history_policy=HistoryPolicy(kind=settings["history_policy"]),
+                stall_detection=settings.get("stall_detection", True),
+                router=router if settings.get("routing") else None)
+
+
+def panel_builder(settings: dict):
+    """Builds the panel described by `settings` on this session's agent cache."""
+    return functools.partial(panel_factory.build_panel, settings["personas"], llm_config, **panel_kwargs(settings))
+
+
+@st.experimental_fragment(run_every=1)
+def follow_run(run: PanelRun) -> None:
+    """Poll a live run: its messages so far and the reply being streamed."""
+    show_messages(run.study_id)
+    if run.live_markdown:
+        open_bubble(run.live_speaker).markdown(run.live_markdown)
+    if not run.active:
+        # Finished, render the final state once and stop polling
+        st.rerun()
+    st.caption(f"Study {run.study_id} is {run.status}...")
 
 
 with stylable_container(
@@ -175,14 +134,35 @@ with stylable_container(
             """,
     ):
     with st.container(height=800):
+        panel_file = st.selectbox("Panel:", [fg.PERSONAS_FILE, PERSONA_LIBRARY] + list_panels(),
+                                  help="docs/personas.json holds the personas built last on the Home page, the library every persona built, generated or imported, the others are generated panels.")
+        if panel_file == PERSONA_LIBRARY:
+            personas = library_panel()
+        else:
+            personas = panel_factory.load_personas(panel_file)
+        prompt_sizes = [ph.prompt_tokens(ph.compile_persona_prompt(persona_data)) for persona_data in personas.values()]
+        st.caption(f"{len(personas)} personas. Their system prompts take about {sum(prompt_sizes) // max(len(prompt_sizes), 1)} tokens, "
+                   f"the first {ph.prompt_tokens(ph.persona_instructions)} shared by all of them.")
         user_input = st.text_area("Describe your product and the topic of discussion to the group. This is going to be the starter message from the moderator to start the conversation:", value='Hi. The moderator will guide this debate about the benefits and dislike of our new brand product a pant made of recycled plastic. Please as participant share your thought on this')
-        groupchat = CustomGroupChat(agents=[moderator_agent] + personas_agents, messages=[], 
-                            speaker_selection_method=CustomGroupChat.custom_speaker_selection_func,
-                              max_round=20, 
-                              #select_speaker_message_template=CustomGroupChat.select_speaker_message_template
-                              )
-        manager = CustomGroupChatManager(groupchat=groupchat,
-                                  llm_config=llm_config, is_termination_msg=lambda x: True if "TERMINATE" in x.get("content") else False)
+        parallel_opening = st.checkbox("Collect opening opinions from all personas in parallel", value=True)
+        stall_detection = st.checkbox("End the discussion early when it starts going in circles", value=True,
+                                      help="Personas who keep repeating themselves lose the floor, and the chat ends after a run of repeated or thank-you messages.")
+        routing = st.checkbox("Route each role to its own model", value=True,
+                              help="The moderator's follow-up questions go to a small model, the personas' answers and the analysis to a larger one, each with a token cap and a fallback model on timeouts (see model_router.py).")
+        history_kind = st.selectbox("Chat history sent by each agent per turn:", HISTORY_POLICIES, index=HISTORY_POLICIES.index("own_turns"))
+        history_policy = HistoryPolicy(kind=history_kind)
+        breakout = st.checkbox("Split the panel into breakout rooms running at the same time", value=False,
+                               help="Each room gets its own moderator and a mix of the panel; the rooms' messages are merged into one transcript and analysis. Use it for panels too large for everyone to speak in one chat.")
+        room_columns = st.columns(2)
+        room_size = room_columns[0].number_input("Personas per breakout room:", min_value=2, max_value=50, value=ROOM_SIZE, disabled=not breakout)
+        max_rooms = room_columns[1].number_input("Rooms running at once (0 for all):", min_value=0, max_value=200, value=0, disabled=not breakout,
+                                                 help="The shared client pool caps the requests in flight either way; a cap here also bounds the agents built at a time.")
+        # Build (or fetch from the cache) the agents now so a kickoff only assembles the chat
+        panel_factory.agents(personas, llm_config, history_policy, router=router if routing else None)
+        runs = get_run_manager()
+        # The session's agents serve one run at a time
+        own_run = runs.get(st.session_state.get("own_study_id"))
+        running = own_run is not None and own_run.active
         with stylable_container(
             key="green_button",
             css_styles="""
@@ -193,15 +173,39 @@ with stylable_container(
                 }
                 """,
         ):             
-            kickoff = st.button("Start Group Chat")
+            kickoff = st.button("Start Group Chat", disabled=running)
         
-        if kickoff:
-            if "chat_initiated" not in st.session_state:
-                st.session_state.chat_initiated = False
-                if not st.session_state.chat_initiated:
-                    user_proxy.initiate_chat(
-                        manager,
-                        message=user_input,
-                    )
-                    st.session_state.chat_initiated = True
+        if kickoff and not running:
+            participants = [persona_data['Name'] for persona_data in personas.values()]
+            settings = {"personas": personas, "max_round": 20, "parallel_opening": parallel_opening,
+                        "history_policy": history_kind, "stall_detection": stall_detection, "routing": routing,
+                        "breakout": int(room_size) if breakout else None}
+            if breakout:
+                run = runs.submit_breakouts(user_input, personas, llm_config, int(room_size), max_rooms=int(max_rooms) or None,
+                                            settings=settings, **panel_kwargs(settings))
+            else:
+                run = runs.submit(user_input, participants, panel_builder(settings), settings=settings)
+            st.session_state.own_study_id = st.session_state.study_id = run.study_id
+
+        # Follow this session's run; runs survive reruns, refreshes and visits to other pages
+        recent = runs.runs()
+        if recent:
+            study_ids = [run.study_id for run in recent]
+            current = st.session_state.get("study_id")
+            study_id = st.selectbox("Run:", study_ids, index=study_ids.index(current) if current in study_ids else 0,
+                                    format_func=lambda study_id: f"{study_id}: {runs.get(study_id).product[:60]}")
+            st.session_state.study_id = study_id
+            run = runs.get(study_id)
+            if run.active:
+                follow_run(run)
+            else:
+                show_messages(run.study_id)
+                st.caption(f"Study {run.study_id} {run.status}.")
+                if run.status == "failed":
+                    st.error(f"The focus group failed:\n\n{run.error}")
+                settings = get_transcript_store().load_settings(run.study_id) if run.resumable else None
+                # Continues from the last completed turn, earlier turns are not requested again; breakout rooms are not checkpointed
+                if settings is not None and not settings.get("breakout") and st.button("Resume from the last completed turn", disabled=running):
+                    st.session_state.own_study_id = runs.resume(run.study_id, panel_builder(settings)).study_id
+                    st.rerun()
     st.stop()
@@ -3,14 +3,69 @@ from streamlit_extras.stylable_container import stylable_container
 
 import sys
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 import config as cfg
+import demographics_dict as dd
+from transcript_store import TranscriptStore
+from summarize import map_reduce_summary, openai_completer
+from running_analysis import ANALYSIS_MODEL, RunningAnalyzer, notes_markdown
+from findings import FINDING_KINDS, FindingsStore, extract_findings
+from persona_library import PERSONAS_FILE, load_records
 
 st.set_page_config(page_title="Virtual Focus Group", page_icon=":tada:", layout="wide")
 
-with open("./docs/chat_summary.txt", 'r') as f:
-    summary = f.read()
+
+
+@st.cache_resource
+def get_transcript_store() -> TranscriptStore:
+    """One transcript store per server process, shared by all sessions."""
+    return TranscriptStore()
+
+
+store = get_transcript_store()
+studies = store.list_studies()
+study_ids = [study["study_id"] for study in studies]
+labels = {study["study_id"]: f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(study['created_at']))} - {(study['product'] or '')[:80]}"
+          for study in studies}
+# Default to the study run in this session, if any
+current = st.session_state.get("study_id")
+study_id = st.selectbox("Focus group to analyze:", study_ids, format_func=labels.get,
+                        index=study_ids.index(current) if current in study_ids else 0) if study_ids else None
+n_messages = store.count(study_id) if study_id else 0
+
+
+@st.cache_resource(ttl=60)
+def get_findings_store() -> FindingsStore:
+    """One findings store per server process; renewed every minute to pick up studies written by batch runs."""
+    return FindingsStore()
+
+
+findings_store = get_findings_store()
+
+
+def run_active(study_id: str) -> bool:
+    """Whether the Run page is still running the study, its running analysis writing the notes."""
+    # No run manager exists before run_manager is imported, and importing it here would load autogen
+    run_manager = sys.modules.get("run_manager")
+    return run_manager is not None and run_manager.study_active(study_id)
+
+
+def study_personas(study: dict) -> dict:
+    """The persona records of a study: saved with its settings, else looked up by name in docs/personas.json."""
+    settings = store.load_settings(study["study_id"])
+    if settings is not None and "personas" in settings:
+        return settings["personas"]
+    names = set(study["personas"])
+    return {key: persona for key, persona in load_records(PERSONAS_FILE).items() if persona["Name"] in names}
+
+# Notes kept up to date while the panel ran, absent for studies run before them
+running_notes = store.load_analysis(study_id) if study_id else None
+if running_notes is not None:
+    with st.expander(f"Running analysis notes ({running_notes['turns']} of {n_messages} messages)"):
+        st.markdown(notes_markdown(running_notes["notes"]))
 
 with stylable_container(
         key="green_button",
@@ -25,8 +80,11 @@ with stylable_container(
     user_input = st.text_area("Describe the analysis prompt:", value='Analyze the focus group chat and provide a detailed summary and analysis of the discussion in markdown format.')
     submit = st.button("Generate Analysis of Focus Group")
     if submit:
-        if not summary:
+        if not n_messages:
             st.error("No chat data available. Please run a focus group before generating an analysis.")
+        elif run_active(study_id):
+            # Its running analysis would overwrite the notes finalized here
+            st.warning("This focus group is still running. Generate the analysis once it has finished, the running notes above keep up with it meanwhile.")
         else:
             with st.spinner("Processing Analysis..."):
                 with stylable_container(
@@ -44,15 +102,32 @@ with stylable_container(
                     st.markdown("<h1 style='text-align: center; color: black;'>Analysis of Group Chat</h1>", unsafe_allow_html=True)
                     st.markdown("<h4 style='text-align: center; color: grey;'>The following is a summary of the focus group chat.</h4>", unsafe_allow_html=True)
 
-                llm = cfg.completions_model
-                response = llm.chat.completions.create(
-                    messages = [
-                        {"role": "system",
-                        "content": f"{user_input} Chat: {summary}"},
-                    ],
-                    model="gpt-4o"
-                )
-                analysis = response.choices[0].message.content
+                # The transcript is only loaded once an analysis is asked for
+                lines = store.lines(study_id)
+                llm = cfg.get_completions_client()
+                complete = openai_completer(llm, model=ANALYSIS_MODEL)
+                background = ThreadPoolExecutor(max_workers=1)
+                extraction = None
+                if not findings_store.has_study(study_id):
+                    # Typed findings for the cross-study queries below, extracted once per study next to the report
+                    study = next(study for study in studies if study["study_id"] == study_id)
+                    extraction = background.submit(extract_findings, study_id, study["product"] or "",
+                                                   lines, study_personas(study), complete,
+                                                   created_at=study["created_at"], themes=findings_store.themes())
+                if running_notes is not None:
+                    # Fold in the messages the notes miss, then write the report from the notes in one call
+                    analyzer = RunningAnalyzer(complete, study_id, store, notes=running_notes["notes"],
+                                               turns=running_notes["turns"])
+                    for message in store.load(study_id)[running_notes["turns"]:]:
+                        analyzer.add(message["speaker"], message["content"])
+                    analysis = analyzer.finalize(request=user_input)
+                    analyzer.close()
+                else:
+                    # Long transcripts are summarised chunk by chunk in parallel, then merged
+                    analysis = map_reduce_summary(lines, complete, request=user_input)
+                if extraction is not None:
+                    findings_store.write(extraction.result())
+                background.shutdown()
                 filename = "./docs/chat_summary_analysis.txt"
                 with open(filename, 'a') as f:
                     f.write(analysis + "\n")
@@ -73,3 +148,34 @@ with stylable_container(
 
                         st.markdown(analysis, unsafe_allow_html=True)
 
+
+with stylable_container(
+        key="findings_container",
+        css_styles="""
+            {
+                border: 2px solid rgba(49, 51, 63, 0.2);
+                background: offwhite;
+                border-radius: 0.5rem;
+                padding: calc(1em - 1px);
+                box-shadow: 0 4px 8px 0 rgba(0, 0, 0, 0.2), 0 6px 20px 0 rgba(0, 0, 0, 0.19);
+            }
+            """,
+    ):
+    st.markdown("<h4 style='text-align: center; color: black;'>Findings across studies</h4>", unsafe_allow_html=True)
+    stored = len(findings_store.partitions())
+    st.caption(f"{stored} analyzed studies. A study's findings are extracted when its analysis is generated.")
+    if stored:
+        columns = st.columns(4)
+        kind = columns[0].selectbox("Finding:", FINDING_KINDS)
+        recent = columns[1].number_input("Most recent studies:", min_value=1, value=min(50, stored))
+        ages = columns[2].slider("Age:", 0, 100, (0, 100))
+        genders = columns[3].multiselect("Gender:", dd.gender_groups)
+        # Age brackets overlapping the range, whatever brackets the panels used
+        filters = {"age": ages} if ages != (0, 100) else {}
+        if genders:
+            filters["gender"] = genders
+        started = time.perf_counter()
+        recurring = findings_store.recurring(kind=kind, min_studies=1, study_ids=findings_store.recent_studies(int(recent)),
+                                             **filters)
+        st.dataframe(recurring, use_container_width=True, hide_index=True)
+        st.caption(f"Queried in {(time.perf_counter() - started) * 1000:.0f} ms, no model call.")
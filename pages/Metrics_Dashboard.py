@@ -0,0 +1,72 @@
+import streamlit as st
+from streamlit_extras.stylable_container import stylable_container
+import pandas as pd
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from metrics import load_metrics
+
+st.set_page_config(page_title="Virtual Focus Group", page_icon=":tada:", layout="wide")
+
+with stylable_container(
+        key="title_container",
+        css_styles="""
+            {
+                border: 2px solid rgba(49, 51, 63, 0.2);
+                background: offwhite;
+                border-radius: 0.5rem;
+                padding: calc(1em - 1px);
+                box-shadow: 0 4px 8px 0 rgba(0, 0, 0, 0.2), 0 6px 20px 0 rgba(0, 0, 0, 0.19);
+            }
+            """,
+    ):
+    st.markdown("<h1 style='text-align: center; color: black;'>Focus Group Metrics</h1>", unsafe_allow_html=True)
+    st.markdown("<h4 style='text-align: center; color: grey;'>Latency, tokens and cost per study, agent and phase.</h4>", unsafe_allow_html=True)
+
+turns = pd.DataFrame(load_metrics())
+if turns.empty:
+    st.info("No metrics recorded yet. Run a focus group to collect them.")
+    st.stop()
+
+turns["started"] = pd.to_datetime(turns["started_at"], unit="s")
+turns["tokens"] = turns["prompt_tokens"] + turns["completion_tokens"]
+
+studies = (turns.groupby("study_id")
+           .agg(started=("started", "min"), turns=("turn", "count"), tokens=("tokens", "sum"),
+                cost=("cost", "sum"), median_latency_s=("latency_s", "median"), retries=("retries", "sum"))
+           .sort_values("started", ascending=False))
+st.subheader("Studies")
+st.dataframe(studies, use_container_width=True)
+
+study_id = st.selectbox("Study:", studies.index.tolist())
+study = turns[turns["study_id"] == study_id]
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Total cost ($)", f"{study['cost'].sum():.4f}")
+col2.metric("Total tokens", int(study["tokens"].sum()))
+col3.metric("Median latency (s)", f"{study['latency_s'].median():.2f}")
+col4.metric("Median time to first token (s)", f"{study['ttft_s'].median():.2f}" if study["ttft_s"].notna().any() else "n/a")
+
+by_agent = study.groupby("agent").agg(turns=("turn", "count"), prompt_tokens=("prompt_tokens", "sum"),
+                                      completion_tokens=("completion_tokens", "sum"), cost=("cost", "sum"),
+                                      mean_latency_s=("latency_s", "mean"), retries=("retries", "sum"))
+by_phase = study.groupby("phase").agg(turns=("turn", "count"), tokens=("tokens", "sum"), cost=("cost", "sum"),
+                                      mean_latency_s=("latency_s", "mean"))
+
+col1, col2 = st.columns(2)
+with col1:
+    st.subheader("Cost by agent")
+    st.bar_chart(by_agent["cost"])
+with col2:
+    st.subheader("Tokens by agent")
+    st.bar_chart(by_agent[["prompt_tokens", "completion_tokens"]])
+st.dataframe(by_agent, use_container_width=True)
+
+st.subheader("By phase")
+st.dataframe(by_phase, use_container_width=True)
+
+st.subheader("Turns")
+st.line_chart(study.set_index("turn")[["latency_s", "ttft_s"]])
+st.dataframe(study.drop(columns=["study_id", "started_at"]), use_container_width=True)
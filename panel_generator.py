@@ -0,0 +1,204 @@
+"""
+Synthetic panel generator.
+
+Draws N personas from marginal or joint distributions over the demographic
+fields of `demographics_dict.py`, optionally with exact quotas on one field,
+and saves them as a Parquet file the Run page loads directly:
+
+    python panel_generator.py -n 200 --spec docs/panel_spec.json --seed 7
+
+The spec (every key optional, unlisted fields are uniform):
+
+    {"marginals": {"Age": {"18-24": 0.15, "25-34": 0.2, "35-44": 0.2, "45-54": 0.2, "55-64": 0.15, "65+": 0.1}},
+     "joints": [{"fields": ["Age", "Employment"],
+                 "weights": [{"Age": "65+", "Employment": "Retired", "weight": 8}, ...]}],
+     "stratify": {"field": "Gender", "quotas": {"male": 0.48, "female": 0.48, "non-binary": 0.04}},
+     "hobbies": {"Sports": 0.3, "Music": 0.4}}
+
+Joint weights only list the combinations that can occur; a field belongs to
+at most one joint. Hobbies are drawn independently with the given rates.
+"""
+import os
+import json
+import argparse
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from faker.providers.person.en_US import Provider as NameProvider
+
+import demographics_dict as dd
+
+PANELS_DIR = './docs/panels'
+DEFAULT_HOBBY_RATE = 0.2
+
+# First names per gender, weighted by their frequency in Faker's en_US data
+NAME_POOLS = {
+    'male': NameProvider.first_names_male,
+    'female': NameProvider.first_names_female,
+    'non-binary': NameProvider.first_names_nonbinary,
+}
+
+
+def _probabilities(field: str, options: Sequence[str], weights: Optional[Dict[str, float]]) -> np.ndarray:
+    """Normalised probability of each option, uniform when no weights are given."""
+    if not weights:
+        return np.full(len(options), 1.0 / len(options))
+    unknown = set(weights) - set(options)
+    if unknown:
+        raise ValueError(f"Unknown {field} values {sorted(unknown)}, expected some of {list(options)}.")
+    p = np.array([weights.get(option, 0.0) for option in options], dtype=float)
+    if (p < 0).any() or p.sum() <= 0:
+        raise ValueError(f"The {field} weights must be non-negative and not all zero.")
+    return p / p.sum()
+
+
+def allocate(n: int, shares: np.ndarray) -> np.ndarray:
+    """Splits `n` into integer counts proportional to `shares` (largest remainder method)."""
+    raw = shares * n
+    counts = np.floor(raw).astype(int)
+    remainder = n - counts.sum()
+    if remainder:
+        counts[np.argsort(counts - raw, kind='stable')[:remainder]] += 1
+    return counts
+
+
+def _sample_joint(rng: np.random.Generator, n: int, fields: List[str], rows: List[Dict],
+                  codes: Dict[str, np.ndarray]) -> None:
+    """Draws the codes of `fields` together from the weighted combinations in `rows`."""
+    table = np.array([[dd.persona_fields[field].index(row[field]) for field in fields] for row in rows])
+    weights = np.array([row['weight'] for row in rows], dtype=float)
+    stratum = next((field for field in fields if field in codes), None)
+    if stratum is None:
+        picks = rng.choice(len(rows), size=n, p=weights / weights.sum())
+    else:
+        # Draw within each stratum so its quota holds
+        column = fields.index(stratum)
+        picks = np.empty(n, dtype=int)
+        for value in np.unique(codes[stratum]):
+            members = np.flatnonzero(codes[stratum] == value)
+            allowed = np.flatnonzero(table[:, column] == value)
+            if weights[allowed].sum() <= 0:
+                option = dd.persona_fields[stratum][value]
+                raise ValueError(f"The joint over {fields} has no weight for {stratum} = {option!r}.")
+            picks[members] = rng.choice(allowed, size=len(members), p=weights[allowed] / weights[allowed].sum())
+    for column, field in enumerate(fields):
+        codes[field] = table[picks, column]
+
+
+def _names(rng: np.random.Generator, genders: np.ndarray) -> List[str]:
+    """Draws a first name matching each persona's gender, suffixing repeats to keep agent names unique."""
+    names = np.empty(len(genders), dtype=object)
+    for code, gender in enumerate(dd.gender_groups):
+        members = np.flatnonzero(genders == code)
+        pool = NAME_POOLS.get(gender, NameProvider.first_names)
+        p = np.fromiter(pool.values(), dtype=float)
+        names[members] = np.array(list(pool.keys()), dtype=object)[rng.choice(len(pool), size=len(members), p=p / p.sum())]
+    seen: Dict[str, int] = {}
+    unique = []
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+        unique.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+    return unique
+
+
+def sample_panel(n: int, marginals: Optional[Dict[str, Dict[str, float]]] = None, joints: Sequence[Dict] = (),
+                 stratify: Optional[Dict] = None, hobbies: Optional[Dict[str, float]] = None,
+                 seed: Optional[int] = None) -> pa.Table:
+    """
+    Draws a synthetic panel of `n` personas.
+
+    Parameters:
+        n (int): Number of personas.
+        marginals (Optional[Dict[str, Dict[str, float]]]): Weights per value of a field; fields without
+            marginals (and outside any joint) are uniform.
+        joints (Sequence[Dict]): Joint distributions, each {"fields": [...], "weights": [{field: value, ..., "weight": w}]}.
+        stratify (Optional[Dict]): {"field": ..., "quotas": {value: share}}; the field's values are allotted
+            exactly in proportion to the quotas instead of being drawn.
+        hobbies (Optional[Dict[str, float]]): Probability of having each hobby, DEFAULT_HOBBY_RATE for the others.
+        seed (Optional[int]): Seed for a reproducible panel.
+
+    Returns:
+        pa.Table: One row per persona with the persona record fields, demographics dictionary-encoded.
+    """
+    marginals = marginals or {}
+    rng = np.random.default_rng(seed)
+    codes: Dict[str, np.ndarray] = {}
+
+    if stratify:
+        field = stratify['field']
+        options = dd.persona_fields[field]
+        counts = allocate(n, _probabilities(field, options, stratify['quotas']))
+        codes[field] = rng.permutation(np.repeat(np.arange(len(options)), counts))
+
+    covered = set(codes)
+    for joint in joints:
+        fields = list(joint['fields'])
+        overlap = covered.intersection(fields) - ({stratify['field']} if stratify else set())
+        if overlap:
+            raise ValueError(f"Fields {sorted(overlap)} appear in more than one joint distribution.")
+        _sample_joint(rng, n, fields, joint['weights'], codes)
+        covered.update(fields)
+
+    for field, options in dd.persona_fields.items():
+        if field not in codes:
+            codes[field] = rng.choice(len(options), size=n, p=_probabilities(field, options, marginals.get(field)))
+
+    rates = np.array([(hobbies or {}).get(hobby, DEFAULT_HOBBY_RATE) for hobby in dd.hobbies])
+    has_hobby = rng.random((n, len(dd.hobbies))) < rates
+    hobby_names = np.array(dd.hobbies, dtype=object)
+
+    columns = {'Name': pa.array(_names(rng, codes['Gender']), type=pa.string())}
+    for field, options in dd.persona_fields.items():
+        columns[field] = pa.DictionaryArray.from_arrays(pa.array(codes[field], type=pa.int8()), pa.array(options))
+    columns['Hobbies'] = pa.array([list(hobby_names[row]) for row in has_hobby], type=pa.list_(pa.string()))
+    return pa.table(columns)
+
+
+def save_panel(panel: pa.Table, path: str) -> None:
+    """Writes a panel as a compressed Parquet file."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    pq.write_table(panel, path, compression='zstd')
+
+
+def panel_records(panel: pa.Table) -> Dict[str, Dict]:
+    """Converts a panel to persona records keyed like docs/personas.json."""
+    return {f"Persona {i + 1}": {**record, 'Backstory': record.get('Backstory') or ''}
+            for i, record in enumerate(panel.to_pylist())}
+
+
+def load_panel(path: str) -> Dict[str, Dict]:
+    """Reads a Parquet panel as persona records keyed like docs/personas.json."""
+    return panel_records(pq.read_table(path))
+
+
+def list_panels(directory: str = PANELS_DIR) -> List[str]:
+    """Paths of the generated panels, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.parquet')]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic persona panel.")
+    parser.add_argument('-n', type=int, default=200, help="Number of personas.")
+    parser.add_argument('--spec', help="JSON file with marginals, joints, stratify and hobbies (see module docstring).")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('-o', '--output', default=None, help="Parquet file, defaults to docs/panels/panel-<n>.parquet.")
+    args = parser.parse_args()
+
+    spec = {}
+    if args.spec:
+        with open(args.spec, 'r') as f:
+            spec = json.load(f)
+    panel = sample_panel(args.n, marginals=spec.get('marginals'), joints=spec.get('joints', ()),
+                         stratify=spec.get('stratify'), hobbies=spec.get('hobbies'), seed=args.seed)
+    output = args.output or os.path.join(PANELS_DIR, f"panel-{args.n}.parquet")
+    save_panel(panel, output)
+    print(f"Saved {panel.num_rows} personas to {output}")
+
+
+if __name__ == '__main__':
+    main()
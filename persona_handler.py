@@ -1,14 +1,15 @@
 import json
+from functools import lru_cache
+from typing import Dict
 
-persona_name = []
-persona_data = []
+from summarize import count_tokens
 
-persona_prompt = f"""
-        You are {persona_name}, a member of a virtual focus group. Your role is to participate in a discussion about a given product or topic.
-        In this focus group, you have never seen the product before and should give your opinions on the positive and negative aspects. You always have an opinion to share. Do not show appreciation in your responses, say only what is necessary. 
-
-        Your demographics, traits, and background are as follows:
-        {json.dumps(persona_data, indent=2)}
+# Shared by every panelist and sent first, byte for byte, so the provider's
+# prompt prefix cache can serve it across agents and turns. Keep anything
+# persona specific out of it.
+persona_instructions = """
+        You are a member of a virtual focus group. Your role is to participate in a discussion about a given product or topic.
+        In this focus group, you have never seen the product before and should give your opinions on the positive and negative aspects. You always have an opinion to share. Do not show appreciation in your responses, say only what is necessary.
 
         When responding, make sure to:
         1. Take your time and consider the topic carefully. Before replying, know your persona and how they would feel. Adhere strictly to your persona and do not act otherwise.
@@ -16,7 +17,43 @@ persona_prompt = f"""
         3. Act and speak in a way that is consistent with your demographics and traits. For example, if you are considered stubborn or shy, reflect that in your responses. Avoid being witty or using humor if your persona is serious or formal.
         4. Provide opinions, insights, and reactions based on your persona's perspective.
         5. Do not make up facts about your life or background that are not provided in the persona description.
-        6. Do not repeat your self once your opinions are shared please skip your turn       
+        6. Do not repeat your self once your opinions are shared please skip your turn
         Remember to stay in character throughout the conversation and provide responses that align with your persona's background and traits.
         """
 
+persona_block = """
+        You are {name}.
+        Your demographics, traits, and background are as follows:
+        {data}
+        """
+
+
+@lru_cache(maxsize=1024)
+def _render(persona_json: str) -> str:
+    persona_data = json.loads(persona_json)
+    # Leave out the fields the Home page left empty
+    persona_data = {field: value for field, value in persona_data.items() if value not in ("", [], None)}
+    return persona_instructions + persona_block.format(name=persona_data.get('Name', ''),
+                                                       data=json.dumps(persona_data, indent=2))
+
+
+def compile_persona_prompt(persona_data: Dict) -> str:
+    """
+    Renders the system message of one persona from its record.
+
+    The shared instructions come first and the persona block last, so the
+    prompts of all panelists start with the same bytes.
+
+    Parameters:
+        persona_data (Dict): The persona record, as saved in docs/personas.json.
+
+    Returns:
+        str: The persona's system message.
+    """
+    return _render(json.dumps(persona_data))
+
+
+@lru_cache(maxsize=4096)
+def prompt_tokens(prompt: str, model: str = "gpt-4o") -> int:
+    """Number of tokens of a compiled prompt, counted once per prompt."""
+    return count_tokens(prompt, model)
@@ -0,0 +1,320 @@
+"""
+Persistent persona library.
+
+Every persona ever built on the Home page, generated by panel_generator.py or
+imported from a personas file lands in one SQLite database, indexed on the
+demographic fields of `demographics_dict.py`, so panels are assembled from a
+query instead of a single JSON file that each new panel overwrites:
+
+    library = PersonaLibrary()
+    library.import_file("docs/panels/panel-200.parquet")
+    panel = library.query(limit=40, age=(55, None), location="West US", income=(60000, None), seed=7)
+
+Age and income filters take (lowest, highest) bounds, either left open, and
+keep the personas whose bracket lies within them ("55-64" and "65+" for 55
+and over, "60k-80k" and up for an income of at least 60k). The other
+demographic fields match a value or any of a list of values. A persona is
+stored once however often it is imported: its id is a hash of its record.
+
+    python persona_library.py import docs/personas.json docs/panels/*.parquet
+    python persona_library.py export panel.json --limit 40 --age 55- --location "West US" --income 60000-
+"""
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import sqlite3
+import argparse
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import demographics_dict as dd
+
+LIBRARY_DB = "./docs/personas.db"
+# The latest panel built on the Home page
+PERSONAS_FILE = './docs/personas.json'
+
+# Persona record field -> column, for the single-valued demographic fields
+COLUMNS = {field: field.lower().replace(" ", "_") for field in dd.persona_fields}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS personas (
+    persona_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    age TEXT, age_min INTEGER, age_max INTEGER,
+    gender TEXT,
+    location TEXT,
+    education TEXT,
+    employment TEXT,
+    income TEXT, income_min INTEGER, income_max INTEGER,
+    marital_status TEXT,
+    children TEXT,
+    occupation TEXT,
+    source TEXT,
+    created_at REAL NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS persona_hobbies (
+    hobby TEXT NOT NULL,
+    persona_id TEXT NOT NULL,
+    PRIMARY KEY (hobby, persona_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS personas_age ON personas (age_min, age_max);
+CREATE INDEX IF NOT EXISTS personas_income ON personas (income_min, income_max);
+CREATE INDEX IF NOT EXISTS personas_gender ON personas (gender);
+CREATE INDEX IF NOT EXISTS personas_location ON personas (location);
+CREATE INDEX IF NOT EXISTS personas_education ON personas (education);
+CREATE INDEX IF NOT EXISTS personas_employment ON personas (employment);
+CREATE INDEX IF NOT EXISTS personas_marital_status ON personas (marital_status);
+CREATE INDEX IF NOT EXISTS personas_children ON personas (children);
+CREATE INDEX IF NOT EXISTS personas_occupation ON personas (occupation);
+CREATE INDEX IF NOT EXISTS personas_source ON personas (source);
+CREATE INDEX IF NOT EXISTS personas_created_at ON personas (created_at);
+"""
+
+Bounds = Tuple[Optional[int], Optional[int]]
+
+
+def bracket_range(bracket: Optional[str], unit: int = 1,
+                  top: Optional[int] = None) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Bounds of a bracket of the persona records, e.g. "55-64" -> (55, 64), "<18" -> (0, 17), "65+" -> (65, top).
+
+    `unit` scales the numbers, 1000 for the "60k-80k" income brackets.
+    """
+    numbers = [int(number) * unit for number in re.findall(r"\d+", bracket or "")]
+    if not numbers:
+        return None, None
+    if bracket.startswith("<"):
+        return 0, numbers[0] - 1
+    if bracket.endswith("+"):
+        return numbers[0], top
+    return numbers[0], numbers[-1]
+
+
+def persona_id(record: Dict) -> str:
+    """Stable id of a persona record, the same for identical records."""
+    return hashlib.sha256(json.dumps(record, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def load_records(path: str = PERSONAS_FILE) -> Dict[str, Dict]:
+    """The persona records of a personas file (.json) or a generated panel (.parquet)."""
+    if path.endswith(".parquet"):
+        # numpy, pyarrow and faker only load for Parquet panels
+        from panel_generator import load_panel
+        return load_panel(path)
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _row(record: Dict, source: Optional[str], created_at: float) -> tuple:
+    age_min, age_max = bracket_range(record.get("Age"), top=120)
+    income_min, income_max = bracket_range(record.get("Income"), unit=1000)
+    return (persona_id(record), record["Name"], record.get("Age"), age_min, age_max, record.get("Gender"),
+            record.get("Location"), record.get("Education"), record.get("Employment"), record.get("Income"),
+            income_min, income_max, record.get("Marital Status"), record.get("Children"), record.get("Occupation"),
+            source, created_at, json.dumps(record))
+
+
+def _unique_names(records: List[Dict]) -> List[Dict]:
+    # Agent names have to be unique within a panel, repeats get a suffix as in panel_generator.py
+    seen: Dict[str, int] = {}
+    unique = []
+    for record in records:
+        seen[record["Name"]] = seen.get(record["Name"], 0) + 1
+        count = seen[record["Name"]]
+        unique.append(record if count == 1 else {**record, "Name": f"{record['Name']}_{count}"})
+    return unique
+
+
+class PersonaLibrary:
+    """
+    SQLite-backed library of persona records.
+
+    Each demographic field has its own column and index, age and income are
+    also stored as numeric bounds, and hobbies go to a table of their own, so
+    a query reads only the matching rows.
+    """
+
+    def __init__(self, path: str = LIBRARY_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def add(self, personas: Union[Dict[str, Dict], Iterable[Dict]], source: Optional[str] = None) -> List[str]:
+        """
+        Adds persona records in one transaction; records already in the library are kept as they are.
+
+        Parameters:
+            personas (Union[Dict[str, Dict], Iterable[Dict]]): Persona records, keyed as in docs/personas.json or not.
+            source (Optional[str]): Where they come from, e.g. a file name, to query them back by.
+
+        Returns:
+            List[str]: The persona ids, in input order.
+        """
+        records = list(personas.values()) if isinstance(personas, dict) else list(personas)
+        now = time.time()
+        rows = [_row(record, source, now) for record in records]
+        hobbies = [(hobby, row[0]) for record, row in zip(records, rows) for hobby in record.get("Hobbies") or []]
+        with self._lock:
+            self._conn.executemany(f"INSERT OR IGNORE INTO personas VALUES ({', '.join('?' * 18)})", rows)
+            self._conn.executemany("INSERT OR IGNORE INTO persona_hobbies (hobby, persona_id) VALUES (?, ?)", hobbies)
+            self._conn.commit()
+        return [row[0] for row in rows]
+
+    def import_file(self, path: str) -> int:
+        """Adds the personas of a personas file (.json) or generated panel (.parquet); returns how many there were."""
+        return len(self.add(load_records(path), source=path))
+
+    def _where(self, age: Optional[Bounds], income: Optional[Bounds], hobbies: Optional[Sequence[str]],
+               source: Optional[str], equals: Dict[str, Union[str, Sequence[str]]]) -> Tuple[str, list]:
+        clauses, params = [], []
+        for column, bounds in (("age", age), ("income", income)):
+            low, high = bounds or (None, None)
+            if low is not None:
+                clauses.append(f"{column}_min >= ?")
+                params.append(low)
+            if high is not None:
+                clauses.append(f"{column}_max <= ?")
+                params.append(high)
+        for key, value in equals.items():
+            column = COLUMNS.get(key, key)
+            if column not in COLUMNS.values():
+                raise ValueError(f"Unknown persona field {key!r}, expected one of {sorted(COLUMNS.values())}.")
+            values = [value] if isinstance(value, str) else list(value)
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        if hobbies:
+            clauses.append(f"persona_id IN (SELECT persona_id FROM persona_hobbies WHERE hobby IN ({', '.join('?' * len(hobbies))}))")
+            params.extend(hobbies)
+        if source is not None:
+            clauses.append("source = ?")
+            params.append(source)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count(self, age: Optional[Bounds] = None, income: Optional[Bounds] = None,
+              hobbies: Optional[Sequence[str]] = None, source: Optional[str] = None, **equals) -> int:
+        """Number of personas matching the filters, see `query`."""
+        where, params = self._where(age, income, hobbies, source, equals)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM personas{where}", params).fetchone()[0]
+
+    def query(self, limit: Optional[int] = None, age: Optional[Bounds] = None, income: Optional[Bounds] = None,
+              hobbies: Optional[Sequence[str]] = None, source: Optional[str] = None, seed: Optional[int] = None,
+              **equals) -> Dict[str, Dict]:
+        """
+        Assembles a panel from the personas matching every filter.
+
+        Parameters:
+            limit (Optional[int]): Panel size; all matching personas when omitted.
+            age (Optional[Bounds]): (lowest, highest) age, either None; brackets must lie within.
+            income (Optional[Bounds]): (lowest, highest) income in dollars, either None; brackets must lie within.
+            hobbies (Optional[Sequence[str]]): Keep personas with any of these hobbies.
+            source (Optional[str]): Keep personas added from this source.
+            seed (Optional[int]): With `limit`, draws the panel at random among the matches, reproducibly;
+                otherwise the personas added first are taken.
+            **equals: Demographic field (record key or column name, e.g. location or "Marital Status") to a
+                value or a list of accepted values.
+
+        Returns:
+            Dict[str, Dict]: Persona records keyed like docs/personas.json, names made unique within the panel.
+
+        Raises:
+            ValueError: A filter names an unknown field.
+        """
+        where, params = self._where(age, income, hobbies, source, equals)
+        with self._lock:
+            if limit is not None and seed is not None:
+                ids = [row[0] for row in self._conn.execute(f"SELECT persona_id FROM personas{where}", params)]
+                picked = random.Random(seed).sample(sorted(ids), min(limit, len(ids)))
+                rows = []
+                # Bounded batches of ids, below SQLite's parameter limit
+                for start in range(0, len(picked), 500):
+                    batch = picked[start:start + 500]
+                    rows.extend(self._conn.execute(
+                        f"SELECT persona_id, record FROM personas WHERE persona_id IN ({', '.join('?' * len(batch))})",
+                        batch).fetchall())
+                order = {pid: i for i, pid in enumerate(picked)}
+                records = [json.loads(record) for _, record in sorted(rows, key=lambda row: order[row[0]])]
+            else:
+                sql = f"SELECT record FROM personas{where} ORDER BY created_at, rowid"
+                if limit is not None:
+                    sql += " LIMIT ?"
+                    params = params + [limit]
+                records = [json.loads(row[0]) for row in self._conn.execute(sql, params)]
+        return {f"Persona {i + 1}": record for i, record in enumerate(_unique_names(records))}
+
+    def sources(self) -> Dict[str, int]:
+        """Number of personas per source."""
+        with self._lock:
+            return {source: n for source, n in self._conn.execute(
+                "SELECT source, COUNT(*) FROM personas GROUP BY source ORDER BY MIN(created_at)")}
+
+    def export(self, path: str, **filters) -> int:
+        """
+        Writes the personas matching `filters` (see `query`) as a personas file (.json) or a panel (.parquet).
+
+        Returns:
+            int: The number of personas written.
+        """
+        personas = self.query(**filters)
+        if path.endswith(".parquet"):
+            import pyarrow as pa
+            from panel_generator import save_panel
+            save_panel(pa.Table.from_pylist(list(personas.values())), path)
+        else:
+            with open(path, 'w') as f:
+                json.dump(personas, f, indent=4)
+        return len(personas)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _bounds(text: Optional[str]) -> Optional[Bounds]:
+    # "55-", "-64", "55-64" or "55"
+    if not text:
+        return None
+    low, _, high = text.partition("-")
+    return (int(low) if low else None, int(high) if high else (None if "-" in text else int(low)))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import, query and export the persona library.")
+    parser.add_argument("--db", default=LIBRARY_DB, help="library database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="add personas files (.json) or panels (.parquet)")
+    importer.add_argument("paths", nargs="+")
+    exporter = commands.add_parser("export", help="write the matching personas to a .json or .parquet file")
+    exporter.add_argument("path")
+    exporter.add_argument("--limit", type=int, default=None)
+    exporter.add_argument("--seed", type=int, default=None)
+    exporter.add_argument("--age", help="age bounds, e.g. 55- or 25-44")
+    exporter.add_argument("--income", help="income bounds in dollars, e.g. 60000-")
+    # Age and income take bounds instead of bracket values
+    fields = [field for field in COLUMNS.values() if field not in ("age", "income")]
+    for field in fields:
+        exporter.add_argument(f"--{field.replace('_', '-')}", dest=field, action="append",
+                              help="accepted value, repeat for several")
+    exporter.add_argument("--hobby", dest="hobbies", action="append")
+    args = parser.parse_args(argv)
+
+    library = PersonaLibrary(args.db)
+    if args.command == "import":
+        for path in args.paths:
+            print(f"{library.import_file(path)} personas from {path}")
+    else:
+        equals = {field: getattr(args, field) for field in fields if getattr(args, field)}
+        n = library.export(args.path, limit=args.limit, seed=args.seed, age=_bounds(args.age),
+                           income=_bounds(args.income), hobbies=args.hobbies, **equals)
+        print(f"Saved {n} personas to {args.path}")
+    library.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
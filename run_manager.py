@@ -0,0 +1,306 @@
+import time
+import threading
+import weakref
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from autogen import Agent, GroupChat, GroupChatManager
+from autogen.io import IOStream
+
+import focus_group as fg
+from breakout import run_breakouts
+from checkpoint import Checkpointer, resume_chat
+from llm_cache import build_cache
+from metrics import MetricsRecorder
+from running_analysis import RunningAnalyzer
+from streaming import StreamlitTokenStream, attach_stream
+from summarize import Completer, autogen_completer
+from transcript_store import TranscriptStore
+
+ACTIVE_STATUSES = ("queued", "running")
+# Runs that stopped before the end and can continue from their last checkpoint
+RESUMABLE_STATUSES = ("failed", "interrupted")
+
+
+@dataclass
+class PanelRun:
+    """State of one focus group running in the background, polled by the Run page."""
+
+    study_id: str
+    product: str
+    status: str = "queued"
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    # The reply being streamed right now, as markdown, and who is speaking
+    live_markdown: str = ""
+    live_speaker: Optional[str] = None
+    future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    @property
+    def resumable(self) -> bool:
+        return self.status in RESUMABLE_STATUSES
+
+    def open_bubble(self, speaker: str) -> "PanelRun":
+        """Token stream callback: the run is the placeholder of the reply being streamed."""
+        self.live_speaker = speaker
+        return self
+
+    def markdown(self, text: str) -> None:
+        """Placeholder interface for the token stream: keeps the latest partial reply."""
+        self.live_markdown = text
+
+
+class BackgroundGroupChatManager(fg.InstrumentedGroupChatManager):
+    """
+    Manager for background runs: records each message in the transcript store instead of rendering it,
+    and passes it on to the running analysis.
+    """
+
+    # Set by RunManager before the chat starts
+    run: Optional[PanelRun] = None
+    store: Optional[TranscriptStore] = None
+    token_stream: Optional[StreamlitTokenStream] = None
+    analyzer: Optional[RunningAnalyzer] = None
+
+    def _process_received_message(self, message, sender, silent):
+        if isinstance(message, dict):
+            content = message.get('content') or ""
+        elif isinstance(message, str):
+            content = message
+        else:
+            content = ""
+        if content.strip():
+            if self.token_stream is not None and sender.name == self.token_stream.speaker:
+                self.record_turn(sender, first_token_at=self.token_stream.first_token_at)
+                self.token_stream.finish(sender.name)
+            self.store.append(self.run.study_id, sender.name, content)
+            if self.analyzer is not None:
+                self.analyzer.add(sender.name, content)
+            self.run.live_markdown = ""
+        return super()._process_received_message(message, sender, silent)
+
+
+PanelBuilder = Callable[..., Tuple[GroupChat, GroupChatManager, Agent]]
+
+# The run managers of this process, so other pages can tell whether a study is still running
+_managers: "weakref.WeakSet[RunManager]" = weakref.WeakSet()
+
+
+def study_active(study_id: str) -> bool:
+    """Whether a run manager of this process is running the study, its running analysis still writing the notes."""
+    for manager in list(_managers):
+        run = manager.get(study_id)
+        if run is not None and run.active:
+            return True
+    return False
+
+
+class RunManager:
+    """
+    Runs focus groups on background threads.
+
+    The Run page submits a panel and returns right away; messages land in the
+    transcript store as they are produced and the page polls the store and the
+    run's status, so reruns, refreshes and navigating away do not interrupt or
+    duplicate a run. One manager is shared by every session of the server.
+
+    Every turn is checkpointed (see checkpoint.py), so a run that failed, or
+    was interrupted by a restart, can be resumed from its last completed turn.
+    The analysis notes are kept up to date as the messages arrive (see
+    running_analysis.py), so the report is ready right after the run.
+    Large panels can run as concurrent breakout rooms (`submit_breakouts`),
+    whose merged plenary transcript is stored and analysed the same way.
+    """
+
+    def __init__(self, store: TranscriptStore, max_workers: int = 4, complete: Optional[Completer] = None):
+        """
+        Parameters:
+            store (TranscriptStore): Where the transcripts, checkpoints and analysis notes go.
+            max_workers (int): Focus groups run at the same time.
+            complete (Optional[Completer]): Completion function of the running analysis, by default one on
+                each panel's analysis llm_config (the "analysis" route of a routed panel).
+        """
+        self.store = store
+        self.complete = complete
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="focus-group")
+        self._runs: Dict[str, PanelRun] = {}
+        self._lock = threading.Lock()
+        _managers.add(self)
+        # Runs of previous server processes that can be resumed; those still marked running were cut off
+        for status, run_status in (("failed", "failed"), ("running", "interrupted")):
+            for checkpoint in store.list_checkpoints(status=status):
+                run = PanelRun(study_id=checkpoint["study_id"], product=checkpoint["product"] or "", status=run_status,
+                               submitted_at=checkpoint["updated_at"], finished_at=checkpoint["updated_at"])
+                self._runs[run.study_id] = run
+
+    def submit(self, product: str, participants: List[str], build: PanelBuilder,
+               settings: Optional[Dict] = None) -> PanelRun:
+        """
+        Queues a focus group.
+
+        Parameters:
+            product (str): The opening message, the product brief.
+            participants (List[str]): Names of the personas, recorded with the study.
+            build (PanelBuilder): Builds the group chat, manager and admin; called on the worker thread with
+                `manager_cls=BackgroundGroupChatManager` and a checkpointing `on_turn`, e.g. a partial of
+                `PanelFactory.build_panel`.
+            settings (Optional[Dict]): JSON-serialisable description of what `build` builds, stored with the
+                study so the panel can be rebuilt to resume it after a restart.
+
+        Returns:
+            PanelRun: The run, whose `study_id` keys its transcript.
+        """
+        run = PanelRun(study_id=self.store.new_study(product, participants), product=product)
+        if settings is not None:
+            self.store.save_settings(run.study_id, settings)
+        with self._lock:
+            self._runs[run.study_id] = run
+        run.future = self._pool.submit(self._run, run, build)
+        return run
+
+    def submit_breakouts(self, product: str, personas: Dict[str, Dict], llm_config: Dict, room_size: int,
+                         max_rooms: Optional[int] = None, settings: Optional[Dict] = None, **panel_kwargs) -> PanelRun:
+        """
+        Queues a focus group split into concurrent breakout rooms, see breakout.py.
+
+        The plenary transcript goes to the store and the running analysis as its
+        messages arrive. Breakout runs are not checkpointed: a failed one is
+        started again rather than resumed.
+
+        Parameters:
+            product (str): The opening message, the product brief, sent to every room.
+            personas (Dict[str, Dict]): The whole panel.
+            llm_config (Dict): The autogen llm_config of the agents.
+            room_size (int): Maximum number of personas per room.
+            max_rooms (Optional[int]): Rooms running at once, all of them by default.
+            settings (Optional[Dict]): JSON-serialisable description of the run, stored with the study.
+            **panel_kwargs: Passed on to `focus_group.build_panel` for every room.
+
+        Returns:
+            PanelRun: The run, whose `study_id` keys its plenary transcript.
+        """
+        participants = [persona['Name'] for persona in personas.values()]
+        run = PanelRun(study_id=self.store.new_study(product, participants), product=product)
+        if settings is not None:
+            self.store.save_settings(run.study_id, settings)
+        with self._lock:
+            self._runs[run.study_id] = run
+        run.future = self._pool.submit(self._run_breakouts, run, personas, llm_config, room_size, max_rooms,
+                                       panel_kwargs)
+        return run
+
+    def resume(self, study_id: str, build: PanelBuilder) -> PanelRun:
+        """
+        Continues a failed or interrupted focus group from its last checkpoint.
+
+        Parameters:
+            study_id (str): The study to resume.
+            build (PanelBuilder): Builds the same panel again, see `submit` and `TranscriptStore.load_settings`.
+
+        Returns:
+            PanelRun: The run, queued again.
+
+        Raises:
+            ValueError: The study is running or has no checkpoint.
+        """
+        checkpoint = self.store.load_checkpoint(study_id)
+        if checkpoint is None:
+            raise ValueError(f"Study {study_id} has no checkpoint to resume from.")
+        with self._lock:
+            run = self._runs.get(study_id)
+            if run is not None and run.active:
+                raise ValueError(f"Study {study_id} is already {run.status}.")
+            run = PanelRun(study_id=study_id, product=checkpoint["messages"][0]["content"])
+            self._runs[study_id] = run
+        run.future = self._pool.submit(self._run, run, build, checkpoint)
+        return run
+
+    def _analyzer(self, study_id: str, manager: GroupChatManager, checkpoint: Optional[Dict]) -> RunningAnalyzer:
+        """The study's running analysis, continuing from its saved notes when resuming."""
+        analyzer = RunningAnalyzer(self.complete or autogen_completer(manager.analysis_llm_config or manager.llm_config),
+                                    study_id, self.store)
+        analysis = self.store.load_analysis(study_id) if checkpoint is not None else None
+        if analysis is not None:
+            # Turns after the checkpoint are played again, notes that already cover them are kept as they are
+            analyzer.notes = analysis["notes"]
+            analyzer.turns = min(analysis["turns"], checkpoint["transcript_turns"])
+        if checkpoint is not None:
+            for message in self.store.load(study_id)[analyzer.turns:checkpoint["transcript_turns"]]:
+                analyzer.add(message["speaker"], message["content"])
+        return analyzer
+
+    def _run(self, run: PanelRun, build: PanelBuilder, checkpoint: Optional[Dict] = None) -> None:
+        run.status = "running"
+        # Created here so the worker thread owns it
+        token_stream = StreamlitTokenStream(run.open_bubble)
+        checkpointer = Checkpointer(self.store, run.study_id)
+        analyzer = None
+        status = "failed"
+        try:
+            groupchat, manager, admin = build(manager_cls=BackgroundGroupChatManager, on_turn=checkpointer)
+            checkpointer.bind(groupchat, checkpoint)
+            analyzer = self._analyzer(run.study_id, manager, checkpoint)
+            manager.run, manager.store, manager.token_stream, manager.analyzer = run, self.store, token_stream, analyzer
+            attach_stream(groupchat.agents, token_stream)
+            manager.metrics = MetricsRecorder(run.study_id)
+            manager.metrics.attach(groupchat.agents, moderator_name="Moderator")
+            with IOStream.set_default(token_stream):
+                if checkpoint is None:
+                    admin.initiate_chat(manager, message=run.product, cache=build_cache())
+                else:
+                    resume_chat(checkpoint, groupchat, manager, admin, store=self.store, cache=build_cache())
+            status = "completed"
+        except Exception:
+            status = "failed"
+            run.error = traceback.format_exc()
+        finally:
+            self.store.set_checkpoint_status(run.study_id, status)
+            self.store.flush()
+            if analyzer is not None:
+                # Folds in the last messages; a failed update leaves the notes one batch behind
+                analyzer.close()
+            run.live_markdown = ""
+            run.finished_at = time.time()
+            # Only now, the run counts as active until its running analysis has saved the last notes
+            run.status = status
+
+    def _run_breakouts(self, run: PanelRun, personas: Dict[str, Dict], llm_config: Dict, room_size: int,
+                       max_rooms: Optional[int], panel_kwargs: Dict) -> None:
+        run.status = "running"
+        router = panel_kwargs.get("router")
+        analysis_llm_config = router.llm_config(llm_config, "analysis") if router is not None else llm_config
+        analyzer = RunningAnalyzer(self.complete or autogen_completer(analysis_llm_config), run.study_id, self.store)
+
+        def record(message: Dict) -> None:
+            self.store.append(run.study_id, message["speaker"], message["content"])
+            analyzer.add(message["speaker"], message["content"])
+
+        status = "failed"
+        try:
+            breakout = run_breakouts(personas, run.product, llm_config, room_size=room_size, max_rooms=max_rooms,
+                                     study_id=run.study_id, on_message=record, **panel_kwargs)
+            status, run.error = breakout.status, breakout.error
+        except Exception:
+            run.error = traceback.format_exc()
+        finally:
+            self.store.flush()
+            analyzer.close()
+            run.finished_at = time.time()
+            # Active until the running analysis has saved the last notes, like `_run`
+            run.status = status
+
+    def get(self, study_id: Optional[str]) -> Optional[PanelRun]:
+        with self._lock:
+            return self._runs.get(study_id)
+
+    def runs(self) -> List[PanelRun]:
+        """Every run of this server process, newest first."""
+        with self._lock:
+            return sorted(self._runs.values(), key=lambda run: run.submitted_at, reverse=True)
@@ -0,0 +1,192 @@
+"""
+Running analysis of a focus group, kept up to date while it runs.
+
+`RunningAnalyzer` holds structured research notes (themes, pain points,
+preferences, suggestions, quotes and each persona's stance) and folds the new
+messages into them as turns are recorded, on its own thread, so the panel
+never waits for it. Every update sends the current notes and the new messages
+only, never the whole transcript. The notes are saved in the transcript store
+after each update, and the final report is one call over them (`finalize`).
+"""
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from summarize import Completer, split_transcript, summary_agent_prompt
+from transcript_store import TranscriptStore
+
+ANALYSIS_MODEL = "gpt-4o"
+
+# Lists of short statements, except stances: persona name -> their current stance
+NOTE_KEYS = ("themes", "pain_points", "preferences", "suggestions", "quotes")
+
+update_prompt = """
+    You keep structured research notes on a focus group while it runs. You get the notes so far as JSON and the
+    messages said since they were last updated. Return the updated notes as one JSON object with the keys
+    "themes", "pain_points", "preferences", "suggestions" and "quotes" (lists of short statements, quotes verbatim
+    with the speaker's name) and "stances" (each participant's name mapped to their current stance on the product in
+    one or two sentences). Keep everything that still holds, merge duplicates, update stances that changed and add
+    what the new messages bring. Leave the moderator's and the admin's words out of the stances.
+    Return only the JSON object.
+    """
+
+
+def empty_notes() -> Dict:
+    return {**{key: [] for key in NOTE_KEYS}, "stances": {}}
+
+
+def parse_notes(text: str) -> Dict:
+    """
+    Reads the notes out of a model reply, ignoring code fences or text around the JSON object.
+
+    Raises:
+        ValueError: The reply holds no JSON object.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("The analysis update returned no JSON object.")
+    parsed = json.loads(text[start:end + 1])
+    notes = empty_notes()
+    for key in NOTE_KEYS:
+        notes[key] = [str(item) for item in parsed.get(key) or []]
+    notes["stances"] = {str(name): str(stance) for name, stance in (parsed.get("stances") or {}).items()}
+    return notes
+
+
+def update_messages(notes: Dict, new_messages: str) -> List[Dict]:
+    """The request folding `new_messages` (transcript lines) into `notes`."""
+    return [
+        {"role": "system", "content": update_prompt},
+        {"role": "user", "content": f"Notes so far ```{json.dumps(notes)}```\n\nNew messages ```{new_messages}```"},
+    ]
+
+
+def analyze_transcript(lines: List[str], complete: Completer, chunk_tokens: int = 6000) -> Dict:
+    """
+    Notes for a finished transcript, folded in chunk by chunk as the running analysis would.
+
+    Parameters:
+        lines (List[str]): The transcript, one entry per message.
+        complete (Completer): The completion function, see summarize.py.
+        chunk_tokens (int): Token budget of the messages sent per update.
+
+    Returns:
+        Dict: The notes.
+    """
+    notes = empty_notes()
+    for chunk in split_transcript(lines, chunk_tokens, model=ANALYSIS_MODEL):
+        notes = parse_notes(complete(update_messages(notes, chunk)))
+    return notes
+
+
+def notes_markdown(notes: Dict) -> str:
+    """The notes as markdown, e.g. to show the analysis while the panel runs."""
+    sections = []
+    for key in NOTE_KEYS:
+        if notes.get(key):
+            sections.append(f"**{key.replace('_', ' ').capitalize()}**\n" + "\n".join(f"- {item}" for item in notes[key]))
+    if notes.get("stances"):
+        sections.append("**Stances**\n" + "\n".join(f"- {name}: {stance}" for name, stance in notes["stances"].items()))
+    return "\n\n".join(sections)
+
+
+def finalize_report(notes: Dict, complete: Completer, instructions: str = summary_agent_prompt,
+                    request: Optional[str] = None) -> str:
+    """
+    Writes the final report from the notes, in the `instructions` format.
+
+    Parameters:
+        notes (Dict): The running notes, see `RunningAnalyzer.notes`.
+        complete (Completer): The completion function, see summarize.py.
+        instructions (str): The system prompt for the report.
+        request (Optional[str]): An extra request from the user, added to the prompt.
+
+    Returns:
+        str: The report.
+    """
+    if request:
+        instructions = f"{request}\n{instructions}"
+    return complete([
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": f"Here are the structured research notes of the study ```{json.dumps(notes, indent=1)}```"},
+    ])
+
+
+class RunningAnalyzer:
+    """
+    Updates a study's research notes as its messages arrive.
+
+    `add` only buffers a message; once `batch_messages` are waiting, an update
+    is queued on the analyzer's single worker thread. An update takes every
+    message waiting when it starts, so when the model is slower than the panel
+    the batches simply grow. A failed update keeps its messages for the next one.
+    """
+
+    def __init__(self, complete: Completer, study_id: Optional[str] = None, store: Optional[TranscriptStore] = None,
+                 batch_messages: int = 4, notes: Optional[Dict] = None, turns: int = 0):
+        """
+        Parameters:
+            complete (Completer): The completion function, see summarize.py.
+            study_id (Optional[str]): The study, to save the notes under.
+            store (Optional[TranscriptStore]): Where the notes are saved after every update.
+            batch_messages (int): Messages buffered before an update is queued.
+            notes (Optional[Dict]): Notes to continue from, e.g. `TranscriptStore.load_analysis`.
+            turns (int): Transcript messages already folded into `notes`.
+        """
+        self.complete = complete
+        self.study_id = study_id
+        self.store = store
+        self.batch_messages = batch_messages
+        self.notes = notes or empty_notes()
+        self.turns = turns
+        self.error: Optional[str] = None
+        self._pending: List[str] = []
+        self._queued: Optional[Future] = None
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="running-analysis")
+
+    def add(self, speaker: str, content: str) -> None:
+        """Buffers one transcript message, queuing an update once enough are waiting."""
+        with self._lock:
+            self._pending.append(f"**{speaker}**: {content}")
+            if len(self._pending) >= self.batch_messages:
+                self._queue_locked()
+
+    def _queue_locked(self) -> Future:
+        if self._queued is None or self._queued.running() or self._queued.done():
+            self._queued = self._pool.submit(self._update)
+        return self._queued
+
+    def _update(self) -> None:
+        with self._lock:
+            lines, self._pending = self._pending, []
+        if not lines:
+            return
+        try:
+            self.notes = parse_notes(self.complete(update_messages(self.notes, "\n".join(lines))))
+        except Exception as error:
+            self.error = f"{type(error).__name__}: {error}"
+            with self._lock:
+                self._pending[:0] = lines
+            return
+        self.error = None
+        self.turns += len(lines)
+        if self.store is not None and self.study_id is not None:
+            self.store.save_analysis(self.study_id, self.turns, self.notes)
+
+    def flush(self) -> Dict:
+        """Folds in every buffered message, waits for it and returns the notes."""
+        with self._lock:
+            queued = self._queue_locked() if self._pending else self._queued
+        if queued is not None:
+            queued.result()
+        return self.notes
+
+    def finalize(self, instructions: str = summary_agent_prompt, request: Optional[str] = None) -> str:
+        """The final report, written from the notes once every message is folded in."""
+        return finalize_report(self.flush(), self.complete, instructions=instructions, request=request)
+
+    def close(self) -> None:
+        self.flush()
+        self._pool.shutdown()
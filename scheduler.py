@@ -0,0 +1,281 @@
+import heapq
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Union
+
+from autogen import Agent, GroupChat
+
+SPEAKER_POLICIES = ("round_robin", "least_spoken", "quota")
+
+
+class SpeakerPolicy(ABC):
+    """
+    Decides which participant gets the floor next.
+
+    `next` only peeks, the scheduler calls `spoke` once the participant is given
+    the floor (or, in the parallel opening round, once their reply is recorded).
+    """
+
+    @abstractmethod
+    def reset(self, participants: List[str]) -> None:
+        """Starts over with `participants`, in panel order."""
+
+    @abstractmethod
+    def next(self) -> Optional[str]:
+        """The participant who gets the floor next, None once nobody may speak."""
+
+    @abstractmethod
+    def spoke(self, name: str) -> None:
+        """Records that `name` had the floor."""
+
+    @abstractmethod
+    def drop(self, name: str) -> None:
+        """Never gives the floor to `name` again."""
+
+    @abstractmethod
+    def state(self) -> Dict:
+        """JSON-serialisable state, for checkpoints."""
+
+    @abstractmethod
+    def restore(self, state: Dict) -> None:
+        """Restores a `state()` taken on the same participants, after `reset`."""
+
+
+class RoundRobin(SpeakerPolicy):
+    """Gives the floor to the participants in panel order, over and over."""
+
+    def reset(self, participants: List[str]) -> None:
+        self.order = list(participants)
+        self.position = 0
+
+    def next(self) -> Optional[str]:
+        return self.order[self.position % len(self.order)] if self.order else None
+
+    def spoke(self, name: str) -> None:
+        if self.order and self.order[self.position % len(self.order)] == name:
+            self.position += 1
+
+    def drop(self, name: str) -> None:
+        if name not in self.order:
+            return
+        index = self.order.index(name)
+        current = self.position % len(self.order)
+        self.order.remove(name)
+        self.position = current - 1 if index < current else current
+
+    def state(self) -> Dict:
+        return {"position": self.position, "order": list(self.order)}
+
+    def restore(self, state: Dict) -> None:
+        # The order loses the dropped participants, the position counts in it
+        self.order = [name for name in state.get("order", self.order) if name in self.order]
+        self.position = state["position"]
+
+
+class LeastSpoken(SpeakerPolicy):
+    """
+    Gives the floor to the participant who has spoken the least, ties going to panel order.
+
+    Participants sit in a heap keyed by their turn count, so picking and
+    updating the next speaker is O(log n) instead of a scan of the panel.
+    Entries for participants who spoke out of turn are left in the heap and
+    skipped once they surface.
+    """
+
+    def reset(self, participants: List[str]) -> None:
+        self.counts = dict.fromkeys(participants, 0)
+        self.order = {name: position for position, name in enumerate(participants)}
+        self.dropped = set()
+        self.heap = [(self._key(name), self.order[name], name) for name in participants if self._eligible(name)]
+        heapq.heapify(self.heap)
+
+    def _key(self, name: str) -> float:
+        return self.counts[name]
+
+    def _eligible(self, name: str) -> bool:
+        return name not in self.dropped
+
+    def next(self) -> Optional[str]:
+        while self.heap and (self.heap[0][0] != self._key(self.heap[0][2]) or self.heap[0][2] in self.dropped):
+            heapq.heappop(self.heap)
+        return self.heap[0][2] if self.heap else None
+
+    def spoke(self, name: str) -> None:
+        if name not in self.counts:
+            return
+        self.counts[name] += 1
+        if not self._eligible(name):
+            return
+        entry = (self._key(name), self.order[name], name)
+        if self.heap and self.heap[0][2] == name:
+            heapq.heapreplace(self.heap, entry)
+        else:
+            heapq.heappush(self.heap, entry)
+
+    def drop(self, name: str) -> None:
+        # Its heap entries are skipped once they surface
+        self.dropped.add(name)
+
+    def state(self) -> Dict:
+        return {"counts": dict(self.counts), "dropped": sorted(self.dropped)}
+
+    def restore(self, state: Dict) -> None:
+        self.counts.update((name, count) for name, count in state["counts"].items() if name in self.counts)
+        self.dropped = set(state.get("dropped", ())) & set(self.counts)
+        self.heap = [(self._key(name), self.order[name], name) for name in self.counts if self._eligible(name)]
+        heapq.heapify(self.heap)
+
+
+class WeightedQuota(LeastSpoken):
+    """
+    Shares the floor in proportion to per-participant weights.
+
+    The next speaker is the one whose next turn would keep them furthest below
+    their share, i.e. the smallest (turns + 1) / weight. Participants with no
+    weight never get the floor. `quota_weights` derives the weights from
+    demographic quotas.
+    """
+
+    def __init__(self, weights: Dict[str, float]):
+        self.weights = weights
+
+    def _key(self, name: str) -> float:
+        return (self.counts[name] + 1) / self.weights[name]
+
+    def _eligible(self, name: str) -> bool:
+        return self.weights.get(name, 0) > 0 and name not in self.dropped
+
+
+def quota_weights(personas: Dict[str, Dict], field: str, quotas: Dict[str, float]) -> Dict[str, float]:
+    """
+    Turns demographic quotas into per-persona speaking weights.
+
+    Parameters:
+        personas (Dict[str, Dict]): Persona records keyed as in docs/personas.json.
+        field (str): The demographic field the quotas are on, e.g. "Gender" or "Age".
+        quotas (Dict[str, float]): Share of the discussion per value of `field`, e.g. {"female": 0.5}.
+            Values without a quota split what is left of 1 evenly.
+
+    Returns:
+        Dict[str, float]: Weight per persona name; a group's quota is split evenly among its members.
+    """
+    groups: Dict[str, List[str]] = {}
+    for persona in personas.values():
+        groups.setdefault(str(persona.get(field, "")), []).append(persona['Name'])
+    unlisted = [value for value in groups if value not in quotas]
+    leftover = max(0.0, 1.0 - sum(quotas.get(value, 0) for value in groups))
+    weights = {}
+    for value, names in groups.items():
+        share = quotas[value] if value in quotas else leftover / len(unlisted)
+        for name in names:
+            weights[name] = share / len(names)
+    return weights
+
+
+def make_policy(policy: Union[str, SpeakerPolicy], weights: Optional[Dict[str, float]] = None) -> SpeakerPolicy:
+    """Returns `policy` itself or the policy named by it, one of SPEAKER_POLICIES."""
+    if isinstance(policy, SpeakerPolicy):
+        return policy
+    if policy == "round_robin":
+        return RoundRobin()
+    if policy == "least_spoken":
+        return LeastSpoken()
+    if policy == "quota":
+        if not weights:
+            raise ValueError('The "quota" speaker policy needs weights, see quota_weights().')
+        return WeightedQuota(weights)
+    raise ValueError(f"Unknown speaker policy {policy!r}, expected one of {SPEAKER_POLICIES}.")
+
+
+class SpeakerScheduler:
+    """
+    Speaker selection method for the focus group chats.
+
+    Alternates between the moderator and the participants picked by `policy`,
+    letting `moderator_every` participants speak between two moderator turns.
+    A participant who had `max_interactions` turns is passed over, and the
+    chat ends once every participant has. Agents are looked up in a name index built once, so a selection
+    costs the same for five personas as for hundreds.
+
+    Pass the instance as the GroupChat's `speaker_selection_method`. The state
+    is reset whenever a new chat starts on the group chat.
+    """
+
+    def __init__(self, agents: Iterable[Agent], moderator_name: str = "Moderator",
+                 policy: Union[str, SpeakerPolicy] = "least_spoken", max_interactions: int = 6,
+                 moderator_every: int = 1, weights: Optional[Dict[str, float]] = None):
+        """
+        Parameters:
+            agents (Iterable[Agent]): The moderator and the participants, in panel order.
+            moderator_name (str): Name of the moderator agent.
+            policy (Union[str, SpeakerPolicy]): A SpeakerPolicy or one of SPEAKER_POLICIES.
+            max_interactions (int): Maximum number of turns per participant.
+            moderator_every (int): Number of participant turns between two moderator turns.
+            weights (Optional[Dict[str, float]]): Speaking weight per participant, for the "quota" policy.
+        """
+        self.index: Dict[str, Agent] = {agent.name: agent for agent in agents}
+        self.moderator_name = moderator_name
+        self.participants = [name for name in self.index if name != moderator_name]
+        self.policy = make_policy(policy, weights)
+        self.max_interactions = max_interactions
+        self.moderator_every = max(1, moderator_every)
+        self.reset()
+
+    def reset(self) -> None:
+        self.interaction_counters = dict.fromkeys(self.participants, 0)
+        self.since_moderator = 0
+        self.muted = set()
+        self.policy.reset(self.participants)
+
+    def mute(self, name: str) -> None:
+        """Skips participant `name` for the rest of the chat, e.g. once they only repeat themselves."""
+        if name in self.interaction_counters and name not in self.muted:
+            self.muted.add(name)
+            self.policy.drop(name)
+
+    def spoke(self, name: str) -> None:
+        """Counts a turn of participant `name`."""
+        if name in self.interaction_counters:
+            self.interaction_counters[name] += 1
+            self.since_moderator += 1
+            self.policy.spoke(name)
+
+    def state(self) -> Dict:
+        """The turn counters and policy state as JSON-serialisable data, for checkpoints."""
+        return {"interaction_counters": dict(self.interaction_counters), "since_moderator": self.since_moderator,
+                "muted": sorted(self.muted), "policy": self.policy.state()}
+
+    def restore(self, state: Dict) -> None:
+        """Continues from a `state()` taken on the same panel."""
+        self.reset()
+        self.interaction_counters.update((name, count) for name, count in state["interaction_counters"].items()
+                                         if name in self.interaction_counters)
+        self.since_moderator = state["since_moderator"]
+        self.muted = set(state.get("muted", ())) & set(self.interaction_counters)
+        self.policy.restore(state["policy"])
+
+    def settings(self) -> Dict:
+        """What the scheduler was configured with, for the checkpoints' config hash."""
+        return {"moderator_name": self.moderator_name, "policy": type(self.policy).__name__,
+                "max_interactions": self.max_interactions, "moderator_every": self.moderator_every,
+                "weights": getattr(self.policy, "weights", None)}
+
+    def __call__(self, last_speaker: Optional[Agent], groupchat: GroupChat) -> Optional[Agent]:
+        if len(groupchat.messages) <= 1:
+            # Only the opening message so far: a new chat on this panel
+            self.reset()
+        moderator = self.index.get(self.moderator_name)
+        if last_speaker is not None and last_speaker.name == self.moderator_name:
+            self.since_moderator = 0
+        elif moderator is not None and (last_speaker is None or last_speaker.name not in self.interaction_counters
+                                        or self.since_moderator >= self.moderator_every):
+            return moderator
+
+        next_participant = self.policy.next()
+        while next_participant is not None and self.interaction_counters[next_participant] >= self.max_interactions:
+            # Out of turns, the others keep theirs
+            self.policy.drop(next_participant)
+            next_participant = self.policy.next()
+        if next_participant is None:
+            return None  # End the conversation once every participant has had their turns
+        self.spoke(next_participant)
+        return self.index[next_participant]
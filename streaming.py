@@ -0,0 +1,93 @@
+import time
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from autogen import Agent
+from autogen.io import IOConsole
+
+CURSOR = "▌"
+
+
+class StreamlitTokenStream(IOConsole):
+    """
+    autogen IOStream that writes streamed completion tokens into a Streamlit placeholder.
+
+    With `"stream": True` in the llm_config, autogen prints every token with
+    `end=""`; those go to the bubble of the agent currently replying, anything
+    else is left to the console. Only the thread that created the stream (the
+    Streamlit script thread, or the worker running the panel in the background)
+    renders, replies generated on other threads fall back to the console.
+    """
+
+    def __init__(self, open_bubble: Callable[[str], Any]):
+        """
+        Parameters:
+            open_bubble (Callable[[str], Any]): Creates the chat bubble for a speaker name
+                and returns an `st.empty()`-like placeholder to stream into.
+        """
+        self.open_bubble = open_bubble
+        self._owner = threading.get_ident()
+        self.speaker: Optional[str] = None
+        self.placeholder = None
+        self.text = ""
+        self.started_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+
+    def begin(self, speaker: str) -> None:
+        """Marks the start of a reply by `speaker`."""
+        if threading.get_ident() != self._owner:
+            return
+        self.speaker = speaker
+        self.placeholder = None
+        self.text = ""
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+
+    def print(self, *objects: Any, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+        if end == "":
+            # Streamed tokens are flushed, the colour escape codes around them are not
+            if flush and self.speaker is not None:
+                self._write(sep.join(str(obj) for obj in objects))
+            return
+        super().print(*objects, sep=sep, end=end, flush=flush)
+
+    def _write(self, token: str) -> None:
+        if self.placeholder is None:
+            self.placeholder = self.open_bubble(self.speaker)
+            self.first_token_at = time.perf_counter()
+        self.text += token
+        self.placeholder.markdown(f"**{self.speaker}**: {self.text}{CURSOR}")
+
+    def finish(self, speaker: str):
+        """
+        Ends the reply by `speaker`.
+
+        Returns:
+            The placeholder the reply was streamed into, or None if nothing was streamed
+            (e.g. the completion came from the cache).
+        """
+        placeholder = self.placeholder if speaker == self.speaker else None
+        if speaker == self.speaker:
+            self.speaker = None
+            self.placeholder = None
+            self.text = ""
+        return placeholder
+
+
+def attach_stream(agents: Iterable[Agent], stream: StreamlitTokenStream) -> None:
+    """
+    Lets `stream` know which agent is about to reply.
+
+    Safe to call again on cached agents: the hook is registered once per agent
+    and always announces to the stream attached last.
+    """
+    for agent in agents:
+        agent.token_stream = stream
+        if getattr(agent, "token_stream_hooked", False):
+            continue
+
+        def announce(messages: List[Dict], agent: Agent = agent) -> List[Dict]:
+            agent.token_stream.begin(agent.name)
+            return messages
+        agent.register_hook("process_all_messages_before_reply", announce)
+        agent.token_stream_hooked = True
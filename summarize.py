@@ -0,0 +1,181 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+
+# A completion function takes chat messages and returns the reply text
+Completer = Callable[[List[Dict]], str]
+
+summary_agent_prompt = """
+    You are an expert reasearcher in behaviour science and are tasked with summarising a reasearch panel. Please provide a structured summary of the key findings, including pain points, preferences, and suggestions for improvement.
+    This should be in the format based on the following format:
+
+    ```
+    Reasearch Study: <<Title>>
+
+    Subjects:
+    <<Overview of the subjects and number, any other key information>>
+
+    Summary:
+    <<Summary of the study, include detailed analysis as an export>>
+
+    Pain Points:
+    - <<List of Pain Points - Be as clear and prescriptive as required. I expect detailed response that can be used by the brand directly to make changes. Give a short paragraph per pain point.>>
+
+    Suggestions/Actions:
+    - <<List of Adctions - Be as clear and prescriptive as required. I expect detailed response that can be used by the brand directly to make changes. Give a short paragraph per reccomendation.>>
+    ```
+    """
+
+chunk_prompt = """
+    You are reading one part of a longer focus group transcript. Write compact research notes for this part only:
+    who spoke (with their background if stated), the opinions each participant gave, pain points, preferences and
+    suggestions for improvement. Keep short verbatim quotes for the strongest statements. Do not draw conclusions
+    about parts of the study you have not seen.
+    """
+
+reduce_prompt = """
+    The following are research notes taken from consecutive parts of the same focus group transcript.
+    Merge them into one set of notes, keeping every distinct pain point, preference, suggestion and quote,
+    and removing duplicates.
+    """
+
+
+class _ApproxEncoding:
+    """Roughly four characters per token, used when the tiktoken files cannot be fetched (offline runs)."""
+
+    def encode(self, text: str) -> List[str]:
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    # Loaded on first use, it is only needed once there is a transcript to count
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        return _ApproxEncoding()
+    # A model tiktoken does not know: the encoding of the current OpenAI models, when it can be fetched
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return _ApproxEncoding()
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Number of tokens `text` takes for `model`."""
+    return len(_encoding(model).encode(text))
+
+
+def split_transcript(messages: List[str], max_tokens: int, model: str = "gpt-4o") -> List[str]:
+    """
+    Packs transcript messages into chunks of at most `max_tokens` tokens.
+
+    Messages are kept whole where possible; a single message longer than the
+    budget is cut on token boundaries.
+
+    Parameters:
+        messages (List[str]): The transcript, one entry per message.
+        max_tokens (int): The token budget per chunk.
+        model (str): The model whose tokenizer is used.
+
+    Returns:
+        List[str]: The chunks, in transcript order.
+    """
+    encoding = _encoding(model)
+    chunks, current, current_tokens = [], [], 0
+    for message in messages:
+        tokens = encoding.encode(message)
+        if len(tokens) > max_tokens:
+            pieces = [(encoding.decode(tokens[i:i + max_tokens]), len(tokens[i:i + max_tokens]))
+                      for i in range(0, len(tokens), max_tokens)]
+        else:
+            pieces = [(message, len(tokens))]
+        for piece, piece_tokens in pieces:
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def openai_completer(client, model: str = "gpt-4o") -> Completer:
+    """Wraps an `openai.OpenAI` client as a Completer."""
+    def complete(messages: List[Dict]) -> str:
+        response = client.chat.completions.create(messages=messages, model=model)
+        return response.choices[0].message.content
+    return complete
+
+
+def autogen_completer(llm_config: Dict) -> Completer:
+    """Wraps an autogen llm_config as a Completer, so the panel's cache and config list apply."""
+    from autogen import OpenAIWrapper
+
+    config = {key: value for key, value in llm_config.items() if key != "functions"}
+    # Summaries are consumed whole, never streamed to the UI
+    config["config_list"] = [{**entry, "stream": False} for entry in config.get("config_list", [])]
+    client = OpenAIWrapper(**config)
+
+    def complete(messages: List[Dict]) -> str:
+        response = client.create(messages=messages)
+        return client.extract_text_or_completion_object(response)[0]
+    return complete
+
+
+def _notes(complete: Completer, instructions: str, text: str) -> str:
+    return complete([
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": text},
+    ])
+
+
+def map_reduce_summary(messages: List[str], complete: Completer, instructions: str = summary_agent_prompt,
+                       request: Optional[str] = None, chunk_tokens: int = 6000, model: str = "gpt-4o",
+                       max_workers: int = 8) -> str:
+    """
+    Summarises a transcript of any length.
+
+    The transcript is split into chunks of `chunk_tokens` tokens, each chunk is
+    turned into research notes concurrently, neighbouring notes are merged (again
+    concurrently) until they fit one chunk, and a final call writes the report in the
+    `instructions` format. A transcript that already fits one chunk takes a single call.
+
+    Parameters:
+        messages (List[str]): The transcript, one entry per message.
+        complete (Completer): The completion function, see `openai_completer` / `autogen_completer`.
+        instructions (str): The system prompt for the final report.
+        request (Optional[str]): An extra request from the user, added to the final prompt.
+        chunk_tokens (int): Token budget per chunk; keep it well under the model's context size.
+        model (str): The model whose tokenizer is used for budgeting.
+        max_workers (int): Maximum number of concurrent completions.
+
+    Returns:
+        str: The final report.
+    """
+    if request:
+        instructions = f"{request}\n{instructions}"
+    chunks = split_transcript(messages, chunk_tokens, model=model)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        if len(chunks) > 1:
+            notes = list(pool.map(lambda chunk: _notes(complete, chunk_prompt, chunk), chunks))
+            while len(notes) > 1 and count_tokens("\n\n".join(notes), model) > chunk_tokens:
+                groups = split_transcript(notes, chunk_tokens, model=model)
+                if len(groups) == len(notes):
+                    # Every note already fills a chunk, merging further cannot shrink them
+                    break
+                notes = list(pool.map(lambda group: _notes(complete, reduce_prompt, group), groups))
+            transcript = "\n\n".join(notes)
+            header = "Here are the research notes of the study"
+        else:
+            transcript = chunks[0] if chunks else ""
+            header = "Here is the transcript of the study"
+    return _notes(complete, instructions, f"{header} ```{transcript}```")
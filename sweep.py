@@ -0,0 +1,203 @@
+"""
+Experiment sweeps: the same focus group over a grid of briefs, panels, models,
+temperatures and moderator prompts, compared in one table.
+
+    python sweep.py sweep.json -o docs/sweeps/pants.jsonl --workers 8 --max-concurrency 32
+
+The sweep file lists the values of each axis, either as a list or as a
+{"label": value} mapping; axes left out keep the batch runner's defaults:
+
+    {"products": {"pants": "A pant made of recycled plastic ...", "jacket": "..."},
+     "panels": ["docs/personas.json", "docs/panels/panel-200.parquet"],
+     "models": ["gpt-4o", "gpt-4o-mini"],
+     "temperatures": [0, 0.7],
+     "moderator_prompts": {"default": null, "strict": "Ask one question at a time. Participants: {}"},
+     "study": {"max_round": 20, "parallel_opening": true}}
+
+`study` holds batch runner keys shared by every cell (see batch_runner.py).
+Each cell of the grid becomes a batch runner study whose id is a hash of its
+settings and of its panel file's content, so identical cells run once, and
+cells already completed in the output file are not run again: rerun the sweep
+to retry failed cells or after adding values to an axis. Editing a panel file
+makes its cells new ones. The cells run in worker processes (`--workers`)
+under one budget of requests in flight (`--max-concurrency`), the message and
+study records are appended to the output file as in batch_runner.py, and the
+comparison table, one row per cell with its metrics and findings, is written
+next to it as CSV.
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+import itertools
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import batch_runner
+from focus_group import PERSONAS_FILE, config_hash
+
+# Sweep file axis -> batch runner study key
+AXES = {"products": "product", "panels": "personas", "models": "model", "temperatures": "temperature",
+        "moderator_prompts": "moderator_prompt"}
+
+
+def load_sweep(path: str) -> Dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _axis(values) -> List[Tuple[str, object]]:
+    """The (label, value) pairs of one axis, labels defaulting to the values themselves."""
+    if isinstance(values, dict):
+        return list(values.items())
+    return [(str(value), value) for value in values]
+
+
+def _normalise(key: str, value):
+    # So that 0 and 0.0, or ./docs/x and docs/x, are the same cell
+    if key == "temperature" and value is not None:
+        return float(value)
+    if key == "personas" and isinstance(value, str):
+        return os.path.normpath(value)
+    return value
+
+
+def _panel_digest(personas) -> Optional[str]:
+    """Hash of a panel file's content, None for inline records or a file that is not there (yet)."""
+    if not isinstance(personas, str) or not os.path.isfile(personas):
+        return None
+    digest = hashlib.sha256()
+    with open(personas, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def expand_sweep(sweep: Dict) -> List[Dict]:
+    """
+    Turns a sweep into batch runner studies, one per distinct cell of its grid.
+
+    Parameters:
+        sweep (Dict): The sweep definition, see the module docstring.
+
+    Returns:
+        List[Dict]: The studies, in grid order. Each is keyed by a hash of its settings and of its
+            panel file's content, and carries its axis labels under "cell".
+
+    Raises:
+        ValueError: The sweep has no product brief.
+    """
+    if not sweep.get("products") and "product" not in sweep.get("study", {}):
+        raise ValueError('A sweep needs at least one product brief under "products".')
+    axes = [(AXES[name], _axis(sweep[name])) for name in AXES if sweep.get(name)]
+    studies, seen = [], set()
+    for combination in itertools.product(*(values for _, values in axes)):
+        study = {"personas": PERSONAS_FILE, **sweep.get("study", {})}
+        cell = {}
+        for (key, _), (label, value) in zip(axes, combination):
+            study[key] = _normalise(key, value)
+            cell[key] = label
+        study = {key: value for key, value in study.items() if value is not None}
+        study_id = config_hash(study, _panel_digest(study.get("personas")))[:12]
+        if study_id in seen:
+            continue
+        seen.add(study_id)
+        studies.append({**study, "study_id": study_id, "analysis": True, "cell": cell})
+    return studies
+
+
+def load_records(path: str) -> Dict[str, Dict]:
+    """The latest study record per study id in a batch runner output file."""
+    records = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record.get("type") == "study":
+                        records[record["study_id"]] = record
+    return records
+
+
+def comparison_table(studies: List[Dict], records: Dict[str, Dict]) -> pd.DataFrame:
+    """
+    One row per cell: its axis labels, status, size, cost and timing, and the counts and leading items of its findings.
+
+    Parameters:
+        studies (List[Dict]): The sweep's studies, see `expand_sweep`.
+        records (Dict[str, Dict]): Study records by study id, see `load_records`.
+
+    Returns:
+        pd.DataFrame: The table, in grid order.
+    """
+    rows = []
+    for study in studies:
+        record = records.get(study["study_id"], {})
+        findings = record.get("findings") or {}
+        stances = findings.get("stances") or {}
+        rows.append({
+            "cell": study["study_id"],
+            **study["cell"],
+            "status": record.get("status", "not run"),
+            "messages": record.get("n_messages"),
+            "stalled": record.get("stalled"),
+            "elapsed_s": record.get("elapsed_s"),
+            "prompt_tokens": record.get("prompt_tokens"),
+            "completion_tokens": record.get("completion_tokens"),
+            "cost": record.get("cost"),
+            "mean_latency_s": record.get("mean_latency_s"),
+            "retries": record.get("retries"),
+            "themes": len(findings.get("themes", [])),
+            "pain_points": len(findings.get("pain_points", [])),
+            "suggestions": len(findings.get("suggestions", [])),
+            "stances": len(stances),
+            "top_themes": "; ".join(findings.get("themes", [])[:3]),
+            "top_pain_points": "; ".join(findings.get("pain_points", [])[:3]),
+        })
+    return pd.DataFrame(rows)
+
+
+def run_sweep(sweep: Dict, output_path: str, max_workers: Optional[int] = None,
+              max_concurrency: Optional[int] = None) -> pd.DataFrame:
+    """
+    Runs the cells of a sweep not completed yet and compares all of them.
+
+    Parameters:
+        sweep (Dict): The sweep definition, see the module docstring.
+        output_path (str): The JSONL file receiving message and study records; earlier results in it are reused.
+        max_workers (Optional[int]): Maximum number of cells running at once, defaults to the CPU count.
+        max_concurrency (Optional[int]): Requests in flight across all cells.
+
+    Returns:
+        pd.DataFrame: The comparison table, also written to `output_path` with a .csv extension.
+    """
+    studies = expand_sweep(sweep)
+    completed = {study_id for study_id, record in load_records(output_path).items() if record["status"] == "completed"}
+    pending = [study for study in studies if study["study_id"] not in completed]
+    print(f"{len(studies)} cells, {len(studies) - len(pending)} already completed", file=sys.stderr)
+    if pending:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        batch_runner.run_batch(pending, output_path, max_workers=max_workers, max_concurrency=max_concurrency)
+    table = comparison_table(studies, load_records(output_path))
+    table.to_csv(os.path.splitext(output_path)[0] + ".csv", index=False)
+    return table
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a focus group over a grid of settings and compare the cells.")
+    parser.add_argument("sweep", help="JSON file with the sweep definition")
+    parser.add_argument("-o", "--output", default="docs/sweep_results.jsonl", help="JSONL file to append results to")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="maximum number of cells running at once")
+    parser.add_argument("-c", "--max-concurrency", type=int, default=None,
+                        help="maximum number of requests in flight across all cells")
+    args = parser.parse_args(argv)
+    table = run_sweep(load_sweep(args.sweep), args.output, max_workers=args.workers,
+                      max_concurrency=args.max_concurrency)
+    print(table.drop(columns=["top_themes", "top_pain_points"]).to_string(index=False))
+    return 0 if (table["status"] == "completed").all() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
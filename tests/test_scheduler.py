@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+
+from scheduler import SpeakerScheduler, WeightedQuota
+
+
+def run_to_exhaustion(scheduler: SpeakerScheduler, agents) -> list:
+    """Plays a chat on the scheduler until it ends it, returns the speakers in order."""
+    chat = SimpleNamespace(messages=[{"name": "Admin", "content": "brief"}])
+    speakers, last = [], None
+    for _ in range(1000):
+        speaker = scheduler(last, chat)
+        if speaker is None:
+            return speakers
+        speakers.append(speaker.name)
+        chat.messages.append({"name": speaker.name, "content": "..."})
+        last = speaker
+    raise AssertionError("The scheduler never ended the chat.")
+
+
+def test_weighted_quota_runs_every_participant_to_its_cap():
+    agents = [SimpleNamespace(name=name) for name in ("Moderator", "a", "b", "c")]
+    weights = {"a": 0.7, "b": 0.2, "c": 0.1}
+    scheduler = SpeakerScheduler(agents, policy=WeightedQuota(weights), max_interactions=3)
+
+    speakers = [name for name in run_to_exhaustion(scheduler, agents) if name != "Moderator"]
+
+    # The heaviest participant hits the cap first, the chat goes on until the others have too
+    assert {name: speakers.count(name) for name in weights} == {"a": 3, "b": 3, "c": 3}
+    assert speakers[:3] == ["a", "a", "a"]
@@ -0,0 +1,308 @@
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+TRANSCRIPT_DB = "./docs/transcripts.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS studies (
+    study_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    product TEXT,
+    personas TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+    study_id TEXT NOT NULL,
+    turn INTEGER NOT NULL,
+    speaker TEXT NOT NULL,
+    ts REAL NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (study_id, turn)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS checkpoints (
+    study_id TEXT PRIMARY KEY,
+    n_messages INTEGER NOT NULL,
+    transcript_turns INTEGER NOT NULL,
+    last_speaker TEXT NOT NULL,
+    next_speaker TEXT,
+    config_hash TEXT NOT NULL,
+    state TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS study_settings (
+    study_id TEXT PRIMARY KEY,
+    settings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_messages (
+    study_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (study_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS analyses (
+    study_id TEXT PRIMARY KEY,
+    turns INTEGER NOT NULL,
+    notes TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_study_speaker ON messages (study_id, speaker);
+CREATE INDEX IF NOT EXISTS messages_ts ON messages (ts);
+CREATE INDEX IF NOT EXISTS studies_created_at ON studies (created_at);
+"""
+
+
+class TranscriptStore:
+    """
+    SQLite-backed store for focus group transcripts.
+
+    Every message is keyed by study id and turn index, so loading one study
+    reads only that study's rows. Writes are buffered and flushed every
+    `flush_every` messages, on `flush()` and on `close()`; `load` and `count`
+    see the buffered messages without flushing them.
+
+    It also keeps one checkpoint per running study (see checkpoint.py): the
+    group chat's messages, appended as the chat grows, and the state needed
+    to continue it, both written after every turn, and the running analysis
+    notes of each study (see running_analysis.py).
+    """
+
+    def __init__(self, path: str = TRANSCRIPT_DB, flush_every: int = 20):
+        self.path = path
+        self.flush_every = flush_every
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._buffer: List[tuple] = []
+        self._next_turn: Dict[str, int] = {}
+        self._checkpointed: Dict[str, int] = {}
+
+    def new_study(self, product: str, personas: Optional[List[str]] = None, study_id: Optional[str] = None) -> str:
+        """
+        Registers a new study and returns its id.
+
+        Parameters:
+            product (str): The product brief the panel discusses.
+            personas (Optional[List[str]]): Names of the panelists.
+            study_id (Optional[str]): An explicit id, a random one is generated otherwise.
+
+        Returns:
+            str: The study id used to key its messages.
+        """
+        study_id = study_id or uuid.uuid4().hex[:12]
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO studies (study_id, created_at, product, personas) VALUES (?, ?, ?, ?)",
+                (study_id, time.time(), product, json.dumps(personas or [])),
+            )
+            self._conn.commit()
+        return study_id
+
+    def append(self, study_id: str, speaker: str, content: str, turn: Optional[int] = None) -> int:
+        """
+        Buffers one message of a study.
+
+        Returns:
+            int: The turn index the message was recorded under.
+        """
+        with self._lock:
+            if turn is None:
+                turn = self._next_turn.get(study_id)
+                if turn is None:
+                    turn = self._max_turn(study_id) + 1
+            self._next_turn[study_id] = turn + 1
+            self._buffer.append((study_id, turn, speaker, time.time(), content))
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+        return turn
+
+    def _max_turn(self, study_id: str) -> int:
+        self._flush_locked()
+        row = self._conn.execute("SELECT MAX(turn) FROM messages WHERE study_id = ?", (study_id,)).fetchone()
+        return -1 if row[0] is None else row[0]
+
+    def _flush_locked(self) -> None:
+        if self._buffer:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages (study_id, turn, speaker, ts, content) VALUES (?, ?, ?, ?, ?)",
+                self._buffer,
+            )
+            self._conn.commit()
+            self._buffer.clear()
+
+    def flush(self) -> None:
+        """Write buffered messages to disk."""
+        with self._lock:
+            self._flush_locked()
+
+    def _buffered_locked(self, study_id: str) -> Dict[int, tuple]:
+        """The buffered messages of one study by turn, the latest write of a turn winning as on flush."""
+        return {row[1]: row for row in self._buffer if row[0] == study_id}
+
+    def load(self, study_id: str, start: int = 0, stop: Optional[int] = None) -> List[Dict]:
+        """
+        Returns the messages of one study in turn order, those with `start` <= turn < `stop` when given.
+
+        Buffered messages are included without flushing them, so polling a running study keeps the writes batched.
+        """
+        stop = stop if stop is not None else 2 ** 62
+        with self._lock:
+            rows = {row[0]: row for row in self._conn.execute(
+                "SELECT turn, speaker, ts, content FROM messages WHERE study_id = ? AND turn >= ? AND turn < ?",
+                (study_id, start, stop)
+            )}
+            for turn, (_, _, speaker, ts, content) in self._buffered_locked(study_id).items():
+                if start <= turn < stop:
+                    rows[turn] = (turn, speaker, ts, content)
+        return [{"study_id": study_id, "turn": turn, "speaker": speaker, "ts": ts, "content": content}
+                for turn, speaker, ts, content in sorted(rows.values())]
+
+    def count(self, study_id: str) -> int:
+        """Number of messages recorded for one study, buffered ones included."""
+        with self._lock:
+            committed = self._conn.execute("SELECT COUNT(*) FROM messages WHERE study_id = ?", (study_id,)).fetchone()[0]
+            buffered = list(self._buffered_locked(study_id))
+            if not buffered:
+                return committed
+            # Buffered turns that replace a stored one are already counted
+            replaced = self._conn.execute(
+                f"SELECT COUNT(*) FROM messages WHERE study_id = ? AND turn IN ({', '.join('?' * len(buffered))})",
+                (study_id, *buffered)
+            ).fetchone()[0]
+            return committed + len(buffered) - replaced
+
+    def lines(self, study_id: str) -> List[str]:
+        """Returns one study as markdown lines, one per message."""
+        return [f"**{message['speaker']}**: {message['content']}" for message in self.load(study_id)]
+
+    def transcript(self, study_id: str) -> str:
+        """Returns one study as the markdown transcript the analysis prompts expect."""
+        return "\n".join(self.lines(study_id))
+
+    def save_settings(self, study_id: str, settings: Dict) -> None:
+        """Keeps what a study's panel was built from (JSON-serialisable), to rebuild it when resuming."""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO study_settings (study_id, settings) VALUES (?, ?)",
+                               (study_id, json.dumps(settings)))
+            self._conn.commit()
+
+    def load_settings(self, study_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT settings FROM study_settings WHERE study_id = ?", (study_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def save_checkpoint(self, study_id: str, messages: List[Dict], last_speaker: str, next_speaker: Optional[str],
+                        config_hash: str, state: Dict) -> None:
+        """
+        Records a study's group chat up to its last completed turn, in one transaction.
+
+        Parameters:
+            study_id (str): The study.
+            messages (List[Dict]): The group chat messages so far; only the ones not saved yet are written.
+            last_speaker (str): Who sent the last message.
+            next_speaker (Optional[str]): Who was given the floor next.
+            config_hash (str): Digest of the panel configuration the chat runs with.
+            state (Dict): JSON-serialisable state to continue the chat from, e.g. the speaker selection state.
+        """
+        with self._lock:
+            self._flush_locked()
+            saved = self._checkpointed.get(study_id)
+            if saved is None:
+                row = self._conn.execute("SELECT COUNT(*) FROM chat_messages WHERE study_id = ?", (study_id,)).fetchone()
+                saved = row[0]
+            if saved > len(messages):
+                self._conn.execute("DELETE FROM chat_messages WHERE study_id = ? AND idx >= ?", (study_id, len(messages)))
+                saved = len(messages)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chat_messages (study_id, idx, message) VALUES (?, ?, ?)",
+                [(study_id, idx, json.dumps(messages[idx])) for idx in range(saved, len(messages))],
+            )
+            transcript_turns = self._max_turn(study_id) + 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (study_id, n_messages, transcript_turns, last_speaker, next_speaker, "
+                "config_hash, state, status, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, 'running', ?)",
+                (study_id, len(messages), transcript_turns, last_speaker, next_speaker, config_hash, json.dumps(state),
+                 time.time()),
+            )
+            self._conn.commit()
+            self._checkpointed[study_id] = len(messages)
+
+    def load_checkpoint(self, study_id: str) -> Optional[Dict]:
+        """Returns a study's checkpoint with its messages, or None if it has none."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT n_messages, transcript_turns, last_speaker, next_speaker, config_hash, state, status, updated_at "
+                "FROM checkpoints WHERE study_id = ?", (study_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            messages = self._conn.execute(
+                "SELECT message FROM chat_messages WHERE study_id = ? AND idx < ? ORDER BY idx", (study_id, row[0])
+            ).fetchall()
+        n_messages, transcript_turns, last_speaker, next_speaker, config_hash, state, status, updated_at = row
+        return {"study_id": study_id, "messages": [json.loads(message) for message, in messages],
+                "transcript_turns": transcript_turns, "last_speaker": last_speaker, "next_speaker": next_speaker,
+                "config_hash": config_hash, "state": json.loads(state), "status": status, "updated_at": updated_at}
+
+    def set_checkpoint_status(self, study_id: str, status: str) -> None:
+        """Marks a study's checkpoint, e.g. "completed" once the chat ended or "failed"."""
+        with self._lock:
+            self._conn.execute("UPDATE checkpoints SET status = ? WHERE study_id = ?", (status, study_id))
+            self._conn.commit()
+
+    def list_checkpoints(self, status: str = "running") -> List[Dict]:
+        """Returns the studies whose checkpoint has `status`, newest first, e.g. runs interrupted by a restart."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.study_id, s.product, c.n_messages, c.updated_at FROM checkpoints c "
+                "JOIN studies s ON s.study_id = c.study_id WHERE c.status = ? ORDER BY c.updated_at DESC", (status,)
+            ).fetchall()
+        return [{"study_id": study_id, "product": product, "n_messages": n_messages, "updated_at": updated_at}
+                for study_id, product, n_messages, updated_at in rows]
+
+    def truncate(self, study_id: str, turns: int) -> None:
+        """Drops a study's messages from turn `turns` on, e.g. those recorded after its last checkpoint."""
+        with self._lock:
+            self._flush_locked()
+            self._conn.execute("DELETE FROM messages WHERE study_id = ? AND turn >= ?", (study_id, turns))
+            self._conn.commit()
+            self._next_turn[study_id] = min(self._next_turn.get(study_id, turns), turns)
+
+    def save_analysis(self, study_id: str, turns: int, notes: Dict) -> None:
+        """Keeps a study's running analysis notes, covering its first `turns` messages."""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO analyses (study_id, turns, notes, updated_at) VALUES (?, ?, ?, ?)",
+                               (study_id, turns, json.dumps(notes), time.time()))
+            self._conn.commit()
+
+    def load_analysis(self, study_id: str) -> Optional[Dict]:
+        """Returns a study's running analysis notes and the number of messages they cover, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT turns, notes, updated_at FROM analyses WHERE study_id = ?",
+                                     (study_id,)).fetchone()
+        if row is None:
+            return None
+        turns, notes, updated_at = row
+        return {"study_id": study_id, "turns": turns, "notes": json.loads(notes), "updated_at": updated_at}
+
+    def list_studies(self, limit: int = 50) -> List[Dict]:
+        """Returns the most recent studies, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT study_id, created_at, product, personas FROM studies ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [{"study_id": study_id, "created_at": created_at, "product": product, "personas": json.loads(personas or "[]")}
+                for study_id, created_at, product, personas in rows]
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self) -> "TranscriptStore":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
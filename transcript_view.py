@@ -0,0 +1,80 @@
+"""
+Transcript rendering shared by the Streamlit pages.
+
+Every chat bubble is a plain `st.chat_message` styled by one stylesheet
+injected once per page run (`inject_styles`), instead of a stylable_container
+with its own CSS block per message. `render_transcript` keeps the page size
+flat however long the discussion gets: it renders the latest `window`
+messages and, on demand, one page of the earlier ones at a time, loading only
+the rows it shows.
+"""
+from typing import Callable, Dict, List
+
+import streamlit as st
+
+# Messages always on screen, the latest ones
+WINDOW = 30
+# Earlier messages shown per page
+PAGE_SIZE = 50
+
+TRANSCRIPT_CSS = """
+<style>
+    div[data-testid="stChatMessage"] {
+        border: 1px solid rgba(49, 51, 63, 0.2);
+        background: #e6ffff;
+        border-radius: 0.5rem;
+        padding: calc(1em - 1px);
+        box-shadow: 0 4px 8px 0 rgba(0, 0, 0, 0.2), 0 6px 20px 0 rgba(0, 0, 0, 0.19);
+        margin-bottom: 0.5rem;
+    }
+</style>
+"""
+
+
+def inject_styles() -> None:
+    """Adds the chat bubble stylesheet to the page; call once per run, outside any fragment."""
+    st.markdown(TRANSCRIPT_CSS, unsafe_allow_html=True)
+
+
+def message_markdown(speaker: str, content) -> str:
+    return f"**{speaker}**: {content}\n"
+
+
+def open_bubble(speaker: str):
+    """Create a chat bubble for `speaker` and return a placeholder to write into."""
+    with st.chat_message(speaker):
+        return st.empty()
+
+
+def render_message(speaker: str, content) -> None:
+    with st.chat_message(speaker):
+        st.markdown(message_markdown(speaker, content))
+
+
+def render_transcript(total: int, load: Callable[[int, int], List[Dict]], key: str, window: int = WINDOW,
+                      page_size: int = PAGE_SIZE) -> None:
+    """
+    Renders the latest `window` messages of a transcript, and the earlier ones a page at a time when asked.
+
+    Parameters:
+        total (int): Number of messages in the transcript.
+        load (Callable[[int, int], List[Dict]]): Returns the messages with start <= turn < stop, each with
+            "speaker" and "content", e.g. `functools.partial(TranscriptStore.load, store, study_id)`.
+        key (str): Prefix of the widget keys, unique on the page.
+        window (int): Number of latest messages always rendered.
+        page_size (int): Number of earlier messages per page.
+    """
+    earlier = max(0, total - window)
+    if earlier:
+        # Fixed widget arguments, so their state survives the transcript growing
+        if st.toggle("Show earlier messages", key=f"{key}_earlier"):
+            pages = -(-earlier // page_size)
+            page = min(int(st.number_input("Page of earlier messages:", min_value=1, step=1, key=f"{key}_page")), pages)
+            st.caption(f"Messages {(page - 1) * page_size + 1}-{min(page * page_size, earlier)} of the {earlier} "
+                       f"before the latest {window}, page {page} of {pages}.")
+            for message in load((page - 1) * page_size, min(page * page_size, earlier)):
+                render_message(message["speaker"], message["content"])
+        else:
+            st.caption(f"{earlier} earlier messages hidden.")
+    for message in load(earlier, total):
+        render_message(message["speaker"], message["content"])